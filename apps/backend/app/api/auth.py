@@ -3,6 +3,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.db.database import get_db
+from app.db import repository
+from app.core.log import get_logger
 from app.core.security import create_access_token, create_refresh_token, verify_password, verify_token
 from app.models.user import User
 from app.schemas.auth import LoginRequest, LoginResponse, RefreshTokenRequest, RefreshTokenResponse
@@ -10,6 +12,7 @@ import uuid
 
 router = APIRouter()
 security = HTTPBearer()
+log = get_logger("chat.auth")
 
 def get_user_by_email(db: Session, email: str) -> User | None:
     return db.query(User).filter(User.email == email).first()
@@ -28,7 +31,7 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = repository.get_user_by_id(db, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,20 +43,18 @@ def get_current_user(
 
 async def get_current_user_websocket(token: str, db: Session) -> User:
     """Authenticate user for WebSocket connections"""
-    print(f"WebSocket authentication: token={token[:20]}...")
     user_id = verify_token(token)
-    print(f"WebSocket authentication: user_id={user_id}")
     
     if user_id is None:
-        print("WebSocket authentication failed: Invalid token")
+        log.info("ws.auth_failed", reason="invalid_token")
         return None
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = repository.get_user_by_id(db, user_id)
     if user is None:
-        print(f"WebSocket authentication failed: User not found for id={user_id}")
+        log.info("ws.auth_failed", reason="unknown_user", user_id=user_id)
         return None
     
-    print(f"WebSocket authentication successful: user={user.email}")
+    log.debug("ws.authenticated", user_id=user_id)
     return user
 
 @router.post("/login", response_model=LoginResponse)
@@ -101,7 +102,7 @@ async def refresh_access_token(
             detail="Invalid refresh token",
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = repository.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status
 from app.schemas.auth import LoginRequest, LoginResponse
 from app.core.security import create_access_token, create_refresh_token, verify_password, get_password_hash
+from app.core.lazy import lazy
 
 router = APIRouter()
 
@@ -10,10 +11,14 @@ DEMO_USER = {
     "email": "admin@example.com",
     "name": "Demo Admin",
     "role": "admin",
-    "hashed_password": get_password_hash("password123"),
     "websiteIds": ["demo-website-1", "demo-website-2"]
 }
 
+@lazy
+def demo_password_hash():
+    # A full bcrypt round; only paid the first time /demo/setup runs
+    return get_password_hash("password123")
+
 @router.post("/login", response_model=LoginResponse)
 async def demo_login(login_data: LoginRequest):
     """Demo login endpoint for testing with database lookup"""
@@ -65,7 +70,7 @@ async def setup_demo_data():
                 email=DEMO_USER["email"],
                 name=DEMO_USER["name"],
                 role=UserRole.ADMIN,
-                hashed_password=DEMO_USER["hashed_password"],
+                hashed_password=demo_password_hash.get(),
                 status=UserStatus.ACTIVE
             )
             db.add(user)
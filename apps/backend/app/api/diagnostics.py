@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends
+from app.api.users import check_admin_access
+from app.core.loop_monitor import loop_monitor
+from app.db.pool_metrics import pool_monitors
+from app.services.assignment import assignment_engine
+from app.models.user import User
+
+router = APIRouter()
+
+@router.get("/pool")
+async def get_pool_stats(admin_user: User = Depends(check_admin_access)):
+    """Connection pool telemetry: occupancy, checkout wait times and holders by route"""
+    return {name: monitor.snapshot() for name, monitor in pool_monitors.items()}
+
+@router.get("/assignment")
+async def get_assignment_stats(admin_user: User = Depends(check_admin_access)):
+    """Online agents with their load and capacity, as seen by this worker's assignment engine"""
+    return assignment_engine.snapshot()
+
+@router.get("/event-loop")
+async def get_event_loop_stats(admin_user: User = Depends(check_admin_access)):
+    """Loop lag histogram and the most recent callbacks that blocked the loop, with their stacks"""
+    return loop_monitor.snapshot()
@@ -24,6 +24,18 @@ api_router.include_router(websites_router, prefix="/websites", tags=["websites"]
 from .v1.conversations import router as conversations_router
 api_router.include_router(conversations_router, prefix="/conversations", tags=["conversations"])
 
+# Waiting queue (SLA-ordered dispatch)
+from .v1.queue import router as queue_router
+api_router.include_router(queue_router, prefix="/queue", tags=["queue"])
+
+# Conversation analytics (served from rollup tables)
+from .v1.analytics import router as analytics_router
+api_router.include_router(analytics_router, prefix="/analytics", tags=["analytics"])
+
 # Widget public endpoints (no authentication required)
 from .widget import router as widget_router
-api_router.include_router(widget_router, prefix="/widget", tags=["widget"])
\ No newline at end of file
+api_router.include_router(widget_router, prefix="/widget", tags=["widget"])
+
+# Admin diagnostics (pool telemetry)
+from .diagnostics import router as diagnostics_router
+api_router.include_router(diagnostics_router, prefix="/diagnostics", tags=["diagnostics"])
@@ -0,0 +1,98 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Optional
+from datetime import datetime, timedelta
+from app.db.database import get_read_db
+from app.models.analytics import ConversationRollup
+from app.models.website import Website
+from app.models.user import User
+from app.api.auth import get_current_user
+from app.core.serialization import FastJSONResponse
+from app.services.analytics import COUNTERS, hour_bucket
+
+router = APIRouter()
+
+INTERVALS = ("hour", "day", "total")
+
+def _summarize(counts: dict) -> dict:
+    """Raw counters plus the averages a dashboard shows"""
+    def average(total, count):
+        return round(total / count, 2) if count else None
+    
+    return {
+        **counts,
+        "avg_first_response_seconds": average(counts["first_response_seconds"], counts["first_responses"]),
+        "avg_resolution_seconds": average(counts["resolution_seconds"], counts["resolutions"]),
+        "avg_rating": average(counts["rating_total"], counts["ratings"]),
+    }
+
+@router.get("/conversations")
+async def get_conversation_analytics(
+    start: Optional[datetime] = Query(None, description="Inclusive, defaults to 7 days ago"),
+    end: Optional[datetime] = Query(None, description="Exclusive, defaults to now"),
+    website_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    interval: str = Query("day", description="hour, day or total"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Conversation volume, first-response time, resolution time and ratings
+    for the user's websites, answered from the hourly rollups
+    """
+    if interval not in INTERVALS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid interval. Must be one of: {', '.join(INTERVALS)}"
+        )
+    
+    # Round the exclusive end up to a bucket boundary; one already on a boundary stays put
+    end = hour_bucket((end or datetime.utcnow()) - timedelta(microseconds=1)) + timedelta(hours=1)
+    start = hour_bucket(start) if start else end - timedelta(days=7)
+    
+    website_ids = [row.id for row in db.query(Website.id).filter(
+        Website.users.any(User.id == current_user.id)
+    )]
+    if website_id:
+        if website_id not in website_ids:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Website not found"
+            )
+        website_ids = [website_id]
+    
+    query = db.query(
+        ConversationRollup.bucket_start,
+        *[func.sum(getattr(ConversationRollup, name)).label(name) for name in COUNTERS]
+    ).filter(
+        ConversationRollup.website_id.in_(website_ids),
+        ConversationRollup.bucket_start >= start,
+        ConversationRollup.bucket_start < end
+    )
+    if agent_id is not None:
+        query = query.filter(ConversationRollup.agent_id == agent_id)
+    rows = query.group_by(ConversationRollup.bucket_start).order_by(ConversationRollup.bucket_start).all()
+    
+    series = {}
+    totals = dict.fromkeys(COUNTERS, 0)
+    for row in rows:
+        if interval == "day":
+            key = row.bucket_start.replace(hour=0)
+        else:
+            key = row.bucket_start
+        counts = series.setdefault(key, dict.fromkeys(COUNTERS, 0))
+        for name in COUNTERS:
+            value = getattr(row, name) or 0
+            counts[name] += value
+            totals[name] += value
+    
+    return FastJSONResponse({
+        "start": start,
+        "end": end,
+        "interval": interval,
+        "totals": _summarize(totals),
+        "series": [] if interval == "total" else [
+            {"bucket_start": key, **_summarize(counts)} for key, counts in series.items()
+        ],
+    })
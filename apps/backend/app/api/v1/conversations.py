@@ -1,19 +1,30 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_, or_
+from sqlalchemy import desc, and_, or_, func
 from typing import List, Optional
 from datetime import datetime
-from app.db.database import get_db
-from app.models.conversation import Conversation, Message, MessageType
+from app.db.database import get_db, get_read_db
+from app.models.conversation import Conversation, Message, MessageArchive, MessageType, ConversationStatus
 from app.models.website import Website
 from app.models.visitor import Visitor
 from app.models.user import User
 from app.api.auth import get_current_user
 from app.websockets.connection_manager import connection_manager
+from app.core.serialization import FastJSONResponse
+from app.core import metrics
+from app.core.log import get_logger
+from app.services.archival import load_archived_messages
+from app.services.presence import presence_tracker
+from app.services.read_markers import read_markers
+from app.services import analytics, inbox
+from app.services.assignment import claim_on_reply, sync_assignment
+from app.services.waiting_queue import waiting_queues
+from app.db import repository
 from pydantic import BaseModel
 import uuid
 
 router = APIRouter()
+log = get_logger("chat.api")
 
 class MessageCreate(BaseModel):
     content: str
@@ -53,6 +64,7 @@ class ConversationDetailResponse(BaseModel):
     visitor_name: str
     visitor_email: Optional[str] = None
     visitor_metadata: dict = {}
+    visitor_last_seen_at: Optional[datetime] = None
     status: str
     created_at: datetime
     updated_at: Optional[datetime] = None
@@ -64,7 +76,7 @@ class ConversationDetailResponse(BaseModel):
 @router.get("/", response_model=List[ConversationListResponse])
 async def get_conversations(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     status_filter: Optional[str] = Query(None, description="Filter by status: active, waiting, resolved"),
     website_id: Optional[str] = Query(None, description="Filter by website ID"),
     search: Optional[str] = Query(None, description="Search in visitor names or messages"),
@@ -73,8 +85,18 @@ async def get_conversations(
 ):
     """Get all conversations for the current user's websites"""
     
-    # Build base query - simplified for debugging
-    query = db.query(Conversation).join(Website)
+    # Project only the columns the inbox shows - no ORM objects or lazy loads
+    query = db.query(
+        Conversation.id,
+        Conversation.status,
+        Conversation.created_at,
+        Website.name.label("website_name"),
+        Website.domain.label("website_domain"),
+        Visitor.name.label("visitor_name"),
+        Visitor.email.label("visitor_email"),
+    ).join(Website, Conversation.website_id == Website.id).outerjoin(
+        Visitor, Conversation.visitor_id == Visitor.id
+    )
     
     # Apply filters
     if status_filter:
@@ -84,56 +106,79 @@ async def get_conversations(
         query = query.filter(Conversation.website_id == website_id)
     
     if search:
-        query = query.join(Visitor).filter(
+        query = query.filter(
             or_(
                 Visitor.name.ilike(f"%{search}%"),
                 Visitor.email.ilike(f"%{search}%")
             )
         )
     
-    # Get conversations for testing
-    conversations = query.order_by(desc(Conversation.updated_at)).offset(offset).limit(limit).all()
+    rows = query.order_by(desc(Conversation.updated_at)).offset(offset).limit(limit).all()
+    
+    # Last message for every conversation on the page in a single query
+    last_messages = {}
+    unread_counts = {}
+    if rows:
+        ranked = db.query(
+            Message.conversation_id,
+            Message.content,
+            Message.created_at,
+            func.row_number().over(
+                partition_by=Message.conversation_id,
+                order_by=desc(Message.created_at)
+            ).label("rank")
+        ).filter(Message.conversation_id.in_([row.id for row in rows])).subquery()
+        
+        for conversation_id, content, created_at in db.query(
+            ranked.c.conversation_id, ranked.c.content, ranked.c.created_at
+        ).filter(ranked.c.rank == 1):
+            last_messages[conversation_id] = (content, created_at)
+        
+        # Conversations whose messages all moved to cold storage
+        archived_ids = [row.id for row in rows if row.id not in last_messages]
+        if archived_ids:
+            for conversation_id, content, created_at in db.query(
+                MessageArchive.conversation_id,
+                MessageArchive.last_message_preview,
+                MessageArchive.last_message_at
+            ).filter(MessageArchive.conversation_id.in_(archived_ids)):
+                last_messages[conversation_id] = (content, created_at)
+        
+        # Visitor messages the agents haven't opened yet, same rule as the stats summary
+        # (opened conversations count as read before their marker is flushed)
+        conversation_ids = [row.id for row in rows]
+        unread_counts = repository.count_unread_messages(
+            db, conversation_ids, read_markers.pending_for(conversation_ids)
+        )
     
-    # Return conversation data with real messages
     result = []
-    for conv in conversations:
-        try:
-            # Get last actual message
-            last_message = db.query(Message).filter(
-                Message.conversation_id == conv.id
-            ).order_by(desc(Message.created_at)).first()
-            
-            result.append(ConversationListResponse(
-                id=conv.id,
-                website_name=conv.website.name if conv.website else "Unknown",
-                website_domain=conv.website.domain if conv.website else "unknown.com",
-                visitor_name=getattr(conv.visitor, 'name', None) or "Anonymous User",
-                visitor_email=getattr(conv.visitor, 'email', None),
-                last_message=last_message.content if last_message else "No messages",
-                last_message_time=last_message.created_at if last_message else conv.created_at,
-                status="active",
-                unread_count=1,
-                created_at=conv.created_at
-            ))
-        except Exception as e:
-            print(f"Error processing conversation {conv.id}: {e}")
-            continue
+    for row in rows:
+        last_message = last_messages.get(row.id)
+        result.append({
+            "id": row.id,
+            "website_name": row.website_name or "Unknown",
+            "website_domain": row.website_domain or "unknown.com",
+            "visitor_name": row.visitor_name or "Anonymous User",
+            "visitor_email": row.visitor_email,
+            "last_message": last_message[0] if last_message else "No messages",
+            "last_message_time": last_message[1] if last_message else row.created_at,
+            "status": inbox.status_value(row.status) or "active",
+            "unread_count": unread_counts.get(row.id, 0),
+            "created_at": row.created_at
+        })
     
-    return result
+    return FastJSONResponse(result)
 
 @router.get("/{conversation_id}", response_model=ConversationDetailResponse)
 async def get_conversation(
     conversation_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get a specific conversation with full details and message history"""
     
     try:
-        # Query with eager loading of relationships
-        conversation = db.query(Conversation).filter(
-            Conversation.id == conversation_id
-        ).first()
+        conversation = repository.get_conversation_by_id(db, conversation_id)
         
         if not conversation:
             raise HTTPException(
@@ -141,10 +186,16 @@ async def get_conversation(
                 detail="Conversation not found"
             )
         
-        # Get all messages for this conversation
-        messages = db.query(Message).filter(
-            Message.conversation_id == conversation_id
-        ).order_by(Message.created_at).all()
+        # Get all messages for this conversation as plain rows
+        messages = repository.get_conversation_messages(db, conversation_id, conversation.created_at)
+        
+        # Read through to cold storage for archived conversations
+        archived = load_archived_messages(db, conversation_id)
+        if archived:
+            messages = [
+                (msg["id"], msg["content"], msg["sender"], msg["sender_id"], msg["created_at"], msg["message_metadata"])
+                for msg in archived
+            ] + messages
         
         # Safely get website information
         website_name = "Unknown Website"
@@ -161,12 +212,14 @@ async def get_conversation(
         visitor_name = "Anonymous User"
         visitor_email = None
         visitor_metadata = {}
+        visitor_last_seen_at = presence_tracker.last_seen(conversation.visitor_id)
         
         try:
             if conversation.visitor:
                 visitor_name = getattr(conversation.visitor, 'name', None) or "Anonymous User"
                 visitor_email = getattr(conversation.visitor, 'email', None)
                 visitor_metadata = getattr(conversation.visitor, 'custom_data', None) or {}
+                visitor_last_seen_at = visitor_last_seen_at or conversation.visitor.last_seen_at
         except Exception as e:
             print(f"Error accessing visitor data: {e}")
         
@@ -180,37 +233,34 @@ async def get_conversation(
         except Exception as e:
             print(f"Error accessing status: {e}")
         
-        # Mark as read by agent
-        try:
-            conversation.last_agent_read_at = datetime.utcnow()
-            db.commit()
-        except Exception as e:
-            print(f"Error updating read timestamp: {e}")
-            db.rollback()
+        # Mark as read by agent; written in bulk later so this stays a pure read
+        read_markers.mark(conversation_id)
+        await inbox.conversation_read(conversation.website_id, conversation_id)
         
-        return ConversationDetailResponse(
-            id=conversation.id,
-            website_id=conversation.website_id,
-            website_name=website_name,
-            website_domain=website_domain,
-            visitor_id=conversation.visitor_id,
-            visitor_name=visitor_name,
-            visitor_email=visitor_email,
-            visitor_metadata=visitor_metadata,
-            status=status_value,
-            created_at=conversation.created_at,
-            updated_at=conversation.updated_at,
-            messages=[
-                MessageResponse(
-                    id=msg.id,
-                    content=msg.content,
-                    sender=msg.sender,
-                    timestamp=msg.created_at,
-                    message_metadata=msg.message_metadata or {}
-                )
-                for msg in messages
+        return FastJSONResponse({
+            "id": conversation.id,
+            "website_id": conversation.website_id,
+            "website_name": website_name,
+            "website_domain": website_domain,
+            "visitor_id": conversation.visitor_id,
+            "visitor_name": visitor_name,
+            "visitor_email": visitor_email,
+            "visitor_metadata": visitor_metadata,
+            "visitor_last_seen_at": visitor_last_seen_at,
+            "status": status_value,
+            "created_at": conversation.created_at,
+            "updated_at": conversation.updated_at,
+            "messages": [
+                {
+                    "id": msg_id,
+                    "content": content,
+                    "sender": sender,
+                    "timestamp": created_at,
+                    "message_metadata": metadata or {}
+                }
+                for msg_id, content, sender, sender_id, created_at, metadata in messages
             ]
-        )
+        })
     
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -231,9 +281,7 @@ async def send_message(
 ):
     """Send a message in a conversation"""
     
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id
-    ).first()
+    conversation = repository.get_conversation_by_id(db, conversation_id)
     
     if not conversation:
         raise HTTPException(
@@ -252,9 +300,20 @@ async def send_message(
     )
     
     db.add(message)
+    website_id = conversation.website_id
+    conversation.last_message_at = datetime.utcnow()
+    conversation.updated_at = datetime.utcnow()
+    inbox_changes = {}
+    if message.sender == "agent":
+        conversation.last_agent_read_at = datetime.utcnow()
+        claim_on_reply(conversation, current_user.id)
+        inbox_changes = {"status": inbox.status_value(conversation.status),
+                         "assigned_agent_id": conversation.assigned_agent_id}
     
     db.commit()
     db.refresh(message)
+    metrics.messages_persisted.labels(message.sender).inc()
+    analytics.record_message(conversation_id, message.sender, message.sender_id)
     
     # Broadcast the message to connected clients via WebSocket
     try:
@@ -268,15 +327,16 @@ async def send_message(
             "type": "text"
         }
         
-        print(f"📡 Agent API: Broadcasting message to conversation {conversation_id}")
         await connection_manager.broadcast_to_conversation({
             "type": "new_message",
             "message": message_data
         }, conversation_id)
-        print(f"📡 Agent API: Message broadcast completed")
+        
+        await inbox.message_added(website_id, conversation_id, message.content, message.sender,
+                                  message.created_at, **inbox_changes)
         
     except Exception as broadcast_error:
-        print(f"❌ Agent API: Failed to broadcast message: {broadcast_error}")
+        log.warning("message.broadcast_failed", conversation_id=conversation_id, error=str(broadcast_error))
         # Don't fail the API request if broadcasting fails
     
     return MessageResponse(
@@ -315,14 +375,26 @@ async def update_conversation_status(
     
     conversation.status = status
     conversation.updated_at = datetime.utcnow()
+    if status == ConversationStatus.RESOLVED.value:
+        conversation.closed_at = datetime.utcnow()
     db.commit()
+    if status == ConversationStatus.RESOLVED.value:
+        analytics.record_resolved(conversation_id, conversation.assigned_agent_id, conversation.closed_at)
+    
+    sync_assignment(conversation)
+    if status == ConversationStatus.WAITING.value and conversation.assigned_agent_id is None:
+        waiting_queues.push(conversation_id, conversation.website_id, conversation.priority)
+    else:
+        waiting_queues.remove(conversation_id)
+    
+    await inbox.status_changed(conversation.website_id, conversation_id, status)
     
     return {"message": f"Conversation status updated to {status}"}
 
 @router.get("/stats/summary")
 async def get_conversation_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get conversation statistics for the dashboard"""
     
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.db.database import get_db
+from app.models.user import User
+from app.api.auth import get_current_user
+from app.services.assignment import dispatch_next
+from app.services.waiting_queue import waiting_queues
+
+router = APIRouter()
+
+@router.get("/")
+async def get_waiting_queue(current_user: User = Depends(get_current_user)):
+    """Queue length and oldest wait per priority for the user's websites"""
+    website_ids = {website.id for website in current_user.websites}
+    return {
+        website_id: stats
+        for website_id, stats in waiting_queues.stats().items()
+        if website_id in website_ids
+    }
+
+@router.post("/next")
+async def take_next_conversation(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Assign the most overdue waiting conversation of the user's websites to them"""
+    website_ids = [website.id for website in current_user.websites]
+    dispatched = await dispatch_next(db, current_user.id, website_ids)
+    if dispatched is None:
+        return {"conversation": None}
+    return {"conversation": dispatched}
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from app.db.database import get_db
+from typing import Dict, List, Optional
+from datetime import datetime
+from app.db.database import get_db, get_read_db
 from app.models.website import Website
 from app.models.user import User
 from app.api.auth import get_current_user
-from pydantic import BaseModel
+from app.services.website_cache import website_cache
+from app.core.serialization import FastJSONResponse
+from app.services.export import iter_website_export, gzip_stream
+from pydantic import BaseModel, Field
 import uuid
 
 router = APIRouter()
 
+class RateLimitOverride(BaseModel):
+    rate: float = Field(..., gt=0)  # tokens per second
+    burst: float = Field(..., ge=1)
+
 class WidgetConfig(BaseModel):
     primaryColor: str = "#6366f1"
     position: str = "bottom-right"
@@ -19,6 +28,7 @@ class WidgetConfig(BaseModel):
     enableFileUpload: bool = True
     enableEmoji: bool = True
     offlineMessage: str = "We are currently offline. Leave us a message!"
+    rateLimits: Optional[Dict[str, Dict[str, RateLimitOverride]]] = None  # e.g. {"message": {"visitor": {...}}}
 
 class WebsiteCreate(BaseModel):
     name: str
@@ -46,25 +56,33 @@ class WebsiteResponse(BaseModel):
 @router.get("/", response_model=List[WebsiteResponse])
 async def get_websites(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get all websites for the current user"""
-    websites = db.query(Website).filter(
+    websites = db.query(
+        Website.id,
+        Website.name,
+        Website.domain,
+        Website.widget_config,
+        Website.is_active,
+        Website.created_at,
+        Website.updated_at
+    ).filter(
         Website.users.any(User.id == current_user.id)
     ).all()
     
-    return [
-        WebsiteResponse(
-            id=website.id,
-            name=website.name,
-            domain=website.domain,
-            widget_config=website.widget_config,
-            is_active=website.is_active,
-            created_at=website.created_at.isoformat(),
-            updated_at=website.updated_at.isoformat() if website.updated_at else None
-        )
+    return FastJSONResponse([
+        {
+            "id": website.id,
+            "name": website.name,
+            "domain": website.domain,
+            "widget_config": website.widget_config,
+            "is_active": website.is_active,
+            "created_at": website.created_at.isoformat(),
+            "updated_at": website.updated_at.isoformat() if website.updated_at else None
+        }
         for website in websites
-    ]
+    ])
 
 @router.post("/", response_model=WebsiteResponse)
 async def create_website(
@@ -96,6 +114,7 @@ async def create_website(
     db.add(website)
     db.commit()
     db.refresh(website)
+    website_cache.prime(website)
     
     return WebsiteResponse(
         id=website.id,
@@ -111,7 +130,7 @@ async def create_website(
 async def get_website(
     website_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get a specific website"""
     website = db.query(Website).filter(
@@ -176,6 +195,7 @@ async def update_website(
     
     db.commit()
     db.refresh(website)
+    website_cache.invalidate(website.id)
     
     return WebsiteResponse(
         id=website.id,
@@ -207,6 +227,7 @@ async def delete_website(
     
     db.delete(website)
     db.commit()
+    website_cache.invalidate(website_id)
     
     return {"message": "Website deleted successfully"}
 
@@ -214,7 +235,7 @@ async def delete_website(
 async def get_integration_code(
     website_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get integration code for a website"""
     website = db.query(Website).filter(
@@ -264,4 +285,44 @@ async def get_integration_code(
         "html_code": html_code,
         "js_code": js_code,
         "config": config
-    }
\ No newline at end of file
+    }
+
+@router.get("/{website_id}/export")
+async def export_website_conversations(
+    website_id: str,
+    start: Optional[datetime] = Query(None, description="Conversations created at or after this time"),
+    end: Optional[datetime] = Query(None, description="Conversations created before this time"),
+    compress: bool = Query(False, description="Gzip the NDJSON stream"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Stream all conversations and messages of a website as NDJSON"""
+    website = db.query(Website.id).filter(
+        Website.id == website_id,
+        Website.users.any(User.id == current_user.id)
+    ).first()
+    
+    if not website:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Website not found"
+        )
+    
+    # The stream opens its own session; release this one before streaming starts
+    db.close()
+    
+    stream = iter_website_export(website_id, start, end)
+    filename = f"website-{website_id}-export.ndjson"
+    
+    if compress:
+        return StreamingResponse(
+            gzip_stream(stream),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.gz"'}
+        )
+    
+    return StreamingResponse(
+        stream,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,18 +1,34 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
+import hashlib
+import math
 import uuid
 from datetime import datetime
 
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
+from app.db.routing import set_sticky_key
 from app.models.website import Website
 from app.models.visitor import Visitor
 from app.models.conversation import Conversation, Message, MessageType
 from app.websockets.connection_manager import connection_manager
+from app.websockets.sse import stream_conversation
+from app.services.website_cache import website_cache
+from app.services.ingest import ingest_visitor_message
+from app.services.page_views import page_view_buffer
+from app.services import analytics, inbox
+from app.services.rate_limit import rate_limiter, client_ip
+from app.services.assignment import assign_new_conversation
+from app.services.archival import load_archived_messages
+from app.db import repository
+from app.core.config import settings
+from app.core.log import get_logger
 
 router = APIRouter()
+log = get_logger("chat.widget")
 
 class WidgetMessageRequest(BaseModel):
     content: str
@@ -29,104 +45,85 @@ class WidgetMessageResponse(BaseModel):
 @router.post("/message", response_model=WidgetMessageResponse)
 async def send_widget_message(
     request: WidgetMessageRequest,
+    http_request: Request,
     db: Session = Depends(get_db)
 ):
     """
     Public endpoint for chat widget to send messages
     This is a fallback for when WebSocket is not available
     """
+    _, retry_after = await rate_limiter.check_website_request(
+        "message",
+        request.websiteId,
+        lambda: website_cache.get(db, request.websiteId),
+        visitor_id=request.visitorId,
+        ip=client_ip(http_request)
+    )
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many messages",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+    
     try:
-        # Get or create website
-        website = db.query(Website).filter(Website.id == request.websiteId).first()
-        if not website:
-            # Create demo website for testing
-            website = Website(
-                id=request.websiteId,
-                name="Demo Website",
-                domain="localhost:8001"
-            )
-            db.add(website)
-            db.flush()
-        
-        # Get or create visitor
-        visitor = None
-        if request.visitorId:
-            visitor = db.query(Visitor).filter(Visitor.id == request.visitorId).first()
-        
-        if not visitor:
-            # Create anonymous visitor with the provided visitor ID
-            visitor = Visitor(
-                id=request.visitorId,  # Use the provided visitor ID
-                website_id=request.websiteId,
-                is_identified=False
-            )
-            db.add(visitor)
-            db.flush()
-        
-        # Get or create conversation
-        conversation = None
-        if request.conversationId:
-            conversation = db.query(Conversation).filter(
-                Conversation.id == request.conversationId
-            ).first()
-        
-        if not conversation:
-            # Create new conversation
-            conversation = Conversation(
-                id=str(uuid.uuid4()),
-                website_id=request.websiteId,
-                visitor_id=visitor.id,
-                status="active",
-                priority="normal"
-            )
-            db.add(conversation)
-            db.flush()
-        
-        # Create message
-        message = Message(
-            id=str(uuid.uuid4()),
-            conversation_id=conversation.id,
-            sender="visitor",
-            sender_id=visitor.id,
+        # Website, visitor and conversation are upserted in one transaction
+        result = ingest_visitor_message(
+            db,
+            website_id=request.websiteId,
+            visitor_id=request.visitorId,
             content=request.content,
-            type=MessageType.TEXT
+            conversation_id=request.conversationId
         )
-        db.add(message)
         
-        db.commit()
+        if result.created_conversation:
+            try:
+                await assign_new_conversation(db, result.conversation_id, request.websiteId)
+            except Exception as assignment_error:
+                log.warning("conversation.assign_failed", conversation_id=result.conversation_id,
+                            error=str(assignment_error))
         
         # Broadcast the message to connected agents via WebSocket
         try:
             message_data = {
-                "id": message.id,
-                "content": message.content,
-                "sender": message.sender,
-                "sender_id": message.sender_id,
-                "timestamp": message.created_at.isoformat(),
-                "conversation_id": conversation.id,
+                "id": result.message_id,
+                "content": request.content,
+                "sender": "visitor",
+                "sender_id": result.visitor_id,
+                "timestamp": result.created_at.isoformat(),
+                "conversation_id": result.conversation_id,
                 "type": "text"
             }
             
-            print(f"📡 Widget API: Broadcasting message to conversation {conversation.id}")
             await connection_manager.broadcast_to_conversation({
                 "type": "new_message",
                 "message": message_data
-            }, conversation.id)
-            print(f"📡 Widget API: Message broadcast completed")
+            }, result.conversation_id)
+            
+            if result.created_conversation:
+                # Read after assignment, so the row already carries status and assignee
+                await inbox.conversation_created(
+                    db, result.conversation_id, request.websiteId, request.content, result.created_at
+                )
+            else:
+                await inbox.message_added(
+                    request.websiteId, result.conversation_id, request.content, "visitor", result.created_at
+                )
             
         except Exception as broadcast_error:
-            print(f"❌ Widget API: Failed to broadcast message: {broadcast_error}")
+            log.warning("message.broadcast_failed", conversation_id=result.conversation_id,
+                        error=str(broadcast_error))
             # Don't fail the API request if broadcasting fails
         
         # Return response in expected format
         return WidgetMessageResponse(
             success=True,
-            conversationId=conversation.id,
+            conversationId=result.conversation_id,
             message={
-                "id": message.id,
-                "content": message.content,
+                "id": result.message_id,
+                "content": request.content,
                 "sender": "visitor",
-                "timestamp": message.created_at.isoformat(),
+                "timestamp": result.created_at.isoformat(),
                 "type": "text"
             }
         )
@@ -138,16 +135,159 @@ async def send_widget_message(
             error=str(e)
         )
 
+class PageViewEvent(BaseModel):
+    url: str
+    title: Optional[str] = None
+    timeOnPage: Optional[int] = None
+    timestamp: Optional[datetime] = None
+
+class PageViewBatchRequest(BaseModel):
+    websiteId: str
+    visitorId: str
+    sessionId: str
+    referrer: Optional[str] = None
+    events: List[PageViewEvent] = Field(..., min_length=1, max_length=settings.page_view_max_events_per_request)
+
+@router.post("/events", status_code=202)
+async def track_page_views(
+    batch: PageViewBatchRequest,
+    request: Request,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Batch page-view tracking for the widget.
+    Events are buffered and written in bulk; 429 means the buffer is full.
+    """
+    website, retry_after = await rate_limiter.check_website_request(
+        "events",
+        batch.websiteId,
+        lambda: website_cache.get(db, batch.websiteId),
+        visitor_id=batch.visitorId,
+        ip=client_ip(request)
+    )
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+    if not website or not website.is_active:
+        raise HTTPException(status_code=404, detail="Website not found")
+    
+    accepted = page_view_buffer.offer(
+        website_id=batch.websiteId,
+        visitor_id=batch.visitorId,
+        session_id=batch.sessionId,
+        events=[{
+            "url": event.url,
+            "title": event.title,
+            "time_on_page": event.timeOnPage,
+            "timestamp": event.timestamp,
+        } for event in batch.events],
+        ip_address=request.client.host if request.client else "",
+        user_agent=request.headers.get("user-agent", ""),
+        referrer=batch.referrer
+    )
+    if not accepted:
+        raise HTTPException(
+            status_code=429,
+            detail="Event buffer full",
+            headers={"Retry-After": str(settings.page_view_retry_after)}
+        )
+    
+    page_view_buffer.flush_if_full()
+    return {"accepted": len(batch.events)}
+
+@router.get("/config/{website_id}")
+async def get_widget_config(
+    website_id: str,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Public widget configuration for a website.
+    Supports If-None-Match so repeat page loads get an empty 304.
+    """
+    website, retry_after = await rate_limiter.check_website_request(
+        "config",
+        website_id,
+        lambda: website_cache.get(db, website_id),
+        ip=client_ip(request)
+    )
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+    if not website:
+        raise HTTPException(status_code=404, detail="Website not found")
+    
+    headers = {
+        "ETag": website.etag,
+        "Cache-Control": f"public, max-age={settings.widget_config_max_age}",
+    }
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and website.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return {
+        "websiteId": website.id,
+        "isActive": website.is_active,
+        "widgetConfig": website.widget_config
+    }
+
+class ConversationRatingRequest(BaseModel):
+    visitorId: str
+    rating: int = Field(..., ge=1, le=5)
+    feedback: Optional[str] = None
+
+@router.post("/conversation/{conversation_id}/rating")
+async def rate_conversation(
+    conversation_id: str,
+    request: ConversationRatingRequest,
+    db: Session = Depends(get_db)
+):
+    """Visitor rates a conversation (1-5 stars)"""
+    conversation = repository.get_conversation_by_id(db, conversation_id)
+    if not conversation or conversation.visitor_id != request.visitorId:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    conversation.rating = request.rating
+    conversation.feedback = request.feedback
+    set_sticky_key(db, f"visitor:{request.visitorId}")
+    db.commit()
+    analytics.record_rating(conversation_id, request.rating)
+    
+    return {"success": True}
+
+def _history_etag(conversation_id: str, last_message_at: Optional[datetime], since: Optional[str]) -> str:
+    """Version of a conversation's history as seen from `since`"""
+    payload = f"{conversation_id}|{last_message_at.isoformat() if last_message_at else ''}|{since or ''}"
+    return f'W/"{hashlib.sha1(payload.encode()).hexdigest()[:20]}"'
+
 @router.get("/conversation/{visitor_id}")
 async def get_visitor_conversation(
     visitor_id: str,
     website_id: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    since: Optional[str] = Query(None, description="Last message ID the client has; only newer messages are returned"),
+    db: Session = Depends(get_read_db)
 ):
-    """Get conversation history for a visitor"""
+    """
+    Get conversation history for a visitor.
+    With `since`, returns only newer messages ("delta": true). The ETag is
+    derived from the conversation row, so If-None-Match answers 304 without
+    reading messages.
+    """
     try:
         # Find the visitor's conversation for this website
-        conversation = db.query(Conversation).filter(
+        conversation = db.query(
+            Conversation.id, Conversation.created_at, Conversation.last_message_at
+        ).filter(
             Conversation.visitor_id == visitor_id,
             Conversation.website_id == website_id
         ).order_by(desc(Conversation.created_at)).first()
@@ -155,12 +295,33 @@ async def get_visitor_conversation(
         if not conversation:
             return {"conversationId": None, "messages": []}
         
-        # Get all messages for this conversation
-        messages = db.query(Message).filter(
-            Message.conversation_id == conversation.id
-        ).order_by(Message.created_at).all()
+        headers = {
+            "ETag": _history_etag(conversation.id, conversation.last_message_at, since),
+            "Cache-Control": "private, no-cache",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        
+        # A `since` from another conversation (e.g. the previous one was
+        # resolved) or from cold storage can't anchor a delta; send it all
+        delta = since is not None and db.query(Message.conversation_id).filter(
+            Message.id == since
+        ).scalar() == conversation.id
+        
+        messages = repository.get_conversation_messages(
+            db, conversation.id, conversation.created_at, since_message_id=since if delta else None
+        )
         
         formatted_messages = []
+        for msg in [] if delta else load_archived_messages(db, conversation.id):
+            formatted_messages.append({
+                "id": msg["id"],
+                "content": msg["content"],
+                "sender": msg["sender"],
+                "timestamp": msg["created_at"].isoformat(),
+                "type": "text"
+            })
         for msg in messages:
             formatted_messages.append({
                 "id": msg.id,
@@ -170,16 +331,70 @@ async def get_visitor_conversation(
                 "type": "text"
             })
         
-        return {
+        return JSONResponse({
             "conversationId": conversation.id,
+            "delta": delta,
             "messages": formatted_messages
-        }
+        }, headers=headers)
         
     except Exception as e:
         return {"conversationId": None, "messages": [], "error": str(e)}
 
+@router.get("/conversation/{conversation_id}/events")
+async def stream_conversation_events(
+    conversation_id: str,
+    visitor_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Query(None, description="Resume point for the first connect; reconnects send the Last-Event-ID header"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Server-Sent Events stream of a visitor's conversation.
+    Push delivery for clients that cannot use the WebSocket.
+    """
+    conversation = repository.get_conversation_by_id(db, conversation_id)
+    if not conversation or conversation.visitor_id != visitor_id:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    # Replay whatever was sent while the client was away
+    replay = []
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    if resume_from:
+        for msg in repository.get_conversation_messages(
+            db, conversation_id, conversation.created_at, since_message_id=resume_from
+        ):
+            replay.append({
+                "type": "new_message",
+                "message": {
+                    "id": msg.id,
+                    "conversation_id": conversation_id,
+                    "content": msg.content,
+                    "sender": msg.sender,
+                    "sender_id": msg.sender_id,
+                    "timestamp": msg.created_at.isoformat(),
+                    "metadata": msg.message_metadata
+                }
+            })
+    website_id = conversation.website_id
+    
+    # Don't hold a pooled connection for the lifetime of the stream
+    db.close()
+    
+    return StreamingResponse(
+        stream_conversation(
+            request,
+            connection_id=str(uuid.uuid4()),
+            conversation_id=conversation_id,
+            visitor_id=visitor_id,
+            website_id=website_id,
+            replay=replay
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/debug/visitors")
-async def debug_visitors(db: Session = Depends(get_db)):
+async def debug_visitors(db: Session = Depends(get_read_db)):
     """Debug endpoint to see all visitors"""
     visitors = db.query(Visitor).all()
     return [{"id": v.id, "website_id": v.website_id} for v in visitors]
\ No newline at end of file
@@ -0,0 +1,62 @@
+import asyncio
+from typing import Callable, Dict, Optional
+
+from app.core.log import get_logger
+
+log = get_logger("chat.background")
+
+class PeriodicTask:
+    """Run a blocking job every `interval` seconds in a worker thread"""
+
+    def __init__(self, name: str, func: Callable[[], object], interval: float, run_on_stop: bool = False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.run_on_stop = run_on_stop  # e.g. flush buffered writes on shutdown
+        self._task: Optional[asyncio.Task] = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    async def run_once(self):
+        try:
+            await asyncio.to_thread(self.func)
+        except Exception:
+            log.exception("background.task_failed", task=self.name)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name=self.name)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.run_on_stop:
+            await self.run_once()
+
+class BackgroundTasks:
+    """Registry of periodic jobs started and stopped with the app lifespan"""
+
+    def __init__(self):
+        self.tasks: Dict[str, PeriodicTask] = {}
+
+    def add(self, name: str, func: Callable[[], object], interval: float, run_on_stop: bool = False):
+        self.tasks[name] = PeriodicTask(name, func, interval, run_on_stop)
+
+    def start_all(self):
+        for task in self.tasks.values():
+            task.start()
+
+    async def stop_all(self):
+        for task in self.tasks.values():
+            await task.stop()
+
+# Global background task registry
+background_tasks = BackgroundTasks()
@@ -0,0 +1,47 @@
+import threading
+from typing import Callable, Dict, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+_UNSET = object()
+
+# Every lazy value created in the process, keyed by name, so the startup
+# profile can report which ones were forced during import
+_registry: Dict[str, "LazyValue"] = {}
+
+class LazyValue(Generic[T]):
+    """Defer expensive module-level work until the value is first needed"""
+
+    def __init__(self, factory: Callable[[], T], name: Optional[str] = None):
+        self._factory = factory
+        self._value = _UNSET
+        self._lock = threading.Lock()
+        self.name = name or f"{factory.__module__}.{factory.__qualname__}"
+        _registry[self.name] = self
+
+    def get(self) -> T:
+        """Return the value, computing it once on first access"""
+        value = self._value
+        if value is _UNSET:
+            with self._lock:
+                if self._value is _UNSET:
+                    self._value = self._factory()
+                value = self._value
+        return value
+
+    @property
+    def initialized(self) -> bool:
+        return self._value is not _UNSET
+
+    def reset(self):
+        """Drop the cached value so the next get() recomputes it"""
+        with self._lock:
+            self._value = _UNSET
+
+def lazy(factory: Callable[[], T]) -> LazyValue[T]:
+    """Decorator form: `@lazy def thing(): ...` then `thing.get()`"""
+    return LazyValue(factory)
+
+def initialized_lazy_values() -> list[str]:
+    """Names of lazy values that have already been computed"""
+    return [name for name, value in _registry.items() if value.initialized]
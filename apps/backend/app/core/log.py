@@ -0,0 +1,168 @@
+"""
+Structured, non-blocking logging for the hot paths.
+
+Callers log named events with fields instead of formatted strings:
+
+    log = get_logger("chat.websockets")
+    log.debug("ws.send", connection_id=connection_id)
+
+Records below the configured level are dropped before a LogRecord is
+built, and events listed in the sample rates are kept only for that
+fraction of calls. Kept records go onto a bounded queue; a QueueListener
+thread formats and writes them, so a slow stdout pipe never blocks the
+event loop. When the queue is full, records are dropped and counted
+rather than waited for.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+# Per-message and per-recipient events; override with LOG_SAMPLE_RATES
+DEFAULT_SAMPLE_RATES: Dict[str, float] = {
+    "message.broadcast": 0.1,
+    "ws.send": 0.01,
+    "ws.subscribe": 0.1,
+}
+
+ROOT_LOGGER = "chat"
+
+records_dropped = registry.counter(
+    "chat_log_records_dropped_total", "Log records dropped because the log queue was full"
+)
+
+class TextFormatter(logging.Formatter):
+    """`<time> LEVEL logger event key=value ...`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        line = " ".join(
+            [_timestamp(record), record.levelname, record.name, record.getMessage()]
+            + [f"{key}={value}" for key, value in fields.items()]
+        )
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": _timestamp(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+def _timestamp(record: logging.LogRecord) -> str:
+    return datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds")
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks and leaves formatting to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Tracebacks reference live frames; render them now, everything else later
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            records_dropped.inc()
+
+class EventLogger:
+    """Level-gated, sampled front end to a stdlib logger"""
+
+    __slots__ = ("logger",)
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def _log(self, level: int, event: str, fields: dict, exc_info=None):
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = _sample_rates.get(event)
+        if rate is not None and rate < 1.0:
+            if random.random() >= rate:
+                return
+            fields["sample_rate"] = rate
+        # makeRecord + handle skips findCaller's stack walk
+        record = self.logger.makeRecord(
+            self.logger.name, level, "", 0, event, (), exc_info, extra={"fields": fields}
+        )
+        self.logger.handle(record)
+
+    def is_enabled(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields, exc_info=sys.exc_info())
+
+def get_logger(name: str) -> EventLogger:
+    """Logger under the "chat" hierarchy, e.g. get_logger("chat.websockets")"""
+    if name != ROOT_LOGGER and not name.startswith(ROOT_LOGGER + "."):
+        name = f"{ROOT_LOGGER}.{name}"
+    return EventLogger(logging.getLogger(name))
+
+_sample_rates: Dict[str, float] = {**DEFAULT_SAMPLE_RATES, **settings.log_sample_rates}
+_listener: Optional[QueueListener] = None
+
+def setup_logging(stream=None) -> QueueListener:
+    """Route the "chat" loggers through the queue; idempotent"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JSONFormatter() if settings.log_format == "json" else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(settings.log_level.upper())
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+def shutdown_logging():
+    """Drain the queue and stop the writer thread"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    root = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root.handlers):
+        if isinstance(handler, DroppingQueueHandler):
+            root.removeHandler(handler)
@@ -0,0 +1,251 @@
+"""
+Event-loop lag sampler and slow-callback detector.
+
+Sync DB calls or bcrypt inside an async handler stall every connection on
+the worker. Two cheap probes make those stalls visible:
+
+- The lag sampler sleeps for a fixed interval and records how late it
+  wakes up. That lateness is the time the loop spent unable to run
+  anything else.
+- The slow-callback detector wraps asyncio's Handle._run to time each
+  callback (one task step). A watchdog thread notices a step that is still
+  running past the threshold and captures its stack while it is stuck.
+  When the step ends, the coroutine, the route (from current_route) and
+  the stack are recorded.
+
+The detector patches asyncio internals, so the monitor is off unless
+LOOP_MONITOR_ENABLED is set. It also only works on the stock asyncio loops:
+uvloop runs its handles in C and never calls Handle._run. Under uvloop only
+the lag sampler runs and a warning is logged.
+
+Both are exposed at /api/v1/diagnostics/event-loop. Tests can use
+loop_monitor.assert_no_stalls() as an assertion (see
+benchmarks/bench_loop_monitor.py).
+"""
+import asyncio
+import contextvars
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.log import get_logger
+from app.core.metrics import registry
+
+# Set per request by RouteContextMiddleware; task steps inherit it through their context
+current_route: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_route", default=None)
+
+log = get_logger("chat.loop_monitor")
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STACK_DEPTH = 30
+
+loop_lag_seconds = registry.histogram(
+    "chat_event_loop_lag_seconds", "How late the loop woke a sleeping probe task", buckets=LAG_BUCKETS
+)
+slow_callbacks_total = registry.counter(
+    "chat_event_loop_slow_callbacks_total", "Callbacks/task steps that blocked the loop past the threshold"
+)
+
+def supports_callback_timing(loop: asyncio.AbstractEventLoop) -> bool:
+    """True for the stock selector/proactor loops, whose handles run through Handle._run"""
+    return isinstance(loop, asyncio.base_events.BaseEventLoop)
+
+def describe_callback(handle: asyncio.Handle) -> str:
+    """Coroutine name for task steps, qualified function name otherwise"""
+    callback = handle._callback
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        return getattr(coro, "__qualname__", None) or repr(coro)
+    return getattr(callback, "__qualname__", None) or repr(callback)
+
+class LoopMonitor:
+    def __init__(self, threshold: float = 0.1, lag_interval: float = 0.5, history: int = 50):
+        self.threshold = threshold
+        self.lag_interval = lag_interval
+        self.slow_callbacks: Deque[Dict] = deque(maxlen=history)
+        self.max_lag = 0.0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.detecting = False  # slow-callback detector active (not under uvloop)
+        self._loop_thread_id: Optional[int] = None
+        self._running: Optional[tuple] = None  # (handle, started, captured (stack, route))
+        self._lag_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._original_run = None
+        self._listeners: List[list] = []
+
+    @property
+    def running(self) -> bool:
+        return self.loop is not None
+
+    def start(self):
+        """Start on the running loop; call from the app lifespan"""
+        if self.running:
+            self.stop()
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop = threading.Event()  # fresh per run; a previous watchdog may still be exiting
+        self._lag_task = self.loop.create_task(self._sample_lag(), name="loop_lag_sampler")
+        self.detecting = supports_callback_timing(self.loop)
+        if not self.detecting:
+            log.warning("loop_monitor.no_callback_timing", loop=type(self.loop).__module__,
+                        detail="slow-callback detection needs a stock asyncio loop; only lag is sampled")
+            return
+        self._patch()
+        self._watchdog = threading.Thread(target=self._watch, args=(self._stop,), name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        self._unpatch()
+        self.loop = None
+        self.detecting = False
+        self._running = None
+
+    # Lag sampling
+
+    async def _sample_lag(self):
+        while True:
+            expected = time.perf_counter() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            lag = max(time.perf_counter() - expected, 0.0)
+            loop_lag_seconds.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    # Slow-callback detection
+
+    def _patch(self):
+        if self._original_run is not None:
+            return
+        original_run = asyncio.events.Handle._run
+        monitor = self
+
+        def _run(handle):
+            if asyncio.events._get_running_loop() is not monitor.loop:
+                return original_run(handle)
+            started = time.perf_counter()
+            monitor._running = (handle, started, None)
+            try:
+                return original_run(handle)
+            finally:
+                running, monitor._running = monitor._running, None
+                duration = time.perf_counter() - started
+                if duration >= monitor.threshold:
+                    monitor._record(handle, duration, *(running[2] if running and running[2] else (None, None)))
+
+        self._original_run = original_run
+        asyncio.events.Handle._run = _run
+
+    def _unpatch(self):
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+
+    def _watch(self, stop: threading.Event):
+        """Grab the loop thread's stack while a callback is stuck past the threshold"""
+        while not stop.wait(max(self.threshold / 2, 0.005)):
+            running = self._running
+            if running is None or running[2] is not None:
+                continue
+            handle, started, _ = running
+            if time.perf_counter() - started < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.format_list(traceback.extract_stack(frame, limit=STACK_DEPTH))
+            # Read the route now: a request finishing in this step resets it before _record
+            context = getattr(handle, "_context", None)
+            route = context.get(current_route) if context is not None else None
+            if self._running is running:
+                self._running = (handle, started, (stack, route))
+
+    def _record(self, handle: asyncio.Handle, duration: float, stack: Optional[List[str]], route: Optional[str]):
+        context = getattr(handle, "_context", None)
+        if route is None and context is not None:
+            route = context.get(current_route)
+        event = {
+            "callback": describe_callback(handle),
+            "route": route,
+            "duration_seconds": round(duration, 4),
+            "at": time.time(),
+            "stack": stack,
+        }
+        slow_callbacks_total.inc()
+        self.slow_callbacks.append(event)
+        for listener in self._listeners:
+            listener.append(event)
+
+    def snapshot(self) -> Dict:
+        return {
+            "running": self.running,
+            "slow_callback_detection": self.detecting,
+            "threshold_seconds": self.threshold,
+            "lag_interval_seconds": self.lag_interval,
+            "max_lag_seconds": round(self.max_lag, 4),
+            "lag_seconds": loop_lag_seconds.labels().snapshot(),
+            "slow_callbacks": list(self.slow_callbacks),
+        }
+
+    @contextmanager
+    def assert_no_stalls(self, threshold: Optional[float] = None):
+        """
+        Fail if any callback blocks the loop for `threshold` seconds or more
+        inside the block (defaults to the monitor's threshold):
+
+            with loop_monitor.assert_no_stalls(0.05):
+                client.post(...)
+        """
+        if not self.running:
+            raise RuntimeError("Loop monitor is not running (LOOP_MONITOR_ENABLED unset, or app lifespan not started?)")
+        if not self.detecting:
+            # Passing silently would hide every stall
+            raise RuntimeError("Slow-callback detection is unavailable on this event loop (uvloop?)")
+        previous_threshold = self.threshold
+        if threshold is not None:
+            self.threshold = threshold
+        events: List[Dict] = []
+        self._listeners.append(events)
+        try:
+            yield events
+        finally:
+            self._listeners.remove(events)
+            self.threshold = previous_threshold
+        if events:
+            worst = max(events, key=lambda event: event["duration_seconds"])
+            raise AssertionError(
+                f"{len(events)} callback(s) blocked the event loop; worst {worst['duration_seconds']}s "
+                f"in {worst['callback']} ({worst['route'] or 'no route'})\n" + "".join(worst["stack"] or [])
+            )
+
+class RouteContextMiddleware:
+    """Pure ASGI middleware that labels the request's tasks with current_route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        method = scope.get("method", "WS")
+        token = current_route.set(f"{method} {scope.get('path', '')}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
+
+# Global loop monitor instance
+loop_monitor = LoopMonitor(
+    threshold=settings.slow_callback_threshold_seconds,
+    lag_interval=settings.loop_lag_sample_interval,
+    history=settings.slow_callback_history,
+)
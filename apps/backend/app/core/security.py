@@ -1,10 +1,18 @@
 from datetime import datetime, timedelta
 from typing import Any, Union
-from jose import jwt
-from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.lazy import lazy
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lazy
+def jwt():
+    # python-jose loads its cryptography backend on import (~30 ms)
+    from jose import jwt
+    return jwt
+
+@lazy
+def pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def create_access_token(
     subject: Union[str, Any], expires_delta: timedelta = None
@@ -16,26 +24,26 @@ def create_access_token(
             minutes=settings.access_token_expire_minutes
         )
     to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+    encoded_jwt = jwt.get().encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
 def create_refresh_token(subject: Union[str, Any]) -> str:
     expire = datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
     to_encode = {"exp": expire, "sub": str(subject), "type": "refresh"}
-    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+    encoded_jwt = jwt.get().encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context.get().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context.get().hash(password)
 
 def verify_token(token: str) -> Union[str, None]:
     try:
-        payload = jwt.decode(
+        payload = jwt.get().decode(
             token, settings.secret_key, algorithms=[settings.algorithm]
         )
         return payload.get("sub")
-    except jwt.JWTError:
+    except jwt.get().JWTError:
         return None
\ No newline at end of file
@@ -0,0 +1,39 @@
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is a declared dependency
+    orjson = None
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        # Match pydantic's JSON output for UTC datetimes ("Z" suffix)
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Encode plain dicts/lists to JSON bytes with the same formatting pydantic uses"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for hot read endpoints.
+
+    Routes build plain dicts from projected rows and return this directly, so
+    FastAPI skips building and re-validating a pydantic model per row. Keep
+    the route's response_model for the OpenAPI schema; the payload must match it.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
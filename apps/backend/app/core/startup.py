@@ -0,0 +1,88 @@
+"""
+Cold-start profiling: import-time breakdown and time-to-first-request.
+
+Each measurement runs in a fresh interpreter so module caches from the
+calling process don't hide the real cost a new uvicorn worker pays.
+"""
+
+import json
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+_TTFR_SNIPPET = """
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+module = __import__(sys.argv[1], fromlist=["app"])
+t1 = time.perf_counter()
+
+async def first_request():
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": sys.argv[2], "raw_path": sys.argv[2].encode(),
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+    }
+    status = {}
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(event):
+        if event["type"] == "http.response.start":
+            status["code"] = event["status"]
+    await module.app(scope, receive, send)
+    return status.get("code")
+
+code = asyncio.run(first_request())
+t2 = time.perf_counter()
+
+from app.core.lazy import initialized_lazy_values
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "first_request_ms": (t2 - t1) * 1000,
+    "total_ms": (t2 - t0) * 1000,
+    "status_code": code,
+    "lazy_initialized": initialized_lazy_values(),
+}))
+"""
+
+def import_time_breakdown(module: str = "app.main") -> List[Tuple[str, float, float]]:
+    """Run `python -X importtime` and return (module, self_ms, cumulative_ms) rows"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        rows.append((name, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return rows
+
+def summarize_imports(rows: List[Tuple[str, float, float]], top: int = 15) -> Dict[str, List]:
+    """Group import cost by top-level package and list the slowest app modules"""
+    by_package: Dict[str, float] = {}
+    for name, self_ms, _ in rows:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0.0) + self_ms
+
+    app_modules = [(name, self_ms) for name, self_ms, _ in rows if name.startswith("app.")]
+
+    return {
+        "packages": sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top],
+        "app_modules": sorted(app_modules, key=lambda item: item[1], reverse=True)[:top],
+    }
+
+def time_to_first_request(module: str = "app.main", path: str = "/health") -> Dict:
+    """Import the app in a fresh interpreter and serve one request through ASGI"""
+    result = subprocess.run(
+        [sys.executable, "-c", _TTFR_SNIPPET, module, path],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
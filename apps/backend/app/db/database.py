@@ -1,27 +1,79 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.requests import HTTPConnection
 from app.core.config import settings
+from app.db.pool_metrics import InstrumentedQueuePool, instrument_pool, track_session_routes, track_commit_latency
 
-# SQLite specific configuration for development
-connect_args = {}
-if settings.database_url.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+def _create_engine(url: str):
+    # SQLite specific configuration for development
+    connect_args = {}
+    if url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False}
 
-engine = create_engine(
-    settings.database_url,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    connect_args=connect_args,
-)
+    pool_args = {}
+    if ":memory:" not in url and url != "sqlite://":
+        # In-memory SQLite needs its single-connection pool; everything else gets a sized queue pool
+        pool_args = {
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": settings.db_pool_size,
+            "max_overflow": settings.db_max_overflow,
+            "pool_timeout": settings.db_pool_timeout,
+        }
+
+    return create_engine(
+        url,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_recycle=settings.db_pool_recycle,
+        connect_args=connect_args,
+        **pool_args,
+    )
+
+engine = _create_engine(settings.database_url)
+instrument_pool("primary", engine.pool)
+
+# Read replica; falls back to the primary when none is configured
+replica_engine = engine
+if settings.database_replica_url:
+    replica_engine = _create_engine(settings.database_replica_url)
+    instrument_pool("replica", replica_engine.pool)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+track_session_routes(SessionLocal, ReplicaSessionLocal)
+track_commit_latency(SessionLocal)
 
 Base = declarative_base()
 
-def get_db():
+def _route_label(connection: HTTPConnection) -> str:
+    route = connection.scope.get("route")
+    path = getattr(route, "path", None) or connection.url.path
+    method = connection.scope.get("method", "WS")
+    return f"{method} {path}"
+
+def get_db(connection: HTTPConnection = None):
+    """Primary session, for routes that write"""
+    from app.db.routing import sticky_key
+
     db = SessionLocal()
+    if connection is not None:
+        # Lets the session router pin this caller to the primary after a commit
+        db.info["sticky_key"] = sticky_key(connection)
+        db.info["route"] = _route_label(connection)
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(connection: HTTPConnection = None):
+    """Session for read-only routes: the replica, unless the caller wrote recently"""
+    from app.db.routing import session_router, sticky_key
+
+    key = sticky_key(connection) if connection is not None else None
+    db = session_router.read_session(key)
+    if connection is not None:
+        db.info["route"] = _route_label(connection)
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,142 @@
+"""
+Monthly range partitioning of `messages` on created_at (PostgreSQL only).
+
+The partitioned parent is created by init_db.py when
+MESSAGE_PARTITIONING_ENABLED is set, before create_all() would create the
+plain table. Upcoming partitions are created ahead of time by a background
+task, and retention is enforced by detaching and dropping whole partitions
+instead of DELETE-ing rows.
+"""
+
+import re
+from datetime import date
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.log import get_logger
+from app.models.conversation import MessageType
+
+log = get_logger("chat.partitioning")
+
+PARENT_TABLE = "messages"
+_PARTITION_NAME = re.compile(r"^messages_y(\d{4})m(\d{2})$")
+
+def _month_start(day: date, offset: int = 0) -> date:
+    month_index = day.year * 12 + (day.month - 1) + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+def is_postgres(engine: Engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+def is_partitioned(conn: Connection) -> bool:
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+        {"name": PARENT_TABLE}
+    ).scalar()
+    return relkind == "p"
+
+def create_partitioned_messages_table(engine: Engine):
+    """
+    Create `messages` as a partitioned table mirroring the Message model.
+    The primary key has to include the partition key, so it is (id, created_at).
+    """
+    enum_values = ", ".join(f"'{member.name}'" for member in MessageType)
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            DO $$ BEGIN
+                CREATE TYPE messagetype AS ENUM ({enum_values});
+            EXCEPTION WHEN duplicate_object THEN NULL;
+            END $$;
+        """))
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {PARENT_TABLE} (
+                id VARCHAR NOT NULL,
+                conversation_id VARCHAR NOT NULL REFERENCES conversations (id),
+                sender_id VARCHAR NOT NULL,
+                sender VARCHAR NOT NULL,
+                type messagetype,
+                content TEXT NOT NULL,
+                message_metadata JSON,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+                read_at TIMESTAMP WITH TIME ZONE,
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at)
+        """))
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_messages_conversation_created "
+            f"ON {PARENT_TABLE} (conversation_id, created_at)"
+        ))
+
+def list_message_partitions(conn: Connection) -> List[Tuple[str, date]]:
+    """(partition name, month start) for every monthly partition, oldest first"""
+    rows = conn.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :name
+    """), {"name": PARENT_TABLE}).scalars()
+
+    partitions = []
+    for name in rows:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def ensure_message_partitions(engine: Engine, months_ahead: int, today: Optional[date] = None) -> List[str]:
+    """Create partitions for the current month and the next `months_ahead` months"""
+    today = today or date.today()
+    created = []
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return created
+
+        existing = {name for name, _ in list_message_partitions(conn)}
+        for offset in range(months_ahead + 1):
+            start = _month_start(today, offset)
+            name = partition_name(start)
+            if name in existing:
+                continue
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{_month_start(start, 1).isoformat()}')"
+            ))
+            created.append(name)
+    return created
+
+def drop_expired_message_partitions(engine: Engine, retention_months: int, detach_only: bool = False,
+                                    today: Optional[date] = None) -> List[str]:
+    """
+    Detach (and by default drop) partitions entirely older than the retention window.
+    Detached-only partitions stay around as standalone tables for offline archiving.
+    """
+    cutoff = _month_start(today or date.today(), -retention_months)
+    removed = []
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return removed
+
+        for name, month in list_message_partitions(conn):
+            if month >= cutoff:
+                break
+            conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            if not detach_only:
+                conn.execute(text(f"DROP TABLE {name}"))
+            removed.append(name)
+    return removed
+
+def maintain_message_partitions(engine: Engine, months_ahead: int, retention_months: Optional[int] = None):
+    """Periodic job: create upcoming partitions and enforce retention"""
+    created = ensure_message_partitions(engine, months_ahead)
+    if created:
+        log.info("partitions.created", partitions=", ".join(created))
+
+    if retention_months:
+        removed = drop_expired_message_partitions(engine, retention_months)
+        if removed:
+            log.info("partitions.dropped", partitions=", ".join(removed))
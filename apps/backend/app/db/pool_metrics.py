@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app.core.metrics import Histogram, db_commit_seconds
+
+class PoolMonitor:
+    """
+    Live view of one connection pool: how long callers wait for a
+    connection, and which routes are holding the ones checked out.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self.wait_time = Histogram()
+        self.hold_time = Histogram()
+        self.timeouts = 0
+        self._holders: Dict[int, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def attach(self, pool):
+        self.pool = pool
+        event.listen(pool, "checkout", self._on_checkout)
+        event.listen(pool, "checkin", self._on_checkin)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self._holders[id(dbapi_connection)] = ("unattributed", time.monotonic())
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            holder = self._holders.pop(id(dbapi_connection), None)
+        if holder:
+            self.hold_time.observe(time.monotonic() - holder[1])
+
+    def set_holder(self, dbapi_connection, route: Optional[str]):
+        """Attribute a checked-out connection to the route using it"""
+        with self._lock:
+            holder = self._holders.get(id(dbapi_connection))
+            if holder:
+                self._holders[id(dbapi_connection)] = (route or "unattributed", holder[1])
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            holders = list(self._holders.values())
+
+        stats = {
+            "wait_seconds": self.wait_time.snapshot(),
+            "hold_seconds": self.hold_time.snapshot(),
+            "timeouts": self.timeouts,
+            "holders_by_route": dict(Counter(route for route, _ in holders)),
+            "oldest_checkout_seconds": max((now - since for _, since in holders), default=0.0),
+        }
+        if isinstance(self.pool, QueuePool):
+            stats.update({
+                "size": self.pool.size(),
+                "checked_out": self.pool.checkedout(),
+                "checked_in": self.pool.checkedin(),
+                "overflow": max(self.pool.overflow(), 0),
+                "max_overflow": self.pool._max_overflow,
+                "timeout": self.pool.timeout(),
+            })
+        return stats
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    monitor: Optional[PoolMonitor] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if self.monitor:
+                self.monitor.timeouts += 1
+            raise
+        finally:
+            if self.monitor:
+                self.monitor.wait_time.observe(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        if self.monitor:
+            self.monitor.attach(pool)
+            pool.monitor = self.monitor
+        return pool
+
+# Monitors by engine role ("primary", "replica")
+pool_monitors: Dict[str, PoolMonitor] = {}
+
+def instrument_pool(name: str, pool) -> PoolMonitor:
+    monitor = PoolMonitor(name)
+    monitor.attach(pool)
+    if isinstance(pool, InstrumentedQueuePool):
+        pool.monitor = monitor
+    pool_monitors[name] = monitor
+    return monitor
+
+def track_session_routes(*session_factories):
+    """Attribute connections to the route stored in session.info["route"] when a transaction begins"""
+    def _on_begin(session, transaction, connection):
+        route = session.info.get("route")
+        if route:
+            monitor = pool_monitors.get(_role_of(connection.engine.pool))
+            if monitor:
+                monitor.set_holder(connection.connection.dbapi_connection, route)
+
+    for factory in session_factories:
+        event.listen(factory, "after_begin", _on_begin)
+
+def track_commit_latency(*session_factories):
+    """Observe how long each Session.commit() takes, flush included"""
+    def _before_commit(session):
+        session.info["commit_started"] = time.perf_counter()
+
+    def _after_commit(session):
+        started = session.info.pop("commit_started", None)
+        if started is not None:
+            db_commit_seconds.observe(time.perf_counter() - started)
+
+    def _after_soft_rollback(session, previous_transaction):
+        session.info.pop("commit_started", None)
+
+    for factory in session_factories:
+        event.listen(factory, "before_commit", _before_commit)
+        event.listen(factory, "after_commit", _after_commit)
+        event.listen(factory, "after_soft_rollback", _after_soft_rollback)
+
+def _role_of(pool) -> Optional[str]:
+    for name, monitor in pool_monitors.items():
+        if monitor.pool is pool:
+            return name
+    return None
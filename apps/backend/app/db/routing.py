@@ -0,0 +1,109 @@
+import time
+from typing import Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.requests import HTTPConnection
+
+from app.core.config import settings
+from app.core.security import verify_token
+from app.db.database import SessionLocal, ReplicaSessionLocal, engine, replica_engine
+
+def sticky_key(connection: HTTPConnection) -> Optional[str]:
+    """Identify the caller (agent or visitor) for read-your-writes stickiness"""
+    authorization = connection.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        user_id = verify_token(authorization[7:])
+        if user_id:
+            return f"user:{user_id}"
+
+    visitor_id = connection.path_params.get("visitor_id") or connection.query_params.get("visitor_id")
+    if visitor_id:
+        return f"visitor:{visitor_id}"
+
+    user_id = connection.path_params.get("user_id")
+    if user_id:
+        return f"user:{user_id}"
+
+    return None
+
+def set_sticky_key(db: Session, key: str):
+    """
+    Name the caller for a session whose request did not identify them
+    (e.g. the visitor ID is in the body), so its commit pins them to the primary
+    """
+    if not db.info.get("sticky_key"):
+        db.info["sticky_key"] = key
+
+class SessionRouter:
+    """
+    Send reads to the replica and writes to the primary.
+
+    A caller that committed a write in the last `sticky_seconds` keeps
+    reading from the primary, so they always see their own writes despite
+    replication lag.
+    """
+
+    def __init__(self, sticky_seconds: float):
+        self.sticky_seconds = sticky_seconds
+        self._last_write: Dict[str, float] = {}
+
+    @property
+    def has_replica(self) -> bool:
+        return replica_engine is not engine
+
+    def record_write(self, key: Optional[str]):
+        # Without a replica every read is on the primary; nothing to track
+        if key and self.has_replica:
+            self._last_write[key] = time.monotonic()
+
+    def use_primary(self, key: Optional[str]) -> bool:
+        if not self.has_replica:
+            return True
+        if key is None:
+            return False
+
+        last_write = self._last_write.get(key)
+        if last_write is None:
+            return False
+        if time.monotonic() - last_write < self.sticky_seconds:
+            return True
+
+        # sweep() may have removed it meanwhile
+        self._last_write.pop(key, None)
+        return False
+
+    def sweep(self) -> int:
+        """Forget callers whose sticky window has passed; returns how many"""
+        cutoff = time.monotonic() - self.sticky_seconds
+        expired = [key for key, last_write in list(self._last_write.items()) if last_write < cutoff]
+        for key in expired:
+            last_write = self._last_write.get(key)
+            if last_write is not None and last_write < cutoff:
+                self._last_write.pop(key, None)
+        return len(expired)
+
+    def read_session(self, key: Optional[str] = None) -> Session:
+        return SessionLocal() if self.use_primary(key) else ReplicaSessionLocal()
+
+# Global session router instance
+session_router = SessionRouter(sticky_seconds=settings.replica_sticky_seconds)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_session_wrote(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_statement_wrote(orm_execute_state):
+    # Core insert/update/delete through session.execute() never flushes
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(SessionLocal, "after_commit")
+def _record_sticky_write(session):
+    if session.info.pop("wrote", False):
+        session_router.record_write(session.info.get("sticky_key"))
+
+if replica_engine is not engine:
+    @event.listens_for(ReplicaSessionLocal, "before_flush")
+    def _reject_replica_writes(session, flush_context, instances):
+        raise RuntimeError("Attempted to write through a read-replica session")
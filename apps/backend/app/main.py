@@ -1,13 +1,85 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.api.router import api_router
 from app.websockets.endpoints import router as websocket_router
 from app.core.config import settings
+from app.core.background import background_tasks
+from app.core.metrics import registry
+from app.core.log import setup_logging, get_logger
+from app.core.loop_monitor import loop_monitor, RouteContextMiddleware
+from app.db.database import engine
+
+setup_logging()
+log = get_logger("chat.main")
+
+def register_background_tasks():
+    from app.services.presence import presence_tracker
+    from app.services.page_views import page_view_buffer
+    from app.services.read_receipts import read_receipts
+    from app.services.read_markers import read_markers
+    from app.services.analytics import analytics_recorder
+    from app.db.routing import session_router
+    background_tasks.add(
+        "presence_flush", presence_tracker.flush, settings.presence_flush_interval, run_on_stop=True
+    )
+    background_tasks.add(
+        "read_marker_flush", read_markers.flush, settings.read_marker_flush_interval, run_on_stop=True
+    )
+    background_tasks.add(
+        "read_receipt_flush", read_receipts.flush, settings.read_receipt_flush_interval, run_on_stop=True
+    )
+    background_tasks.add(
+        "page_view_flush", page_view_buffer.flush, settings.page_view_flush_interval, run_on_stop=True
+    )
+    background_tasks.add(
+        "analytics_flush", analytics_recorder.flush, settings.analytics_flush_interval, run_on_stop=True
+    )
+    if session_router.has_replica:
+        background_tasks.add("sticky_write_sweep", session_router.sweep, settings.replica_sticky_seconds)
+    
+    if settings.message_partitioning_enabled:
+        from app.db.partitioning import is_postgres, maintain_message_partitions
+        if is_postgres(engine):
+            background_tasks.add(
+                "message_partitions",
+                lambda: maintain_message_partitions(
+                    engine, settings.message_partitions_ahead, settings.message_retention_months
+                ),
+                settings.message_partition_maintenance_interval,
+            )
+
+def rebuild_waiting_queues():
+    from app.db.database import SessionLocal
+    from app.services.waiting_queue import waiting_queues
+    db = SessionLocal()
+    try:
+        log.info("waiting_queue.rebuilt", conversations=waiting_queues.rebuild(db))
+    except Exception:
+        log.exception("waiting_queue.rebuild_failed")
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.loop_monitor_enabled:
+        loop_monitor.start()
+    rebuild_waiting_queues()
+    register_background_tasks()
+    for task in background_tasks.tasks.values():
+        # Run each job once at startup so e.g. this month's partition exists
+        await task.run_once()
+    background_tasks.start_all()
+    yield
+    await background_tasks.stop_all()
+    loop_monitor.stop()
 
 app = FastAPI(
     title="Website Chat API",
     description="Backend API for multi-website chat application",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -17,6 +89,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if settings.loop_monitor_enabled:
+    # Lets the slow-callback detector name the route a stalled task belongs to
+    app.add_middleware(RouteContextMiddleware)
 
 app.include_router(api_router, prefix="/api/v1")
 app.include_router(websocket_router, prefix="/ws", tags=["websockets"])
@@ -29,4 +104,10 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+if settings.metrics_enabled:
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        """Prometheus scrape endpoint; values are per worker process"""
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Socket.IO functionality moved to WebSocket endpoints
\ No newline at end of file
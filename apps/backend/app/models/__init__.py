@@ -1,7 +1,8 @@
 from .user import User, UserRole, UserStatus
 from .website import Website
 from .visitor import Visitor, VisitorSession, PageView
-from .conversation import Conversation, Message, ConversationStatus, MessageType, SenderType, Priority
+from .conversation import Conversation, Message, MessageArchive, ConversationStatus, MessageType, SenderType, Priority
+from .analytics import ConversationMetrics, ConversationRollup
 
 __all__ = [
     "User",
@@ -13,8 +14,11 @@ __all__ = [
     "PageView",
     "Conversation",
     "Message",
+    "MessageArchive",
     "ConversationStatus",
     "MessageType",
     "SenderType",
     "Priority",
+    "ConversationMetrics",
+    "ConversationRollup",
 ]
\ No newline at end of file
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, DateTime, String, ForeignKey, Integer, Float
+from app.db.database import Base
+
+class ConversationMetrics(Base):
+    """Per-conversation facts the hourly rollups are derived from"""
+    __tablename__ = "conversation_metrics"
+
+    conversation_id = Column(String, ForeignKey("conversations.id"), primary_key=True)
+    website_id = Column(String, ForeignKey("websites.id"), nullable=False, index=True)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    first_visitor_message_at = Column(DateTime(timezone=True), nullable=True)
+    first_response_at = Column(DateTime(timezone=True), nullable=True)
+    first_response_agent_id = Column(String, nullable=True)
+    first_response_seconds = Column(Float, nullable=True)
+    resolved_at = Column(DateTime(timezone=True), nullable=True)
+    resolution_seconds = Column(Float, nullable=True)
+    visitor_messages = Column(Integer, nullable=False, default=0)
+    agent_messages = Column(Integer, nullable=False, default=0)
+    agent_id = Column(String, nullable=True)  # Credited with the resolution and rating
+    rating = Column(Integer, nullable=True)
+
+class ConversationRollup(Base):
+    """
+    Hourly conversation counters per website and agent.
+    agent_id is "" for visitor-side facts (new conversations, visitor messages).
+    """
+    __tablename__ = "conversation_rollups"
+
+    website_id = Column(String, ForeignKey("websites.id"), primary_key=True)
+    agent_id = Column(String, primary_key=True, default="")
+    bucket_start = Column(DateTime, primary_key=True)  # UTC hour
+    conversations_started = Column(Integer, nullable=False, default=0)
+    visitor_messages = Column(Integer, nullable=False, default=0)
+    agent_messages = Column(Integer, nullable=False, default=0)
+    first_responses = Column(Integer, nullable=False, default=0)
+    first_response_seconds = Column(Float, nullable=False, default=0)
+    resolutions = Column(Integer, nullable=False, default=0)
+    resolution_seconds = Column(Float, nullable=False, default=0)
+    ratings = Column(Integer, nullable=False, default=0)
+    rating_total = Column(Integer, nullable=False, default=0)
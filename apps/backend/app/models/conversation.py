@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, String, Enum, ForeignKey, Integer, Text, JSON
+from sqlalchemy import Boolean, Column, DateTime, String, Enum, ForeignKey, Integer, Text, JSON, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -65,4 +65,16 @@ class Message(Base):
     read_at = Column(DateTime(timezone=True), nullable=True)
 
     # Relationships
-    conversation = relationship("Conversation", back_populates="messages")
\ No newline at end of file
+    conversation = relationship("Conversation", back_populates="messages")
+
+class MessageArchive(Base):
+    """Cold storage for the messages of a closed conversation, one compressed blob per conversation"""
+    __tablename__ = "message_archives"
+
+    conversation_id = Column(String, ForeignKey("conversations.id"), primary_key=True)
+    message_count = Column(Integer, nullable=False)
+    first_message_at = Column(DateTime(timezone=True), nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    last_message_preview = Column(Text, nullable=True)  # Lets the inbox skip decompressing
+    payload = Column(LargeBinary, nullable=False)  # zlib-compressed JSON array of messages
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
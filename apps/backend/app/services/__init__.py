@@ -0,0 +1 @@
+# In-process services shared by the REST and WebSocket layers
\ No newline at end of file
@@ -0,0 +1,474 @@
+"""
+Incremental conversation analytics.
+
+The record_* hooks only append an event to an in-memory buffer, so the write
+paths pay no analytics queries. AnalyticsRecorder.flush() applies the
+buffered events in one transaction: it updates each conversation's
+ConversationMetrics row and adds to the hourly ConversationRollup buckets, so
+dashboards sum a few hundred rollup rows instead of scanning messages.
+Dashboards lag by at most the flush interval. backfill_analytics() rebuilds
+both tables from history.
+"""
+
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.log import get_logger
+from app.core.metrics import registry
+from app.db import repository
+from app.db.database import SessionLocal
+from app.models.analytics import ConversationMetrics, ConversationRollup
+from app.models.conversation import Conversation, Message, MessageArchive
+from app.services.archival import decode_archive
+
+log = get_logger("chat.analytics")
+events_dropped = registry.counter(
+    "chat_analytics_events_dropped_total", "Analytics events dropped: rejected by the database or the buffer was full"
+)
+
+COUNTERS = (
+    "conversations_started",
+    "visitor_messages",
+    "agent_messages",
+    "first_responses",
+    "first_response_seconds",
+    "resolutions",
+    "resolution_seconds",
+    "ratings",
+    "rating_total",
+)
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive UTC, whatever the driver returned"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def hour_bucket(at: datetime) -> datetime:
+    return _as_utc(at).replace(minute=0, second=0, microsecond=0)
+
+def _credited_agent(metrics: dict, assigned_agent_id: Optional[str] = None) -> str:
+    """Resolutions and ratings go to the agent who first responded, else the assignee"""
+    return metrics["agent_id"] or metrics["first_response_agent_id"] or assigned_agent_id or ""
+
+class _Batch:
+    """State shared by the events of one flush"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.metrics: Dict[str, dict] = {}
+        # conversation_id -> counter increments, applied in one executemany
+        self.counters: Dict[str, dict] = {}
+        self.rollups: Dict[Tuple[str, str, datetime], Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+        # Increments of the event being applied; kept only if its savepoint succeeds
+        self._staged: List[tuple] = []
+
+    def keep(self):
+        for apply, args in self._staged:
+            apply(*args)
+        self._staged = []
+
+    def discard(self, conversation_id: str):
+        """Forget a failed event; its cached metrics row may hold its changes"""
+        self._staged = []
+        self.metrics.pop(conversation_id, None)
+
+    def get(self, conversation_id: str) -> Optional[dict]:
+        """The conversation's metrics row, as of this flush"""
+        metrics = self.metrics.get(conversation_id)
+        if metrics is None:
+            metrics = _load_metrics(self.db, conversation_id)
+            if metrics is not None:
+                self.metrics[conversation_id] = metrics
+        return metrics
+
+    def count(self, conversation_id: str, sender: str, at: datetime):
+        self._staged.append((self._count, (conversation_id, sender, at)))
+
+    def increment(self, website_id: str, agent_id: Optional[str], at: datetime, **counts):
+        self._staged.append((self._increment, (website_id, agent_id, at, counts)))
+
+    def _count(self, conversation_id: str, sender: str, at: datetime):
+        counters = self.counters.setdefault(
+            conversation_id, {"visitors": 0, "agents": 0, "first_visitor": None}
+        )
+        if sender == "agent":
+            counters["agents"] += 1
+        else:
+            counters["visitors"] += 1
+            if counters["first_visitor"] is None:
+                counters["first_visitor"] = at
+
+    def _increment(self, website_id: str, agent_id: Optional[str], at: datetime, counts: dict):
+        bucket = self.rollups[(website_id, agent_id or "", hour_bucket(at))]
+        for name, value in counts.items():
+            bucket[name] += value
+
+def _load_metrics(db: Session, conversation_id: str) -> Optional[dict]:
+    table = ConversationMetrics.__table__
+    query = select(table).where(table.c.conversation_id == conversation_id)
+    row = db.execute(query).first()
+    if row is None:
+        # Conversation predates the rollups and has not been backfilled
+        conversation = repository.get_conversation_by_id(db, conversation_id)
+        if conversation is None:
+            return None
+        repository.insert_or_ignore(db, ConversationMetrics, {
+            "conversation_id": conversation.id,
+            "website_id": conversation.website_id,
+            "started_at": _as_utc(conversation.created_at) or datetime.utcnow(),
+            "visitor_messages": 0,
+            "agent_messages": 0,
+        })
+        row = db.execute(query).first()
+    return dict(row._mapping)
+
+def _apply_started(batch: _Batch, conversation_id: str, website_id: str, at: datetime):
+    if repository.insert_or_ignore(batch.db, ConversationMetrics, {
+        "conversation_id": conversation_id,
+        "website_id": website_id,
+        "started_at": at,
+        "visitor_messages": 0,
+        "agent_messages": 0,
+    }):
+        batch.increment(website_id, None, at, conversations_started=1)
+
+def _apply_message(batch: _Batch, conversation_id: str, sender: str, sender_id: str, at: datetime):
+    metrics = batch.get(conversation_id)
+    if metrics is None:
+        return
+    batch.count(conversation_id, sender, at)
+
+    if sender != "agent":
+        if metrics["first_visitor_message_at"] is None:
+            metrics["first_visitor_message_at"] = at
+        batch.increment(metrics["website_id"], None, at, visitor_messages=1)
+        return
+
+    counts = {"agent_messages": 1}
+    if metrics["first_response_at"] is None:
+        waited_since = _as_utc(metrics["first_visitor_message_at"]) or _as_utc(metrics["started_at"])
+        seconds = max((at - waited_since).total_seconds(), 0.0)
+        # Guarded, so concurrent workers count a first response once
+        table = ConversationMetrics.__table__
+        claimed = batch.db.execute(
+            update(table).where(
+                table.c.conversation_id == conversation_id,
+                table.c.first_response_at.is_(None)
+            ).values(first_response_at=at, first_response_agent_id=sender_id, first_response_seconds=seconds)
+        ).rowcount
+        metrics["first_response_at"] = at
+        if claimed == 1:
+            metrics["first_response_agent_id"] = sender_id
+            counts.update(first_responses=1, first_response_seconds=seconds)
+    batch.increment(metrics["website_id"], sender_id, at, **counts)
+
+def _apply_resolved(batch: _Batch, conversation_id: str, assigned_agent_id: Optional[str], at: datetime):
+    """Counts the first resolution only; reopening does not undo it"""
+    metrics = batch.get(conversation_id)
+    if metrics is None or metrics["resolved_at"] is not None:
+        return
+    agent_id = _credited_agent(metrics, assigned_agent_id)
+    seconds = max((at - _as_utc(metrics["started_at"])).total_seconds(), 0.0)
+    table = ConversationMetrics.__table__
+    claimed = batch.db.execute(
+        update(table).where(
+            table.c.conversation_id == conversation_id,
+            table.c.resolved_at.is_(None)
+        ).values(agent_id=agent_id, resolved_at=at, resolution_seconds=seconds)
+    ).rowcount
+    metrics["resolved_at"] = at
+    if claimed == 1:
+        metrics["agent_id"] = agent_id
+        batch.increment(metrics["website_id"], agent_id, at, resolutions=1, resolution_seconds=seconds)
+
+def _apply_rating(batch: _Batch, conversation_id: str, rating: int):
+    """Ratings are bucketed by conversation start; a changed rating replaces the old one"""
+    table = ConversationMetrics.__table__
+    for _ in range(3):
+        metrics = batch.get(conversation_id)
+        if metrics is None:
+            return
+        agent_id = _credited_agent(metrics)
+        previous = metrics["rating"]
+        # Compare-and-set on the old rating so the rollup delta matches what was replaced
+        unchanged = table.c.rating.is_(None) if previous is None else table.c.rating == previous
+        claimed = batch.db.execute(
+            update(table).where(table.c.conversation_id == conversation_id, unchanged).values(
+                rating=rating, agent_id=agent_id
+            )
+        ).rowcount
+        if claimed == 1:
+            metrics.update(rating=rating, agent_id=agent_id)
+            if previous is not None:
+                counts = {"rating_total": rating - previous}
+            else:
+                counts = {"ratings": 1, "rating_total": rating}
+            batch.increment(metrics["website_id"], agent_id, metrics["started_at"], **counts)
+            return
+        # Another worker changed it; reload and retry
+        batch.metrics.pop(conversation_id, None)
+
+_APPLY = {
+    "started": _apply_started,
+    "message": _apply_message,
+    "resolved": _apply_resolved,
+    "rating": _apply_rating,
+}
+
+class AnalyticsRecorder:
+    """
+    Buffers analytics events from the write paths; flush() applies them.
+
+    Events are applied in order in one transaction, each under its own
+    savepoint: an event the database rejects (say, for a conversation that
+    no longer exists) is dropped and counted instead of failing the batch.
+    If the database is unreachable the batch goes back into the buffer.
+    The buffer holds at most `max_pending` events; beyond that new events
+    are dropped.
+
+    Message counters are summed per conversation and written as
+    `col = col + n` in one executemany, rollup increments are summed per
+    hourly bucket, and one-time facts (first response, resolution) are set
+    with guarded UPDATEs, so concurrent workers neither lose counts nor
+    count twice.
+    """
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self._events: List[tuple] = []
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def record(self, kind: str, *args):
+        with self._lock:
+            if len(self._events) >= self.max_pending:
+                self._drop(1)
+                return
+            self._events.append((kind, args))
+
+    @property
+    def pending(self) -> int:
+        return len(self._events)
+
+    def _drop(self, count: int):
+        self.dropped += count
+        events_dropped.inc(count)
+
+    def flush(self) -> int:
+        """Apply buffered events. Returns the number applied."""
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+
+        applied: List[tuple] = []
+        position = 0
+        db = SessionLocal()
+        try:
+            repository.begin_for_savepoints(db)
+            batch = _Batch(db)
+            for position, (kind, args) in enumerate(events):
+                try:
+                    with db.begin_nested():
+                        _APPLY[kind](batch, *args)
+                except OperationalError:
+                    raise
+                except Exception as e:
+                    batch.discard(args[0])
+                    self._drop(1)
+                    log.error("analytics.event_dropped", kind=kind, conversation_id=args[0], error=str(e))
+                    continue
+                batch.keep()
+                applied.append((kind, args))
+            position = len(events)
+
+            _write_counters(db, batch.counters)
+            for (website_id, agent_id, bucket_start), counts in batch.rollups.items():
+                repository.increment_counters(db, ConversationRollup, {
+                    "website_id": website_id,
+                    "agent_id": agent_id,
+                    "bucket_start": bucket_start,
+                }, dict(counts))
+            db.commit()
+        except OperationalError as e:
+            db.rollback()
+            unapplied = applied + events[position:]
+            log.warning("analytics.flush_deferred", events=len(unapplied), error=str(e))
+            self._requeue(unapplied)
+            return 0
+        except Exception as e:
+            db.rollback()
+            # Summed writes failing is not one event's fault; retrying would fail the same way
+            self._drop(len(applied))
+            log.exception("analytics.batch_dropped", events=len(applied), error=str(e))
+            return 0
+        finally:
+            db.close()
+
+        return len(applied)
+
+    def _requeue(self, events: List[tuple]):
+        """Put unapplied events back ahead of newer ones, within max_pending"""
+        with self._lock:
+            room = max(self.max_pending - len(self._events), 0)
+            kept = events[:room]
+            self._drop(len(events) - len(kept))
+            self._events[:0] = kept
+
+def _write_counters(db: Session, counters: Dict[str, dict]):
+    if not counters:
+        return
+    table = ConversationMetrics.__table__
+    stmt = update(table).where(table.c.conversation_id == bindparam("conversation")).values(
+        visitor_messages=table.c.visitor_messages + bindparam("visitors"),
+        agent_messages=table.c.agent_messages + bindparam("agents"),
+        first_visitor_message_at=func.coalesce(table.c.first_visitor_message_at, bindparam("first_visitor")),
+    )
+    db.execute(stmt, [
+        {"conversation": conversation_id, **counts}
+        for conversation_id, counts in counters.items()
+    ])
+
+# Global analytics recorder instance
+analytics_recorder = AnalyticsRecorder(settings.analytics_max_pending_events)
+registry.gauge("chat_analytics_events_pending", "Analytics events awaiting the next flush",
+               function=lambda: analytics_recorder.pending)
+
+def record_conversation_started(conversation_id: str, website_id: str, at: Optional[datetime] = None):
+    analytics_recorder.record("started", conversation_id, website_id, _as_utc(at) or datetime.utcnow())
+
+def record_message(conversation_id: str, sender: str, sender_id: str, at: Optional[datetime] = None):
+    analytics_recorder.record("message", conversation_id, sender, sender_id, _as_utc(at) or datetime.utcnow())
+
+def record_resolved(conversation_id: str, assigned_agent_id: Optional[str] = None,
+                    at: Optional[datetime] = None):
+    analytics_recorder.record("resolved", conversation_id, assigned_agent_id, _as_utc(at) or datetime.utcnow())
+
+def record_rating(conversation_id: str, rating: int):
+    analytics_recorder.record("rating", conversation_id, rating)
+
+def backfill_analytics(db: Session, batch_size: int = 500) -> Dict[str, int]:
+    """
+    Rebuild conversation_metrics and conversation_rollups from conversations
+    and messages, archived messages included. Replaces existing rows; commits.
+
+    Conversations are processed `batch_size` at a time (keyset pagination on
+    the ID), with their messages streamed, so memory holds one page of
+    messages plus the rollup buckets rather than the whole history.
+    """
+    db.query(ConversationRollup).delete(synchronize_session=False)
+    db.query(ConversationMetrics).delete(synchronize_session=False)
+
+    buckets: Dict[Tuple[str, str, datetime], Dict[str, float]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    total = 0
+    last_id = None
+    while True:
+        query = select(
+            Conversation.id, Conversation.website_id, Conversation.assigned_agent_id,
+            Conversation.created_at, Conversation.closed_at, Conversation.rating
+        ).order_by(Conversation.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(Conversation.id > last_id)
+        conversations = db.execute(query).all()
+        if not conversations:
+            break
+        last_id = conversations[-1].id
+
+        rows = _backfill_page(db, conversations, buckets, batch_size)
+        db.bulk_insert_mappings(ConversationMetrics, rows)
+        total += len(rows)
+
+    rollups = [
+        {"website_id": website_id, "agent_id": agent_id, "bucket_start": bucket_start, **counts}
+        for (website_id, agent_id, bucket_start), counts in buckets.items()
+    ]
+    for start in range(0, len(rollups), batch_size):
+        db.bulk_insert_mappings(ConversationRollup, rollups[start:start + batch_size])
+    db.commit()
+
+    return {"conversations": total, "rollups": len(rollups)}
+
+def _backfill_page(db: Session, conversations, buckets, batch_size: int) -> List[dict]:
+    """Metrics rows for one page of conversations; adds their counts to `buckets`"""
+    ids = [row.id for row in conversations]
+
+    # Collect the page's messages in time order
+    messages = defaultdict(list)
+    hot = db.execute(
+        select(Message.conversation_id, Message.sender, Message.sender_id, Message.created_at)
+        .where(Message.conversation_id.in_(ids))
+        .execution_options(yield_per=batch_size)
+    )
+    for row in hot:
+        messages[row.conversation_id].append((_as_utc(row.created_at), row.sender, row.sender_id))
+    archived = db.execute(
+        select(MessageArchive.conversation_id, MessageArchive.payload)
+        .where(MessageArchive.conversation_id.in_(ids))
+        .execution_options(yield_per=batch_size)
+    )
+    for row in archived:
+        for message in decode_archive(row.payload):
+            messages[row.conversation_id].append(
+                (_as_utc(message["created_at"]), message["sender"], message["sender_id"])
+            )
+
+    rows = []
+    for conversation in conversations:
+        fact = {
+            "conversation_id": conversation.id,
+            "website_id": conversation.website_id,
+            "started_at": _as_utc(conversation.created_at) or datetime.utcnow(),
+            "first_visitor_message_at": None,
+            "first_response_at": None,
+            "first_response_agent_id": None,
+            "first_response_seconds": None,
+            "resolved_at": _as_utc(conversation.closed_at),
+            "resolution_seconds": None,
+            "agent_id": None,
+            "visitor_messages": 0,
+            "agent_messages": 0,
+            "rating": conversation.rating,
+        }
+        website_id = fact["website_id"]
+        buckets[(website_id, "", hour_bucket(fact["started_at"]))]["conversations_started"] += 1
+
+        for at, sender, sender_id in sorted(messages.pop(conversation.id, ()), key=lambda m: m[0] or fact["started_at"]):
+            at = at or fact["started_at"]
+            if sender == "agent":
+                fact["agent_messages"] += 1
+                bucket = buckets[(website_id, sender_id, hour_bucket(at))]
+                bucket["agent_messages"] += 1
+                if fact["first_response_at"] is None:
+                    waited_since = fact["first_visitor_message_at"] or fact["started_at"]
+                    fact["first_response_at"] = at
+                    fact["first_response_agent_id"] = sender_id
+                    fact["first_response_seconds"] = max((at - waited_since).total_seconds(), 0.0)
+                    bucket["first_responses"] += 1
+                    bucket["first_response_seconds"] += fact["first_response_seconds"]
+            else:
+                fact["visitor_messages"] += 1
+                if fact["first_visitor_message_at"] is None:
+                    fact["first_visitor_message_at"] = at
+                buckets[(website_id, "", hour_bucket(at))]["visitor_messages"] += 1
+
+        if fact["resolved_at"] is not None or fact["rating"] is not None:
+            fact["agent_id"] = fact["first_response_agent_id"] or conversation.assigned_agent_id or ""
+        if fact["resolved_at"] is not None:
+            fact["resolution_seconds"] = max((fact["resolved_at"] - fact["started_at"]).total_seconds(), 0.0)
+            bucket = buckets[(website_id, fact["agent_id"], hour_bucket(fact["resolved_at"]))]
+            bucket["resolutions"] += 1
+            bucket["resolution_seconds"] += fact["resolution_seconds"]
+        if fact["rating"] is not None:
+            bucket = buckets[(website_id, fact["agent_id"], hour_bucket(fact["started_at"]))]
+            bucket["ratings"] += 1
+            bucket["rating_total"] += fact["rating"]
+        rows.append(fact)
+
+    return rows
@@ -0,0 +1,122 @@
+import json
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import func, exists
+from sqlalchemy.orm import Session
+
+from app.core.serialization import dumps
+from app.models.conversation import Conversation, Message, MessageArchive, ConversationStatus
+
+ARCHIVABLE_STATUSES = [ConversationStatus.RESOLVED, ConversationStatus.ARCHIVED]
+
+_MESSAGE_COLUMNS = (
+    Message.id,
+    Message.sender_id,
+    Message.sender,
+    Message.type,
+    Message.content,
+    Message.message_metadata,
+    Message.created_at,
+    Message.read_at,
+)
+
+def _encode(messages: List[dict]) -> bytes:
+    return zlib.compress(dumps(messages), 9)
+
+def decode_archive(payload: bytes) -> List[dict]:
+    messages = json.loads(zlib.decompress(payload))
+    for message in messages:
+        for key in ("created_at", "read_at"):
+            if message.get(key):
+                message[key] = datetime.fromisoformat(message[key].replace("Z", "+00:00"))
+    return messages
+
+def load_archived_messages(db: Session, conversation_id: str) -> List[dict]:
+    """Messages of a conversation that live in cold storage, oldest first"""
+    payload = db.query(MessageArchive.payload).filter(
+        MessageArchive.conversation_id == conversation_id
+    ).scalar()
+    return decode_archive(payload) if payload else []
+
+def load_archived_messages_many(db: Session, conversation_ids: List[str]) -> Dict[str, List[dict]]:
+    """load_archived_messages for several conversations in one query; missing means none"""
+    if not conversation_ids:
+        return {}
+    rows = db.query(MessageArchive.conversation_id, MessageArchive.payload).filter(
+        MessageArchive.conversation_id.in_(conversation_ids)
+    )
+    return {row.conversation_id: decode_archive(row.payload) for row in rows if row.payload}
+
+def archive_conversation(db: Session, conversation_id: str) -> int:
+    """
+    Move a conversation's hot messages into its archive row.
+
+    Messages that arrived after an earlier archival run are merged into the
+    existing blob. Does not commit; returns the number of messages moved.
+    """
+    rows = db.query(*_MESSAGE_COLUMNS).filter(
+        Message.conversation_id == conversation_id
+    ).order_by(Message.created_at).all()
+    if not rows:
+        return 0
+
+    moved = [
+        {
+            "id": row.id,
+            "sender_id": row.sender_id,
+            "sender": row.sender,
+            "type": row.type,
+            "content": row.content,
+            "message_metadata": row.message_metadata,
+            "created_at": row.created_at,
+            "read_at": row.read_at,
+        }
+        for row in rows
+    ]
+
+    archive = db.query(MessageArchive).filter(
+        MessageArchive.conversation_id == conversation_id
+    ).first()
+    messages = (decode_archive(archive.payload) if archive else []) + moved
+
+    if archive is None:
+        archive = MessageArchive(conversation_id=conversation_id)
+        db.add(archive)
+    archive.payload = _encode(messages)
+    archive.message_count = len(messages)
+    archive.first_message_at = messages[0]["created_at"]
+    archive.last_message_at = messages[-1]["created_at"]
+    archive.last_message_preview = messages[-1]["content"]
+
+    db.query(Message).filter(
+        Message.id.in_([row.id for row in rows])
+    ).delete(synchronize_session=False)
+    return len(moved)
+
+def archive_closed_conversations(db: Session, older_than_days: int, batch_size: int = 100) -> Dict[str, int]:
+    """
+    Move messages of resolved/archived conversations idle for `older_than_days`
+    out of the hot `messages` table, committing after every batch.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    closed_at = func.coalesce(Conversation.closed_at, Conversation.updated_at, Conversation.created_at)
+    totals = {"conversations": 0, "messages": 0}
+
+    while True:
+        conversation_ids = [
+            row.id for row in db.query(Conversation.id).filter(
+                Conversation.status.in_(ARCHIVABLE_STATUSES),
+                closed_at < cutoff,
+                exists().where(Message.conversation_id == Conversation.id)
+            ).limit(batch_size)
+        ]
+        if not conversation_ids:
+            break
+
+        for conversation_id in conversation_ids:
+            totals["messages"] += archive_conversation(db, conversation_id)
+            totals["conversations"] += 1
+        db.commit()
+
+    return totals
@@ -0,0 +1,421 @@
+"""
+Load-aware routing of new conversations to online agents.
+
+The engine keeps, per website, min-heaps of the website's online agents
+ordered by load / capacity, one heap per free-slot tier (two or more free
+slots, exactly one, none). A priority only looks at the tops of the tiers
+it may use, so agents without room for it are never popped and pushed
+back. Heap entries are never updated in place: a load change bumps the
+agent's version and pushes a fresh entry into its current tier, and stale
+entries are discarded when they reach the top (lazy invalidation).
+Picking an agent is amortized O(log n) with no database access; the only
+writes are the assigned_agent_id updates themselves.
+
+State is per worker. Agents register on WebSocket connect; when an
+agent's last connection closes, their open conversations are reassigned
+after a grace period, so a page reload doesn't reshuffle the inbox.
+"""
+
+import asyncio
+import heapq
+import itertools
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.log import get_logger
+from app.db.database import SessionLocal
+from app.models.conversation import Conversation, ConversationStatus, Priority
+from app.models.user import user_website_association
+from app.services import inbox
+from app.services.waiting_queue import waiting_queues
+from app.websockets.connection_manager import connection_manager
+
+log = get_logger("chat.assignment")
+
+OPEN_STATUSES = (ConversationStatus.ACTIVE, ConversationStatus.WAITING)
+
+# Slots an agent must keep free to accept a conversation of this priority.
+# Low priority work leaves one slot for more urgent chats; urgent chats may
+# exceed capacity rather than wait.
+RESERVED_SLOTS = {
+    Priority.LOW: 1,
+    Priority.NORMAL: 0,
+    Priority.HIGH: 0,
+    Priority.URGENT: None,
+}
+
+# Free slots of the agents in each heap tier; the last tier holds agents
+# with none left (urgent chats only)
+TIER_FREE_SLOTS = (2, 1)
+TIERS = len(TIER_FREE_SLOTS) + 1
+
+def _tiers_for(priority: Priority) -> Tuple[int, ...]:
+    """Heap tiers whose agents have a slot for this priority"""
+    reserved = RESERVED_SLOTS.get(priority, 0)
+    if reserved is None:
+        return tuple(range(TIERS))
+    return tuple(tier for tier, free in enumerate(TIER_FREE_SLOTS) if free > reserved)
+
+class _Agent:
+    __slots__ = ("id", "website_ids", "capacity", "conversations", "version")
+    # version is drawn from the engine-wide sequence, so entries left over
+    # from an earlier session of the same agent can never look current
+
+    def __init__(self, agent_id: str, website_ids: Set[str], capacity: int):
+        self.id = agent_id
+        self.website_ids = website_ids
+        self.capacity = max(capacity, 1)
+        self.conversations: Set[str] = set()
+        self.version = -1
+
+    @property
+    def load(self) -> int:
+        return len(self.conversations)
+
+    @property
+    def tier(self) -> int:
+        free = self.capacity - self.load
+        for tier, slots in enumerate(TIER_FREE_SLOTS):
+            if free >= slots:
+                return tier
+        return TIERS - 1
+
+class AssignmentEngine:
+    def __init__(self, default_capacity: int = 5):
+        self.default_capacity = default_capacity
+        self._agents: Dict[str, _Agent] = {}
+        # website -> one heap per tier of (ratio, load, version, agent)
+        self._heaps: Dict[str, List[List[Tuple[float, int, int, str]]]] = {}
+        self._assignments: Dict[str, Tuple[str, str, Priority]] = {}  # conversation -> (agent, website, priority)
+        self._sequence = itertools.count()
+
+    # Agents
+
+    def is_online(self, agent_id: str) -> bool:
+        return agent_id in self._agents
+
+    def agent_online(self, agent_id: str, website_ids: Iterable[str], capacity: Optional[int] = None,
+                     conversations: Iterable[Tuple[str, str, Priority]] = ()):
+        """Register an agent with their websites and currently assigned open conversations"""
+        if agent_id in self._agents:
+            return
+        agent = _Agent(agent_id, set(website_ids), capacity or self.default_capacity)
+        self._agents[agent_id] = agent
+        for conversation_id, website_id, priority in conversations:
+            agent.conversations.add(conversation_id)
+            self._assignments[conversation_id] = (agent_id, website_id, priority)
+        self._push(agent)
+
+    def agent_offline(self, agent_id: str) -> List[Tuple[str, str, Priority]]:
+        """Remove an agent; returns their conversations as (id, website_id, priority)"""
+        agent = self._agents.pop(agent_id, None)
+        if agent is None:
+            return []
+        # Its heap entries are now stale and will be skipped
+        orphans = []
+        for conversation_id in agent.conversations:
+            _, website_id, priority = self._assignments.pop(conversation_id)
+            orphans.append((conversation_id, website_id, priority))
+        return orphans
+
+    # Conversations
+
+    def assign(self, conversation_id: str, website_id: str, priority: Priority = Priority.NORMAL) -> Optional[str]:
+        """Pick the least-loaded online agent of the website that can take it, or None"""
+        if conversation_id in self._assignments:
+            return self._assignments[conversation_id][0]
+
+        heaps = self._heaps.get(website_id)
+        if heaps is None:
+            return None
+
+        # Least loaded by ratio across the tiers with room for this priority
+        best = None
+        for tier in _tiers_for(priority):
+            entry = self._top(heaps[tier])
+            if entry is not None and (best is None or entry < best):
+                best = entry
+        if best is None:
+            return None
+
+        agent = self._agents[best[3]]
+        agent.conversations.add(conversation_id)
+        self._assignments[conversation_id] = (agent.id, website_id, priority)
+        self._push(agent)
+        return agent.id
+
+    def assign_to(self, conversation_id: str, website_id: str, priority: Priority, agent_id: str):
+        """Record an agent's explicit pick, regardless of capacity"""
+        self.release(conversation_id)
+        agent = self._agents.get(agent_id)
+        if agent is not None:
+            agent.conversations.add(conversation_id)
+            self._assignments[conversation_id] = (agent_id, website_id, priority)
+            self._push(agent)
+
+    def release(self, conversation_id: str) -> Optional[str]:
+        """Conversation closed; frees a slot on its agent"""
+        assignment = self._assignments.pop(conversation_id, None)
+        if assignment is None:
+            return None
+        agent = self._agents.get(assignment[0])
+        if agent is not None:
+            agent.conversations.discard(conversation_id)
+            self._push(agent)
+        return assignment[0]
+
+    def agent_for(self, conversation_id: str) -> Optional[str]:
+        assignment = self._assignments.get(conversation_id)
+        return assignment[0] if assignment else None
+
+    def snapshot(self) -> Dict:
+        return {
+            "agents": {
+                agent.id: {
+                    "load": agent.load,
+                    "capacity": agent.capacity,
+                    "websites": sorted(agent.website_ids),
+                }
+                for agent in self._agents.values()
+            },
+            "assigned_conversations": len(self._assignments),
+            "heap_entries": sum(len(heap) for heaps in self._heaps.values() for heap in heaps),
+        }
+
+    def _is_current(self, entry: Tuple[float, int, int, str]) -> bool:
+        agent = self._agents.get(entry[3])
+        return agent is not None and agent.version == entry[2]
+
+    def _top(self, heap: List[Tuple[float, int, int, str]]) -> Optional[Tuple[float, int, int, str]]:
+        """The heap's least-loaded current entry, discarding stale ones above it"""
+        while heap and not self._is_current(heap[0]):
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _push(self, agent: _Agent):
+        agent.version = next(self._sequence)
+        entry = (agent.load / agent.capacity, agent.load, agent.version, agent.id)
+        tier = agent.tier
+        for website_id in agent.website_ids:
+            heaps = self._heaps.setdefault(website_id, [[] for _ in range(TIERS)])
+            heapq.heappush(heaps[tier], entry)
+            if len(heaps[tier]) > 4 * len(self._agents) + 16:
+                self._compact(heaps, tier)
+
+    def _compact(self, heaps: List[List[Tuple[float, int, int, str]]], tier: int):
+        """Drop stale entries once they dominate the heap"""
+        live = [entry for entry in heaps[tier] if self._is_current(entry)]
+        heapq.heapify(live)
+        heaps[tier] = live
+
+# Global assignment engine instance
+assignment_engine = AssignmentEngine(default_capacity=settings.agent_default_capacity)
+
+_pending_reassignments: Dict[str, asyncio.Task] = {}
+
+async def _notify_assigned(conversation_id: str, website_id: str, agent_id: str, priority: Priority,
+                           publish_inbox: bool = True):
+    """Subscribe the agent's sockets to the conversation and tell them about it"""
+    for connection_id in list(connection_manager.user_subscriptions.get(agent_id, ())):
+        connection_manager.subscribe_to_conversation(connection_id, conversation_id)
+    await connection_manager.broadcast_to_user({
+        "type": "conversation_assigned",
+        "conversation_id": conversation_id,
+        "website_id": website_id,
+        "priority": priority.value if isinstance(priority, Priority) else priority,
+        "timestamp": datetime.utcnow().isoformat()
+    }, agent_id)
+    if publish_inbox:
+        await inbox.status_changed(website_id, conversation_id, ConversationStatus.ACTIVE, assigned_agent_id=agent_id)
+
+async def assign_new_conversation(db: Session, conversation_id: str, website_id: str,
+                                  priority: Priority = Priority.NORMAL) -> Optional[str]:
+    """
+    Route a newly created conversation; queues it as WAITING if nobody can take it.
+    Publishes no inbox delta: the caller's inbox.conversation_created row,
+    read after this commits, already carries the status and assignee.
+    """
+    if not settings.assignment_enabled:
+        # Kill switch: leave new conversations exactly as ingest created them
+        return None
+    agent_id = assignment_engine.assign(conversation_id, website_id, priority)
+    if agent_id is None:
+        queue_conversation(db, conversation_id, website_id, priority)
+        return None
+    try:
+        db.execute(
+            update(Conversation).where(Conversation.id == conversation_id).values(assigned_agent_id=agent_id)
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        assignment_engine.release(conversation_id)
+        raise
+    await _notify_assigned(conversation_id, website_id, agent_id, priority, publish_inbox=False)
+    return agent_id
+
+def queue_conversation(db: Session, conversation_id: str, website_id: str,
+                       priority: Priority = Priority.NORMAL):
+    """Mark a conversation WAITING and put it in the waiting queue"""
+    db.execute(
+        update(Conversation).where(Conversation.id == conversation_id).values(
+            status=ConversationStatus.WAITING, assigned_agent_id=None
+        )
+    )
+    db.commit()
+    waiting_queues.push(conversation_id, website_id, priority)
+
+def claim_on_reply(conversation: Conversation, agent_id: str):
+    """An agent answering an unassigned conversation takes it (call before commit)"""
+    if conversation.assigned_agent_id is None:
+        conversation.assigned_agent_id = agent_id
+        conversation.status = ConversationStatus.ACTIVE
+        waiting_queues.remove(conversation.id)
+        assignment_engine.assign_to(
+            conversation.id, conversation.website_id, conversation.priority or Priority.NORMAL, agent_id
+        )
+
+def sync_assignment(conversation: Conversation):
+    """
+    Keep the engine in step after a status or assignee change (call after
+    commit): a conversation that is no longer open, or has lost its
+    assignee, frees its slot; one handed to another agent moves to them.
+    """
+    tracked = assignment_engine.agent_for(conversation.id)
+    if conversation.status not in OPEN_STATUSES or conversation.assigned_agent_id is None:
+        if tracked is not None:
+            assignment_engine.release(conversation.id)
+    elif conversation.assigned_agent_id != tracked:
+        assignment_engine.assign_to(
+            conversation.id, conversation.website_id, conversation.priority or Priority.NORMAL,
+            conversation.assigned_agent_id
+        )
+
+async def dispatch_next(db: Session, agent_id: str, website_ids: Iterable[str]) -> Optional[Dict]:
+    """
+    Give the agent the most overdue waiting conversation of their websites.
+    Returns {"conversation_id", "website_id", "priority"} or None if the queue is empty.
+    """
+    website_ids = list(website_ids)
+    while True:
+        picked = waiting_queues.peek_next(website_ids)
+        if picked is None:
+            return None
+        conversation_id, website_id = picked
+
+        # Guarded update: skip entries another worker or an agent already took.
+        # The entry leaves the queue only once the outcome is committed, so a
+        # database error keeps the conversation waiting in its place.
+        try:
+            claimed = db.execute(
+                update(Conversation).where(
+                    Conversation.id == conversation_id,
+                    Conversation.status == ConversationStatus.WAITING,
+                    Conversation.assigned_agent_id.is_(None)
+                ).values(
+                    status=ConversationStatus.ACTIVE,
+                    assigned_agent_id=agent_id,
+                    updated_at=datetime.utcnow()
+                ).returning(Conversation.priority)
+            ).first()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        waiting_queues.remove(conversation_id)
+        if claimed is None:
+            continue
+
+        priority = claimed.priority or Priority.NORMAL
+        assignment_engine.assign_to(conversation_id, website_id, priority, agent_id)
+        await _notify_assigned(conversation_id, website_id, agent_id, priority)
+        return {"conversation_id": conversation_id, "website_id": website_id, "priority": priority.value}
+
+async def agent_connected(db: Session, agent_id: str):
+    """Register an agent on their first connection; cancels a pending reassignment"""
+    if not settings.assignment_enabled:
+        return
+    pending = _pending_reassignments.pop(agent_id, None)
+    if pending is not None:
+        pending.cancel()
+    if assignment_engine.is_online(agent_id):
+        return
+
+    website_ids = db.execute(
+        select(user_website_association.c.website_id).where(user_website_association.c.user_id == agent_id)
+    ).scalars().all()
+    conversations = db.execute(
+        select(Conversation.id, Conversation.website_id, Conversation.priority).where(
+            Conversation.assigned_agent_id == agent_id,
+            Conversation.status.in_(OPEN_STATUSES)
+        )
+    ).all()
+    assignment_engine.agent_online(
+        agent_id, website_ids,
+        conversations=[(row.id, row.website_id, row.priority or Priority.NORMAL) for row in conversations]
+    )
+
+def agent_disconnected(agent_id: str):
+    """Schedule reassignment once the agent's last connection is gone"""
+    if not settings.assignment_enabled or agent_id in connection_manager.user_subscriptions:
+        return
+    if agent_id not in _pending_reassignments:
+        _pending_reassignments[agent_id] = asyncio.create_task(_reassign_after_grace(agent_id))
+
+async def _reassign_after_grace(agent_id: str):
+    try:
+        await asyncio.sleep(settings.assignment_reassign_grace_seconds)
+    except asyncio.CancelledError:
+        return
+    _pending_reassignments.pop(agent_id, None)
+    if agent_id in connection_manager.user_subscriptions:
+        return
+    await reassign_agent_conversations(agent_id)
+
+async def reassign_agent_conversations(agent_id: str) -> Dict[str, Optional[str]]:
+    """Hand an offline agent's open conversations to other agents, in one bulk UPDATE"""
+    moves = {}
+    for conversation_id, website_id, priority in assignment_engine.agent_offline(agent_id):
+        moves[conversation_id] = (website_id, priority, assignment_engine.assign(conversation_id, website_id, priority))
+    if not moves:
+        return {}
+
+    db = SessionLocal()
+    try:
+        # Unplaced conversations go back to the waiting queue
+        stmt = update(Conversation.__table__).where(
+            Conversation.__table__.c.id == bindparam("conversation_id"),
+            Conversation.__table__.c.assigned_agent_id == agent_id
+        ).values(assigned_agent_id=bindparam("agent_id"), status=bindparam("new_status"))
+        db.execute(stmt, [
+            {
+                "conversation_id": conversation_id,
+                "agent_id": new_agent_id,
+                "new_status": ConversationStatus.ACTIVE if new_agent_id else ConversationStatus.WAITING,
+            }
+            for conversation_id, (_, _, new_agent_id) in moves.items()
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        # The conversations stay with the offline agent; take them back off the new agents
+        for conversation_id, (_, _, new_agent_id) in moves.items():
+            if new_agent_id:
+                assignment_engine.release(conversation_id)
+        log.exception("assignment.reassign_failed", agent_id=agent_id, conversations=len(moves))
+        return {}
+    finally:
+        db.close()
+
+    for conversation_id, (website_id, priority, new_agent_id) in moves.items():
+        if new_agent_id:
+            await _notify_assigned(conversation_id, website_id, new_agent_id, priority)
+        else:
+            waiting_queues.push(conversation_id, website_id, priority)
+            await inbox.status_changed(website_id, conversation_id, ConversationStatus.WAITING, assigned_agent_id=None)
+    log.info("assignment.reassigned", agent_id=agent_id, conversations=len(moves),
+             placed=sum(1 for move in moves.values() if move[2]))
+    return {conversation_id: move[2] for conversation_id, move in moves.items()}
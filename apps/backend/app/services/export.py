@@ -0,0 +1,139 @@
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+from sqlalchemy import select
+
+from app.core.serialization import dumps
+from app.db.database import ReplicaSessionLocal
+from app.models.conversation import Conversation, Message, MessageArchive
+from app.services.archival import load_archived_messages
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+# Emit output in chunks of roughly this size rather than per line
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def iter_website_export(website_id: str, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None) -> Iterator[bytes]:
+    """
+    Yield a website's conversations and messages as NDJSON chunks.
+
+    Each conversation is written as a {"type": "conversation"} line followed
+    by its {"type": "message"} lines. Rows are read through a server-side
+    cursor and never accumulated, so memory stays flat no matter how many
+    messages are exported. The generator owns its session and returns the
+    connection to the pool as soon as the last row is read.
+    """
+    stmt = select(
+        Conversation.id,
+        Conversation.visitor_id,
+        Conversation.assigned_agent_id,
+        Conversation.status,
+        Conversation.priority,
+        Conversation.subject,
+        Conversation.tags,
+        Conversation.rating,
+        Conversation.feedback,
+        Conversation.created_at,
+        Conversation.closed_at,
+        Message.id,
+        Message.sender,
+        Message.sender_id,
+        Message.type,
+        Message.content,
+        Message.message_metadata,
+        Message.created_at,
+        Message.read_at,
+        MessageArchive.conversation_id,
+    ).outerjoin(
+        Message, Message.conversation_id == Conversation.id
+    ).outerjoin(
+        MessageArchive, MessageArchive.conversation_id == Conversation.id
+    ).where(
+        Conversation.website_id == website_id
+    ).order_by(
+        Conversation.created_at, Conversation.id, Message.created_at
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE, stream_results=True)
+
+    if start:
+        stmt = stmt.where(Conversation.created_at >= start)
+    if end:
+        stmt = stmt.where(Conversation.created_at < end)
+
+    db = ReplicaSessionLocal()
+    try:
+        buffer = bytearray()
+        current_conversation = None
+
+        for row in db.execute(stmt):
+            (conversation_id, visitor_id, agent_id, status, priority, subject, tags, rating,
+             feedback, created_at, closed_at, message_id, sender, sender_id, message_type,
+             content, metadata, message_created_at, read_at, archived) = row
+
+            if conversation_id != current_conversation:
+                current_conversation = conversation_id
+                buffer += dumps({
+                    "type": "conversation",
+                    "id": conversation_id,
+                    "website_id": website_id,
+                    "visitor_id": visitor_id,
+                    "assigned_agent_id": agent_id,
+                    "status": status,
+                    "priority": priority,
+                    "subject": subject,
+                    "tags": tags or [],
+                    "rating": rating,
+                    "feedback": feedback,
+                    "created_at": created_at,
+                    "closed_at": closed_at,
+                }) + b"\n"
+
+                # Cold-storage messages predate anything still in the hot table
+                if archived:
+                    for message in load_archived_messages(db, conversation_id):
+                        buffer += _message_line(conversation_id, message)
+
+            if message_id is not None:
+                buffer += _message_line(conversation_id, {
+                    "id": message_id,
+                    "sender": sender,
+                    "sender_id": sender_id,
+                    "type": message_type,
+                    "content": content,
+                    "message_metadata": metadata,
+                    "created_at": message_created_at,
+                    "read_at": read_at,
+                })
+
+            if len(buffer) >= EXPORT_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+    finally:
+        db.close()
+
+    if buffer:
+        yield bytes(buffer)
+
+def _message_line(conversation_id: str, message: dict) -> bytes:
+    return dumps({
+        "type": "message",
+        "id": message["id"],
+        "conversation_id": conversation_id,
+        "sender": message["sender"],
+        "sender_id": message["sender_id"],
+        "message_type": message["type"],
+        "content": message["content"],
+        "metadata": message["message_metadata"] or {},
+        "created_at": message["created_at"],
+        "read_at": message["read_at"],
+    }) + b"\n"
+
+def gzip_stream(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Gzip-compress a byte stream incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
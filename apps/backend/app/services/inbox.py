@@ -0,0 +1,104 @@
+"""
+Push-based inbox updates.
+
+Agents that sent a subscribe_inbox frame get small inbox_delta frames for
+conversations of their websites instead of re-fetching GET /conversations:
+
+    {"type": "inbox_delta", "website_id": ..., "conversation_id": ...,
+     "changes": {...}}
+
+A new conversation carries its full inbox row in changes["conversation"];
+every other delta only carries the fields that changed. Publishing is a
+no-op for websites nobody is watching, so the write paths pay nothing
+when no dashboard is open.
+"""
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.conversation import Conversation, ConversationStatus
+from app.models.website import Website
+from app.models.visitor import Visitor
+from app.websockets.connection_manager import connection_manager
+
+PREVIEW_LENGTH = 100
+
+def has_subscribers(website_id: Optional[str]) -> bool:
+    return bool(website_id) and website_id in connection_manager.inbox_subscriptions
+
+def status_value(status) -> Optional[str]:
+    if status is None:
+        return None
+    return (status.value if isinstance(status, ConversationStatus) else str(status)).lower()
+
+async def publish(website_id: str, conversation_id: str, changes: dict):
+    """Send one delta to every agent watching the website's inbox"""
+    if not has_subscribers(website_id):
+        return
+    await connection_manager.broadcast_to_inbox({
+        "type": "inbox_delta",
+        "website_id": website_id,
+        "conversation_id": conversation_id,
+        "changes": changes,
+        "timestamp": datetime.utcnow().isoformat()
+    }, website_id)
+
+async def conversation_created(db: Session, conversation_id: str, website_id: str,
+                               last_message: Optional[str] = None,
+                               last_message_time: Optional[datetime] = None):
+    """Full row, shaped like a GET /conversations item"""
+    if not has_subscribers(website_id):
+        return
+    row = db.execute(
+        select(
+            Conversation.id,
+            Conversation.status,
+            Conversation.assigned_agent_id,
+            Conversation.created_at,
+            Website.name.label("website_name"),
+            Website.domain.label("website_domain"),
+            Visitor.name.label("visitor_name"),
+            Visitor.email.label("visitor_email"),
+        ).join(Website, Conversation.website_id == Website.id).outerjoin(
+            Visitor, Conversation.visitor_id == Visitor.id
+        ).where(Conversation.id == conversation_id)
+    ).first()
+    if row is None:
+        return
+    await publish(website_id, conversation_id, {
+        "conversation": {
+            "id": row.id,
+            "website_name": row.website_name or "Unknown",
+            "website_domain": row.website_domain or "unknown.com",
+            "visitor_name": row.visitor_name or "Anonymous User",
+            "visitor_email": row.visitor_email,
+            "last_message": last_message[:PREVIEW_LENGTH] if last_message else "No messages",
+            "last_message_time": (last_message_time or row.created_at).isoformat(),
+            "status": status_value(row.status),
+            "assigned_agent_id": row.assigned_agent_id,
+            "unread_count": 1 if last_message else 0,
+            "created_at": row.created_at.isoformat()
+        }
+    })
+
+async def message_added(website_id: str, conversation_id: str, content: str, sender: str,
+                        created_at: datetime, **changes):
+    """Last-message preview; visitor messages bump unread, agent replies clear it"""
+    changes.update({
+        "last_message": content[:PREVIEW_LENGTH],
+        "last_message_time": created_at.isoformat(),
+        "last_message_sender": sender,
+    })
+    if sender == "visitor":
+        changes["unread_increment"] = 1
+    elif sender == "agent":
+        changes["unread_count"] = 0
+    await publish(website_id, conversation_id, changes)
+
+async def status_changed(website_id: str, conversation_id: str, status, **changes):
+    changes["status"] = status_value(status)
+    await publish(website_id, conversation_id, changes)
+
+async def conversation_read(website_id: str, conversation_id: str):
+    await publish(website_id, conversation_id, {"unread_count": 0})
@@ -0,0 +1,134 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, insert, update, func, desc
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.db import repository
+from app.db.routing import set_sticky_key
+from app.models.conversation import Conversation, Message, MessageType, ConversationStatus, Priority
+from app.models.visitor import Visitor
+from app.models.website import Website
+from app.services import analytics
+from app.services.website_cache import website_cache
+
+OPEN_STATUSES = (ConversationStatus.ACTIVE, ConversationStatus.WAITING)
+
+# Namespace for deterministic conversation IDs (see _next_conversation_id)
+_CONVERSATION_NAMESPACE = uuid.UUID("6f1d3c1e-8a53-4c67-9b8e-2f4a8f1b7d20")
+
+class IngestResult:
+    __slots__ = ("message_id", "conversation_id", "visitor_id", "created_at",
+                 "created_conversation", "created_website")
+
+    def __init__(self, message_id, conversation_id, visitor_id, created_at,
+                 created_conversation=False, created_website=False):
+        self.message_id = message_id
+        self.conversation_id = conversation_id
+        self.visitor_id = visitor_id
+        self.created_at = created_at
+        self.created_conversation = created_conversation
+        self.created_website = created_website
+
+def _next_conversation_id(website_id: str, visitor_id: str, previous_id: Optional[str]) -> str:
+    """
+    Deterministic ID for the visitor's next conversation.
+
+    Derived from the conversation it follows, so two concurrent first
+    messages compute the same ID and the second insert is a no-op.
+    """
+    return str(uuid.uuid5(_CONVERSATION_NAMESPACE, f"{website_id}/{visitor_id}/{previous_id or ''}"))
+
+def _latest_conversation(db: Session, website_id: str, visitor_id: str):
+    """(id, status) of the visitor's most recent conversation on the website, or None"""
+    return db.execute(
+        select(Conversation.id, Conversation.status).where(
+            Conversation.visitor_id == visitor_id,
+            Conversation.website_id == website_id
+        ).order_by(desc(Conversation.created_at)).limit(1)
+    ).first()
+
+def ingest_visitor_message(db: Session, website_id: str, visitor_id: Optional[str], content: str,
+                           conversation_id: Optional[str] = None) -> IngestResult:
+    """
+    Persist a visitor message, creating website, visitor and conversation as needed.
+
+    Every get-or-create is an INSERT ... ON CONFLICT DO NOTHING inside one
+    transaction, so concurrent first messages from the same visitor converge
+    on the same rows instead of racing. Without a conversation_id, the message
+    joins the visitor's latest open conversation. Commits on success.
+    """
+    created_website = False
+    if website_cache.get(db, website_id) is None:
+        # Create demo website for testing
+        created_website = repository.insert_or_ignore(db, Website, {
+            "id": website_id,
+            "name": "Demo Website",
+            "domain": "localhost:8001",
+        })
+
+    visitor_id = visitor_id or f"visitor_{uuid.uuid4()}"
+    repository.insert_or_ignore(db, Visitor, {
+        "id": visitor_id,
+        "website_id": website_id,
+        "is_identified": False,
+    })
+
+    conversation = None
+    if conversation_id:
+        conversation = repository.get_conversation_by_id(db, conversation_id)
+
+    created_conversation = False
+    if conversation is not None:
+        conversation_id = conversation.id
+    else:
+        latest = _latest_conversation(db, website_id, visitor_id)
+
+        if latest and latest.status in OPEN_STATUSES:
+            conversation_id = latest.id
+        else:
+            conversation_id = _next_conversation_id(website_id, visitor_id, latest.id if latest else None)
+            created_conversation = repository.insert_or_ignore(db, Conversation, {
+                "id": conversation_id,
+                "website_id": website_id,
+                "visitor_id": visitor_id,
+                "status": ConversationStatus.ACTIVE,
+                "priority": Priority.NORMAL,
+                "tags": [],
+            })
+
+    message_id = str(uuid.uuid4())
+    created_at = db.execute(
+        insert(Message).values(
+            id=message_id,
+            conversation_id=conversation_id,
+            sender="visitor",
+            sender_id=visitor_id,
+            content=content,
+            type=MessageType.TEXT,
+        ).returning(Message.created_at)
+    ).scalar_one()
+
+    # last_message_at versions the conversation (widget history ETag); set it
+    # client-side so it keeps sub-second precision on SQLite too
+    db.execute(
+        update(Conversation).where(Conversation.id == conversation_id).values(
+            last_message_at=datetime.utcnow(), updated_at=func.now()
+        )
+    )
+
+    # The visitor ID is in the body (or new), so name them for read-your-writes
+    set_sticky_key(db, f"visitor:{visitor_id}")
+    db.commit()
+    metrics.messages_persisted.labels("visitor").inc()
+    if created_conversation:
+        analytics.record_conversation_started(conversation_id, website_id, created_at)
+    analytics.record_message(conversation_id, "visitor", visitor_id, created_at)
+
+    if created_website:
+        # Drop the cached "missing" entry
+        website_cache.invalidate(website_id)
+
+    return IngestResult(message_id, conversation_id, visitor_id, created_at,
+                        created_conversation, created_website)
@@ -0,0 +1,190 @@
+import asyncio
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import settings
+from app.core.log import get_logger
+from app.core.metrics import registry
+from app.db import repository
+from app.db.database import SessionLocal
+from app.models.visitor import Visitor, VisitorSession, PageView
+
+# Visitor/session rows go in as multi-row VALUES; keep each statement under
+# SQLite's default limit of 999 bound parameters
+INSERT_CHUNK_ROWS = 100
+
+log = get_logger("chat.page_views")
+
+class _Requeue(Exception):
+    """The database is unavailable; put the unwritten rows back"""
+
+    def __init__(self, stage: str, remaining: int, skipped: int):
+        self.stage = stage
+        self.remaining = remaining
+        self.skipped = skipped
+
+class PageViewBuffer:
+    """
+    Bounded in-process buffer for page-view events.
+
+    Requests only append to memory; flush() writes everything buffered in one
+    transaction using multi-row INSERTs. A flush runs when the buffer reaches
+    `batch_size` (size trigger) and on a timer (time trigger). When the buffer
+    holds `max_size` events, offer() refuses the batch so callers can tell the
+    widget to back off instead of growing memory without bound.
+
+    Rows are written chunk by chunk, each chunk in its own transaction. A
+    chunk the database rejects is skipped and counted as dropped; if the
+    database is unreachable, the unwritten events go back into the buffer
+    for the next flush.
+    """
+
+    def __init__(self, max_size: int, batch_size: int):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self._events: List[dict] = []
+        self._sessions: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @property
+    def should_flush(self) -> bool:
+        return len(self._events) >= self.batch_size and not self._flush_lock.locked()
+
+    def offer(self, website_id: str, visitor_id: str, session_id: str, events: List[dict],
+              ip_address: str = "", user_agent: str = "", referrer: Optional[str] = None) -> bool:
+        """
+        Buffer a batch of events from one widget session.
+        Each event is a dict with url, title, time_on_page and timestamp.
+        Returns False, buffering nothing, if the batch does not fit.
+        """
+        now = datetime.utcnow()
+        rows = [{
+            "id": str(uuid.uuid4()),
+            "session_id": session_id,
+            "url": event["url"],
+            "title": event.get("title") or "",
+            "time_on_page": event.get("time_on_page"),
+            "timestamp": _as_utc(event.get("timestamp")) or now,
+        } for event in events]
+
+        with self._lock:
+            if len(self._events) + len(rows) > self.max_size:
+                self.rejected += len(rows)
+                return False
+            self._events.extend(rows)
+            self._sessions.setdefault(session_id, {
+                "id": session_id,
+                "visitor_id": visitor_id,
+                "website_id": website_id,
+                "ip_address": ip_address,
+                "user_agent": user_agent,
+                "referrer": referrer,
+                "started_at": min(row["timestamp"] for row in rows) if rows else now,
+            })
+            self.accepted += len(rows)
+        return True
+
+    def flush_if_full(self):
+        """Size trigger: start a flush in a worker thread without awaiting it"""
+        if self.should_flush:
+            asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    def flush(self) -> int:
+        """Write buffered events. Returns the number of page views inserted."""
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+                sessions, self._sessions = self._sessions, {}
+            if not events:
+                # Sessions only get buffered together with events
+                return 0
+
+            visitors = {
+                session["visitor_id"]: {"id": session["visitor_id"], "website_id": session["website_id"]}
+                for session in sessions.values()
+            }
+
+            written = 0
+            db = SessionLocal()
+            try:
+                self._write_chunks(db, "visitors", list(visitors.values()), INSERT_CHUNK_ROWS,
+                                   lambda rows: repository.insert_many_or_ignore(db, Visitor, rows))
+                self._write_chunks(db, "sessions", list(sessions.values()), INSERT_CHUNK_ROWS,
+                                   lambda rows: repository.insert_many_or_ignore(db, VisitorSession, rows))
+                skipped = self._write_chunks(db, "events", events, self.batch_size,
+                                             lambda rows: db.execute(insert(PageView), rows))
+                self.dropped += skipped
+                written = len(events) - skipped
+            except _Requeue as e:
+                # Visitor and session inserts ignore conflicts, so they can safely run again
+                if e.stage == "events":
+                    unwritten = events[len(events) - e.remaining:]
+                    self.dropped += e.skipped
+                    written = len(events) - len(unwritten) - e.skipped
+                else:
+                    unwritten = events
+                self._requeue(unwritten, sessions)
+            finally:
+                db.close()
+
+            return written
+
+    def _write_chunks(self, db, stage: str, rows: List[dict], size: int, write) -> int:
+        """Write and commit `rows` in chunks; returns the number of rows skipped"""
+        skipped = 0
+        for start in range(0, len(rows), size):
+            chunk = rows[start:start + size]
+            try:
+                write(chunk)
+                db.commit()
+            except OperationalError as e:
+                db.rollback()
+                log.warning("page_views.flush_deferred", stage=stage, rows=len(rows) - start, error=str(e))
+                raise _Requeue(stage, len(rows) - start, skipped)
+            except Exception as e:
+                db.rollback()
+                # Analytics rows are not retried; a bad chunk must not wedge the buffer
+                skipped += len(chunk)
+                log.error("page_views.chunk_skipped", stage=stage, rows=len(chunk), error=str(e))
+        return skipped
+
+    def _requeue(self, events: List[dict], sessions: Dict[str, dict]):
+        """Put unwritten rows back in front of newer ones, within max_size"""
+        with self._lock:
+            room = max(self.max_size - len(self._events), 0)
+            kept = events[:room]
+            self.dropped += len(events) - len(kept)
+            self._events[:0] = kept
+            for session_id, session in sessions.items():
+                self._sessions.setdefault(session_id, session)
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._events),
+            "max_size": self.max_size,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+        }
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive UTC, like datetime.utcnow(), so client timestamps compare with each other"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+# Global page-view buffer instance
+page_view_buffer = PageViewBuffer(settings.page_view_buffer_size, settings.page_view_batch_size)
+registry.gauge("chat_page_view_buffer_events", "Page views waiting for the next bulk insert",
+               function=lambda: len(page_view_buffer))
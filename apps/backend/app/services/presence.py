@@ -0,0 +1,71 @@
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import bindparam, update
+
+from app.core.metrics import registry
+from app.db.database import SessionLocal
+from app.models.visitor import Visitor
+
+class PresenceTracker:
+    """
+    Coalesces visitor activity into periodic bulk UPDATEs of last_seen_at.
+
+    Heartbeats and frames only touch an in-memory dirty map; flush() writes
+    the latest timestamp per visitor in one executemany. Write cost is set by
+    the flush interval, not by how many widgets are open.
+    """
+
+    def __init__(self):
+        self._dirty: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, visitor_id: str, seen_at: Optional[datetime] = None):
+        if not visitor_id:
+            return
+        seen_at = seen_at or datetime.utcnow()
+        with self._lock:
+            self._dirty[visitor_id] = seen_at
+
+    def last_seen(self, visitor_id: str) -> Optional[datetime]:
+        """Activity not yet flushed to the database, if any"""
+        return self._dirty.get(visitor_id)
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def flush(self) -> int:
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+
+        table = Visitor.__table__
+        stmt = update(table).where(table.c.id == bindparam("visitor_id")).values(
+            last_seen_at=bindparam("seen_at")
+        )
+
+        db = SessionLocal()
+        try:
+            db.execute(stmt, [
+                {"visitor_id": visitor_id, "seen_at": seen_at}
+                for visitor_id, seen_at in dirty.items()
+            ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the batch back without overwriting newer activity
+            with self._lock:
+                for visitor_id, seen_at in dirty.items():
+                    self._dirty.setdefault(visitor_id, seen_at)
+            raise
+        finally:
+            db.close()
+
+        return len(dirty)
+
+# Global presence tracker instance
+presence_tracker = PresenceTracker()
+registry.gauge("chat_presence_pending_visitors", "Visitors whose last_seen_at awaits the next flush",
+               function=lambda: presence_tracker.pending)
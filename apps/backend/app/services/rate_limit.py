@@ -0,0 +1,214 @@
+"""
+Token-bucket rate limiting for anonymous widget traffic.
+
+Each action (message, connect, typing, events, config) is limited per
+visitor, per client IP and per website. A request consumes one token from
+every applicable bucket, or from none if any of them is empty. Checks run before any
+database work, so abusive clients are turned away at the cost of a dict
+lookup (memory backend) or one Redis round trip (redis backend, shared
+between workers).
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.log import get_logger
+from app.services.website_cache import CachedWebsite, website_cache
+
+# (tokens per second, burst) per action and scope
+DEFAULT_LIMITS: Dict[str, Dict[str, Tuple[float, float]]] = {
+    "message": {"visitor": (1.0, 10), "ip": (2.0, 30), "website": (50.0, 300)},
+    "connect": {"visitor": (0.2, 5), "ip": (1.0, 20), "website": (20.0, 200)},
+    "typing": {"visitor": (2.0, 10), "ip": (5.0, 50)},
+    "events": {"visitor": (1.0, 10), "ip": (5.0, 50)},
+    "config": {"ip": (5.0, 50)},
+}
+
+SCOPES = ("visitor", "ip", "website")
+CLIENT_SCOPES = ("visitor", "ip")
+
+log = get_logger("chat.rate_limit")
+
+Bucket = Tuple[str, float, float]  # key, rate, burst
+
+class MemoryBackend:
+    """
+    Per-process buckets; limits are per worker.
+
+    Buckets are kept in the order they were last updated. When the table is
+    full the least recently updated bucket is dropped, in O(1). It has been
+    idle longest, so it has usually refilled and is equivalent to a new one.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> [tokens, updated_at, rate, burst], least recently updated first
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def consume(self, buckets: List[Bucket], cost: float = 1.0) -> float:
+        """Take `cost` from every bucket, or none. Returns 0 or seconds to wait."""
+        now = time.monotonic()
+        states = []
+        retry_after = 0.0
+        for key, rate, burst in buckets:
+            state = self._buckets.get(key)
+            tokens = burst if state is None else min(burst, state[0] + (now - state[1]) * rate)
+            if tokens < cost:
+                retry_after = max(retry_after, (cost - tokens) / rate)
+            states.append((key, tokens, rate, burst))
+
+        if retry_after:
+            return retry_after
+
+        for key, tokens, rate, burst in states:
+            if key in self._buckets:
+                self._buckets.move_to_end(key)
+            elif len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+            self._buckets[key] = [tokens - cost, now, rate, burst]
+        return 0.0
+
+class RedisBackend:
+    """Buckets shared by all workers, updated atomically by a Lua script"""
+
+    # All-or-nothing across KEYS, using the Redis clock so workers agree
+    SCRIPT = """
+    local now_parts = redis.call('TIME')
+    local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+    local cost = tonumber(ARGV[1])
+    local tokens = {}
+    local retry_after = 0
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[i * 2])
+        local burst = tonumber(ARGV[i * 2 + 1])
+        local state = redis.call('HMGET', key, 'tokens', 'ts')
+        local available = tonumber(state[1]) or burst
+        local updated = tonumber(state[2]) or now
+        available = math.min(burst, available + math.max(0, now - updated) * rate)
+        if available < cost then
+            retry_after = math.max(retry_after, (cost - available) / rate)
+        end
+        tokens[i] = available
+    end
+    if retry_after > 0 then
+        return tostring(retry_after)
+    end
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[i * 2])
+        local burst = tonumber(ARGV[i * 2 + 1])
+        redis.call('HSET', key, 'tokens', tokens[i] - cost, 'ts', now)
+        redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+    end
+    return '0'
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    async def consume(self, buckets: List[Bucket], cost: float = 1.0) -> float:
+        keys = [self.prefix + key for key, _, _ in buckets]
+        args = [cost]
+        for _, rate, burst in buckets:
+            args.extend((rate, burst))
+        try:
+            return float(await self._script(keys=keys, args=args))
+        except Exception as e:
+            # Fail open: losing Redis must not take the widget down with it
+            log.error("rate_limit.backend_error", error=str(e))
+            return 0.0
+
+class RateLimiter:
+    def __init__(self, backend, limits: Dict[str, Dict[str, Tuple[float, float]]], enabled: bool = True):
+        self.backend = backend
+        self.limits = limits
+        self.enabled = enabled
+        self.rejected = 0
+
+    def _limit(self, action: str, scope: str, widget_config: Optional[dict]) -> Optional[Tuple[float, float]]:
+        override = ((widget_config or {}).get("rateLimits") or {}).get(action, {}).get(scope)
+        if override:
+            return float(override["rate"]), float(override["burst"])
+        return self.limits.get(action, {}).get(scope)
+
+    async def check(self, action: str, website_id: str, visitor_id: Optional[str] = None,
+                    ip: Optional[str] = None, widget_config: Optional[dict] = None,
+                    scopes: Tuple[str, ...] = SCOPES) -> float:
+        """
+        Consume one token for `action`. Returns 0 if allowed, otherwise the
+        number of seconds to wait. `widget_config` supplies per-website
+        overrides: {"rateLimits": {"message": {"visitor": {"rate": 0.5, "burst": 5}}}}
+        """
+        if not self.enabled:
+            return 0.0
+
+        buckets = []
+        for scope, value in (("visitor", visitor_id), ("ip", ip), ("website", website_id)):
+            if scope not in scopes:
+                continue
+            limit = self._limit(action, scope, widget_config)
+            if value and limit and limit[0] > 0:
+                # Visitor IDs are client-chosen, so they're only unique per website
+                key = f"{action}:{scope}:{website_id}:{value}" if scope == "visitor" else f"{action}:{scope}:{value}"
+                buckets.append((key, limit[0], limit[1]))
+        if not buckets:
+            return 0.0
+
+        retry_after = await self.backend.consume(buckets)
+        if retry_after:
+            self.rejected += 1
+        return retry_after
+
+    async def check_website_request(self, action: str, website_id: str,
+                                    load_website: Callable[[], Optional[CachedWebsite]],
+                                    visitor_id: Optional[str] = None,
+                                    ip: Optional[str] = None) -> Tuple[Optional[CachedWebsite], float]:
+        """
+        Check the visitor and IP buckets before `load_website` runs, so
+        rotating website IDs can't skip the limiter or cost a lookup each;
+        then the website bucket. Client buckets use the site's overrides
+        when it is already cached. Returns (website, retry_after).
+        """
+        cached = website_cache.peek(website_id)
+        retry_after = await self.check(
+            action, website_id, visitor_id=visitor_id, ip=ip,
+            widget_config=cached.widget_config if cached else None,
+            scopes=CLIENT_SCOPES
+        )
+        if retry_after:
+            return None, retry_after
+
+        website = load_website()
+        retry_after = await self.check(
+            action, website_id,
+            widget_config=website.widget_config if website else None,
+            scopes=("website",)
+        )
+        return website, retry_after
+
+def client_ip(connection) -> Optional[str]:
+    """Client address of a Request or WebSocket, honouring X-Forwarded-For only if configured"""
+    if settings.rate_limit_trust_forwarded_for:
+        forwarded = connection.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return connection.client.host if connection.client else None
+
+def _create_rate_limiter() -> RateLimiter:
+    limits = {action: dict(scopes) for action, scopes in DEFAULT_LIMITS.items()}
+    for action, scopes in settings.rate_limits.items():
+        for scope, (rate, burst) in scopes.items():
+            limits.setdefault(action, {})[scope] = (float(rate), float(burst))
+
+    if settings.rate_limit_backend == "redis":
+        backend = RedisBackend(settings.redis_url)
+    else:
+        backend = MemoryBackend()
+    return RateLimiter(backend, limits, enabled=settings.rate_limit_enabled)
+
+# Global rate limiter instance
+rate_limiter = _create_rate_limiter()
@@ -0,0 +1,86 @@
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import bindparam, or_, update
+
+from app.core.metrics import registry
+from app.db.database import SessionLocal
+from app.models.conversation import Conversation
+
+class ReadMarkers:
+    """
+    Deferred Conversation.last_agent_read_at writes.
+
+    Opening a conversation only records the read time in memory; flush()
+    writes the newest time per conversation in one executemany. Keeps
+    GET /conversations/{id} read-only, so it can run on a replica and
+    doesn't take a row lock per view.
+    """
+
+    def __init__(self):
+        self._dirty: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, conversation_id: str, read_at: Optional[datetime] = None):
+        if not conversation_id:
+            return
+        read_at = read_at or datetime.utcnow()
+        with self._lock:
+            previous = self._dirty.get(conversation_id)
+            if previous is None or read_at > previous:
+                self._dirty[conversation_id] = read_at
+
+    def last_read(self, conversation_id: str) -> Optional[datetime]:
+        """Read time not yet flushed to the database, if any"""
+        return self._dirty.get(conversation_id)
+
+    def pending_for(self, conversation_ids) -> Dict[str, datetime]:
+        """Unflushed read times of these conversations, for overlaying on stored markers"""
+        pending = {}
+        for conversation_id in conversation_ids:
+            read_at = self.last_read(conversation_id)
+            if read_at is not None:
+                pending[conversation_id] = read_at
+        return pending
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def flush(self) -> int:
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+
+        # Never move a marker backwards (e.g. a reply set it meanwhile)
+        table = Conversation.__table__
+        stmt = update(table).where(
+            table.c.id == bindparam("conversation"),
+            or_(table.c.last_agent_read_at.is_(None), table.c.last_agent_read_at < bindparam("read_at"))
+        ).values(last_agent_read_at=bindparam("read_at"))
+
+        db = SessionLocal()
+        try:
+            db.execute(stmt, [
+                {"conversation": conversation_id, "read_at": read_at}
+                for conversation_id, read_at in dirty.items()
+            ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                for conversation_id, read_at in dirty.items():
+                    previous = self._dirty.get(conversation_id)
+                    if previous is None or read_at > previous:
+                        self._dirty[conversation_id] = read_at
+            raise
+        finally:
+            db.close()
+
+        return len(dirty)
+
+# Global read marker buffer
+read_markers = ReadMarkers()
+registry.gauge("chat_read_markers_pending", "Conversations whose last_agent_read_at awaits the next flush",
+               function=lambda: read_markers.pending)
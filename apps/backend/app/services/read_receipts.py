@@ -0,0 +1,161 @@
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, select, update
+
+from app.core.metrics import registry
+from app.db.database import SessionLocal
+from app.models.conversation import Message
+
+READER_SIDES = ("agent", "visitor")
+
+# Distinct message IDs kept per (conversation, reader) until the flush
+# resolves the newest; marks normally arrive in order, a few cover reordering
+MAX_PENDING_MARKS = 8
+
+# Resolve marked IDs in chunks below SQLite's 999 bound-parameter limit
+RESOLVE_CHUNK = 500
+
+class ReadReceipts:
+    """
+    Coalesces mark_read frames into periodic range UPDATEs of Message.read_at.
+
+    A mark is a high-water message ID: everything the other side sent up to
+    that message is read. Marks only touch an in-memory map holding one
+    pending entry per (conversation, reader side). flush() resolves each
+    entry's newest marked message, applies all of them in one executemany
+    and broadcasts one messages_read event per entry for that message.
+    Updates only fill read_at where it is NULL, so replaying an older mark is
+    harmless and all marks received in an interval can be applied together.
+    """
+
+    def __init__(self):
+        # (conversation_id, reader) -> ([message_id, ...], marked_at), newest mark last
+        self._marks: Dict[Tuple[str, str], Tuple[List[str], datetime]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def mark(self, conversation_id: str, reader: str, message_id: str, read_at: Optional[datetime] = None):
+        if not conversation_id or not message_id or reader not in READER_SIDES:
+            return
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        read_at = read_at or datetime.utcnow()
+        with self._lock:
+            pending = self._marks.get((conversation_id, reader))
+            message_ids = [] if pending is None else [mid for mid in pending[0] if mid != message_id]
+            message_ids.append(message_id)
+            self._marks[(conversation_id, reader)] = (message_ids[-MAX_PENDING_MARKS:], read_at)
+
+    @property
+    def pending(self) -> int:
+        return len(self._marks)
+
+    def flush(self) -> int:
+        with self._lock:
+            marks, self._marks = self._marks, {}
+        if not marks:
+            return 0
+
+        # Messages of the other side, in the same conversation, up to the marked one
+        table = Message.__table__
+        marked = table.alias("marked")
+        stmt = update(table).where(
+            table.c.conversation_id == bindparam("conversation"),
+            table.c.sender != bindparam("reader"),
+            table.c.read_at.is_(None),
+            table.c.created_at <= select(marked.c.created_at).where(
+                marked.c.id == bindparam("up_to"),
+                marked.c.conversation_id == bindparam("conversation")
+            ).scalar_subquery()
+        ).values(read_at=bindparam("marked_at"))
+
+        db = SessionLocal()
+        try:
+            high_water = self._resolve(db, marks)
+            if high_water:
+                db.execute(stmt, [
+                    {"conversation": conversation_id, "reader": reader, "up_to": message_id, "marked_at": read_at}
+                    for (conversation_id, reader), (message_id, read_at) in high_water.items()
+                ])
+                db.commit()
+        except Exception:
+            db.rollback()
+            # Put the batch back; marks received meanwhile stay newest
+            with self._lock:
+                for key, (message_ids, read_at) in marks.items():
+                    pending = self._marks.get(key)
+                    if pending is not None:
+                        newer = pending[0]
+                        message_ids = [mid for mid in message_ids if mid not in newer] + newer
+                        read_at = pending[1]
+                    self._marks[key] = (message_ids[-MAX_PENDING_MARKS:], read_at)
+            raise
+        finally:
+            db.close()
+
+        self._broadcast(high_water)
+        return len(high_water)
+
+    def _resolve(self, db, marks) -> Dict[Tuple[str, str], Tuple[str, datetime]]:
+        """
+        The newest marked message of each entry: the marked ID with the latest
+        created_at, read in one query. IDs of other conversations or unknown
+        IDs are ignored.
+        """
+        candidates = list({message_id for message_ids, _ in marks.values() for message_id in message_ids})
+        created: Dict[str, Tuple[str, datetime]] = {}
+        for start in range(0, len(candidates), RESOLVE_CHUNK):
+            rows = db.execute(
+                select(Message.id, Message.conversation_id, Message.created_at).where(
+                    Message.id.in_(candidates[start:start + RESOLVE_CHUNK])
+                )
+            )
+            for row in rows:
+                created[row.id] = (row.conversation_id, row.created_at)
+
+        high_water = {}
+        for (conversation_id, reader), (message_ids, read_at) in marks.items():
+            known = [
+                (created[message_id][1], message_id) for message_id in message_ids
+                if message_id in created and created[message_id][0] == conversation_id
+            ]
+            if known:
+                high_water[(conversation_id, reader)] = (max(known)[1], read_at)
+        return high_water
+
+    def _broadcast(self, high_water: Dict[Tuple[str, str], Tuple[str, datetime]]):
+        loop = self._loop
+        if loop is None or loop.is_closed() or not high_water:
+            return
+        events = []
+        for (conversation_id, reader), (message_id, read_at) in high_water.items():
+            events.append((conversation_id, {
+                "type": "messages_read",
+                "conversation_id": conversation_id,
+                "reader": reader,
+                "up_to_message_id": message_id,
+                "read_at": read_at.isoformat()
+            }))
+        try:
+            if asyncio.get_running_loop() is loop:
+                loop.create_task(self._send(events))
+                return
+        except RuntimeError:
+            pass
+        # flush() normally runs in a worker thread
+        asyncio.run_coroutine_threadsafe(self._send(events), loop)
+
+    async def _send(self, events):
+        from app.websockets.connection_manager import connection_manager
+
+        for conversation_id, event in events:
+            await connection_manager.broadcast_to_conversation(event, conversation_id)
+
+# Global read receipt buffer
+read_receipts = ReadReceipts()
+registry.gauge("chat_read_receipts_pending", "Conversations with mark_read frames awaiting the next flush",
+               function=lambda: read_receipts.pending)
@@ -0,0 +1,303 @@
+"""
+In-memory queue of unassigned waiting conversations, rebuilt from the
+database (status WAITING, no assigned agent) at startup.
+
+Order is earliest SLA deadline first: a conversation is due at
+waiting_since + the SLA of its priority, so an old normal chat eventually
+outranks a fresh high-priority one instead of starving. Each website has
+one FIFO lane per priority; within a lane deadlines only grow, so the
+queue's head is the earliest of at most four lane heads.
+
+Queue positions change on every dispatch, so they are not stored. Each
+lane keeps a Fenwick tree of live entries over append-only slots, which
+counts "entries due before X" in O(log n) even after removals from the
+middle. A position is at most four such counts.
+"""
+
+import asyncio
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.conversation import Conversation, ConversationStatus, Priority
+
+# Dispatch order among equal deadlines
+PRIORITY_ORDER = (Priority.URGENT, Priority.HIGH, Priority.NORMAL, Priority.LOW)
+
+class _Lane:
+    """FIFO of one priority with O(log n) rank queries"""
+
+    def __init__(self, sla_seconds: float):
+        self.sla_seconds = sla_seconds
+        self._ids: List[Optional[str]] = []  # slot -> conversation, None once removed
+        self._times: List[float] = []  # slot -> waiting_since, non-decreasing
+        self._tree: List[int] = [0]  # Fenwick tree over live slots, 1-based
+        self._slots: Dict[str, int] = {}
+        self._head = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._slots
+
+    def push(self, conversation_id: str, waiting_since: float):
+        # Never jump ahead of an entry already queued in this lane
+        if self._times and waiting_since < self._times[-1]:
+            waiting_since = self._times[-1]
+        slot = len(self._ids)
+        self._ids.append(conversation_id)
+        self._times.append(waiting_since)
+        self._slots[conversation_id] = slot
+        # New Fenwick node i covers slots (i - lowbit(i), i]
+        i = slot + 1
+        self._tree.append(1 + self._prefix(i - 1) - self._prefix(i - (i & -i)))
+
+    def remove(self, conversation_id: str) -> bool:
+        slot = self._slots.pop(conversation_id, None)
+        if slot is None:
+            return False
+        self._ids[slot] = None
+        i = slot + 1
+        while i < len(self._tree):
+            self._tree[i] -= 1
+            i += i & -i
+        if len(self._ids) > 1024 and len(self._ids) > 4 * len(self._slots):
+            self._compact()
+        return True
+
+    def head(self) -> Optional[Tuple[str, float]]:
+        """(conversation_id, deadline) of the oldest entry"""
+        while self._head < len(self._ids) and self._ids[self._head] is None:
+            self._head += 1
+        if self._head == len(self._ids):
+            return None
+        return self._ids[self._head], self._times[self._head] + self.sla_seconds
+
+    def deadline(self, conversation_id: str) -> float:
+        return self._times[self._slots[conversation_id]] + self.sla_seconds
+
+    def rank(self, conversation_id: str) -> int:
+        """Live entries ahead of this one in the lane"""
+        return self._prefix(self._slots[conversation_id])
+
+    def count_due_before(self, deadline: float, inclusive: bool = False) -> int:
+        """Live entries whose deadline is before (or at) `deadline`"""
+        cutoff = deadline - self.sla_seconds
+        slot = (bisect_right if inclusive else bisect_left)(self._times, cutoff)
+        return self._prefix(slot)
+
+    def oldest_wait(self, now: float) -> Optional[float]:
+        head = self.head()
+        return now - self._times[self._slots[head[0]]] if head else None
+
+    def _prefix(self, count: int) -> int:
+        """Live entries among the first `count` slots"""
+        total = 0
+        while count > 0:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+
+    def _compact(self):
+        live = [(conversation_id, waiting_since)
+                for conversation_id, waiting_since in zip(self._ids, self._times)
+                if conversation_id is not None]
+        self._ids, self._times, self._tree, self._slots, self._head = [], [], [0], {}, 0
+        for conversation_id, waiting_since in live:
+            self.push(conversation_id, waiting_since)
+
+class WaitingQueue:
+    """Waiting conversations of one website"""
+
+    def __init__(self, sla_seconds: Dict[Priority, float]):
+        self.lanes = {priority: _Lane(sla_seconds[priority]) for priority in PRIORITY_ORDER}
+        self._priorities: Dict[str, Priority] = {}
+
+    def __len__(self) -> int:
+        return len(self._priorities)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._priorities
+
+    def push(self, conversation_id: str, priority: Priority, waiting_since: Optional[float] = None):
+        self.remove(conversation_id)
+        priority = Priority(priority or Priority.NORMAL)
+        self._priorities[conversation_id] = priority
+        self.lanes[priority].push(conversation_id, waiting_since or time.time())
+
+    def remove(self, conversation_id: str) -> bool:
+        priority = self._priorities.pop(conversation_id, None)
+        return priority is not None and self.lanes[priority].remove(conversation_id)
+
+    def peek(self) -> Optional[Tuple[float, int, str]]:
+        """(deadline, priority rank, conversation_id) of the next conversation due"""
+        best = None
+        for rank, priority in enumerate(PRIORITY_ORDER):
+            head = self.lanes[priority].head()
+            if head and (best is None or (head[1], rank) < best[:2]):
+                best = (head[1], rank, head[0])
+        return best
+
+    def pop(self) -> Optional[str]:
+        head = self.peek()
+        if head is None:
+            return None
+        self.remove(head[2])
+        return head[2]
+
+    def position(self, conversation_id: str) -> Optional[int]:
+        """1-based place in dispatch order, or None if not queued"""
+        priority = self._priorities.get(conversation_id)
+        if priority is None:
+            return None
+        own_rank = PRIORITY_ORDER.index(priority)
+        lane = self.lanes[priority]
+        deadline = lane.deadline(conversation_id)
+        ahead = lane.rank(conversation_id)
+        for rank, other in enumerate(PRIORITY_ORDER):
+            if other is not priority:
+                # Equal deadlines go to the more urgent priority
+                ahead += self.lanes[other].count_due_before(deadline, inclusive=rank < own_rank)
+        return ahead + 1
+
+    def stats(self, now: Optional[float] = None) -> Dict:
+        now = now or time.time()
+        return {
+            priority.value: {"queued": len(lane), "oldest_wait_seconds": lane.oldest_wait(now)}
+            for priority, lane in self.lanes.items()
+        }
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+class WaitingQueues:
+    """Per-website waiting queues plus coalesced position pushes to visitors"""
+
+    def __init__(self, sla_seconds: Dict[Priority, float]):
+        self.sla_seconds = sla_seconds
+        self._queues: Dict[str, WaitingQueue] = {}
+        self._websites: Dict[str, str] = {}  # conversation -> website
+        self._pushed_positions: Dict[str, int] = {}
+        self._push_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._websites)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._websites
+
+    def queue(self, website_id: str) -> WaitingQueue:
+        queue = self._queues.get(website_id)
+        if queue is None:
+            queue = self._queues[website_id] = WaitingQueue(self.sla_seconds)
+        return queue
+
+    def push(self, conversation_id: str, website_id: str, priority: Priority = Priority.NORMAL,
+             waiting_since: Optional[datetime] = None):
+        self.remove(conversation_id)
+        self.queue(website_id).push(conversation_id, priority, _epoch(waiting_since))
+        self._websites[conversation_id] = website_id
+        self.schedule_position_push()
+
+    def remove(self, conversation_id: str) -> bool:
+        website_id = self._websites.pop(conversation_id, None)
+        if website_id is None:
+            return False
+        self._queues[website_id].remove(conversation_id)
+        self._pushed_positions.pop(conversation_id, None)
+        self.schedule_position_push()
+        return True
+
+    def peek_next(self, website_ids: Iterable[str]) -> Optional[Tuple[str, str]]:
+        """(conversation_id, website_id) of the most overdue conversation, left in the queue"""
+        best = None
+        for website_id in website_ids:
+            queue = self._queues.get(website_id)
+            head = queue.peek() if queue else None
+            if head and (best is None or head[:2] < best[0][:2]):
+                best = (head, website_id)
+        if best is None:
+            return None
+        return best[0][2], best[1]
+
+    def position(self, conversation_id: str) -> Optional[int]:
+        website_id = self._websites.get(conversation_id)
+        return self._queues[website_id].position(conversation_id) if website_id else None
+
+    def rebuild(self, db) -> int:
+        """Reload from the database: unassigned WAITING conversations"""
+        rows = db.query(
+            Conversation.id, Conversation.website_id, Conversation.priority,
+            Conversation.updated_at, Conversation.created_at
+        ).filter(
+            Conversation.status == ConversationStatus.WAITING,
+            Conversation.assigned_agent_id.is_(None)
+        ).all()
+        self._queues.clear()
+        self._websites.clear()
+        self._pushed_positions.clear()
+        for row in sorted(rows, key=lambda row: _epoch(row.updated_at or row.created_at) or 0):
+            self.queue(row.website_id).push(
+                row.id, row.priority or Priority.NORMAL, _epoch(row.updated_at or row.created_at)
+            )
+            self._websites[row.id] = row.website_id
+        return len(rows)
+
+    def stats(self) -> Dict:
+        return {website_id: queue.stats() for website_id, queue in self._queues.items() if len(queue)}
+
+    def schedule_position_push(self):
+        """Coalesce position updates: at most one push per interval"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop (scripts, startup rebuild); visitors get positions on join
+        if self._push_task is not None and not self._push_task.done() and self._push_task.get_loop() is loop:
+            return
+        self._push_task = loop.create_task(self._push_after_delay())
+
+    async def _push_after_delay(self):
+        await asyncio.sleep(settings.queue_position_push_interval)
+        await self.push_positions()
+
+    async def push_positions(self):
+        """Send changed positions to connected visitors of queued conversations"""
+        from app.websockets.connection_manager import connection_manager
+
+        for conversation_id, connection_ids in list(connection_manager.conversation_subscriptions.items()):
+            position = self.position(conversation_id)
+            if position is None or self._pushed_positions.get(conversation_id) == position:
+                continue
+            self._pushed_positions[conversation_id] = position
+            for connection_id in list(connection_ids):
+                info = connection_manager.connection_info.get(connection_id, {})
+                if info.get("connection_type") == "visitor":
+                    await connection_manager.send_personal_message(
+                        queue_position_message(conversation_id, position), connection_id
+                    )
+
+def queue_position_message(conversation_id: str, position: int) -> Dict:
+    return {
+        "type": "queue_position",
+        "conversation_id": conversation_id,
+        "position": position,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+# Global waiting queues instance
+waiting_queues = WaitingQueues({
+    Priority.URGENT: settings.queue_sla_urgent_seconds,
+    Priority.HIGH: settings.queue_sla_high_seconds,
+    Priority.NORMAL: settings.queue_sla_normal_seconds,
+    Priority.LOW: settings.queue_sla_low_seconds,
+})
+registry.gauge("chat_waiting_queue_depth", "Conversations waiting for an agent on this worker",
+               function=lambda: len(waiting_queues))
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core import metrics
+from app.db import repository
+from app.models.website import Website
+
+class CachedWebsite:
+    """The public, rarely-changing part of a Website row"""
+
+    __slots__ = ("id", "is_active", "widget_config", "etag")
+
+    def __init__(self, id: str, is_active: bool, widget_config: Optional[dict]):
+        self.id = id
+        self.is_active = bool(is_active) if is_active is not None else True
+        self.widget_config = widget_config or {}
+        payload = json.dumps([self.is_active, self.widget_config], sort_keys=True, default=str)
+        self.etag = f'W/"{hashlib.sha1(payload.encode()).hexdigest()[:20]}"'
+
+class WebsiteCache:
+    """
+    In-process cache of website existence, active flag and widget config.
+
+    Visitor connects and widget messages only need to know that a website
+    exists; this keeps those lookups off the database. Entries expire after
+    a TTL so other workers' edits are picked up, and the admin endpoints
+    invalidate explicitly so edits on this worker apply immediately.
+    Missing websites are cached too, for a shorter TTL, so unknown IDs can't
+    be used to hammer the database. The cache is an LRU bounded by
+    max_entries, so caller-supplied IDs can't grow it without limit.
+    """
+
+    def __init__(self, ttl_seconds: float = 300, missing_ttl_seconds: float = 10, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.missing_ttl_seconds = missing_ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Optional[CachedWebsite]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, website_id: str) -> Optional[CachedWebsite]:
+        """Return the cached website, loading it on a miss; None if it doesn't exist"""
+        entry = self._entries.get(website_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(website_id)
+            self.hits += 1
+            metrics.cache_requests.labels("website", "hit").inc()
+            return entry[1]
+
+        self.misses += 1
+        metrics.cache_requests.labels("website", "miss").inc()
+        row = repository.get_website_summary(db, website_id)
+
+        cached = CachedWebsite(row.id, row.is_active, row.widget_config) if row else None
+        self._store(website_id, cached)
+        return cached
+
+    def peek(self, website_id: str) -> Optional[CachedWebsite]:
+        """The cached website if present and fresh; never queries the database"""
+        entry = self._entries.get(website_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def prime(self, website: Website):
+        """Store a freshly written website so the next lookup is a hit"""
+        self._store(website.id, CachedWebsite(website.id, website.is_active, website.widget_config))
+
+    def invalidate(self, website_id: str):
+        self._entries.pop(website_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, website_id: str, cached: Optional[CachedWebsite]):
+        ttl = self.ttl_seconds if cached is not None else self.missing_ttl_seconds
+        self._entries[website_id] = (time.monotonic() + ttl, cached)
+        self._entries.move_to_end(website_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+# Global website cache instance
+website_cache = WebsiteCache(
+    ttl_seconds=settings.website_cache_ttl_seconds,
+    missing_ttl_seconds=settings.website_cache_missing_ttl_seconds,
+    max_entries=settings.website_cache_max_entries,
+)
@@ -1,10 +1,16 @@
 import json
+import time
 import asyncio
 from typing import Dict, List, Set, Optional
 from fastapi import WebSocket, WebSocketDisconnect
 from datetime import datetime
 import uuid
 
+from app.core import metrics
+from app.core.log import get_logger
+
+log = get_logger("chat.websockets")
+
 class ConnectionManager:
     def __init__(self):
         # Active WebSocket connections
@@ -22,6 +28,12 @@ class ConnectionManager:
         # Website subscriptions: website_id -> set of connection_ids
         self.website_subscriptions: Dict[str, Set[str]] = {}
         
+        # Inbox subscriptions (agents): website_id -> set of connection_ids
+        self.inbox_subscriptions: Dict[str, Set[str]] = {}
+        
+        # Open connections by type, kept up to date by connect()/disconnect()
+        self.connection_counts: Dict[str, int] = {}
+        
         # Connection limits
         self.max_connections_per_user = 1  # One WebSocket per agent session
         self.max_total_connections = 100  # Reduced for better resource management
@@ -40,11 +52,12 @@ class ConnectionManager:
         
         # Check total connection limit
         if len(self.active_connections) >= self.max_total_connections:
+            metrics.ws_connections_rejected.labels("capacity").inc()
             await websocket.close(code=4008, reason="Server at capacity")
             raise Exception("Max total connections reached")
         
         # WebSocket should already be accepted by endpoint
-        print(f"Registering WebSocket connection for {connection_type} {user_id}")
+        log.debug("ws.register", connection_type=connection_type, user_id=user_id)
         
         # Store connection info before closing old ones
         self.active_connections[connection_id] = websocket
@@ -56,6 +69,8 @@ class ConnectionManager:
             "connected_at": datetime.utcnow().isoformat(),
             "last_seen": datetime.utcnow().isoformat()
         }
+        self.connection_counts[connection_type] = self.connection_counts.get(connection_type, 0) + 1
+        metrics.ws_connections.labels(connection_type).inc()
         
         # Subscribe user to their own updates
         if user_id not in self.user_subscriptions:
@@ -64,9 +79,9 @@ class ConnectionManager:
         
         # For agents, temporarily allow multiple connections for testing
         if connection_type == "agent":
-            print(f"Agent connection established for user {user_id}")
             # Temporarily disabled: other_connections cleanup for testing
             # This will be re-enabled after confirming messaging works
+            pass
             
         # For visitors, allow the configured limit
         elif connection_type == "visitor":
@@ -87,7 +102,8 @@ class ConnectionManager:
                 self.website_subscriptions[website_id] = set()
             self.website_subscriptions[website_id].add(connection_id)
 
-        print(f"WebSocket connection established: {connection_id} ({connection_type}) - Total: {len(self.active_connections)}")
+        log.info("ws.connected", connection_id=connection_id, connection_type=connection_type,
+                 total=len(self.active_connections))
 
     async def _close_all_user_connections(self, user_id: str, reason: str = "Connection replaced"):
         """Close all existing connections for a user (used for agents)"""
@@ -98,15 +114,15 @@ class ConnectionManager:
         if not user_connection_ids:
             return
             
-        print(f"Closing {len(user_connection_ids)} existing connections for user {user_id}")
+        log.info("ws.close_user_connections", user_id=user_id, count=len(user_connection_ids))
         
         for conn_id in user_connection_ids:
             if conn_id in self.active_connections:
                 try:
                     await self.active_connections[conn_id].close(code=4010, reason=reason)
-                    print(f"Closed connection {conn_id} for user {user_id}: {reason}")
+                    log.debug("ws.closed", connection_id=conn_id, user_id=user_id, reason=reason)
                 except Exception as e:
-                    print(f"Error closing connection {conn_id}: {e}")
+                    log.warning("ws.close_failed", connection_id=conn_id, error=str(e))
                 finally:
                     self.disconnect(conn_id)
         
@@ -118,15 +134,15 @@ class ConnectionManager:
         if not connection_ids:
             return
             
-        print(f"Closing {len(connection_ids)} specific connections")
+        log.info("ws.close_connections", count=len(connection_ids))
         
         for conn_id in connection_ids:
             if conn_id in self.active_connections:
                 try:
                     await self.active_connections[conn_id].close(code=4010, reason=reason)
-                    print(f"Closed connection {conn_id}: {reason}")
+                    log.debug("ws.closed", connection_id=conn_id, reason=reason)
                 except Exception as e:
-                    print(f"Error closing connection {conn_id}: {e}")
+                    log.warning("ws.close_failed", connection_id=conn_id, error=str(e))
                 finally:
                     self.disconnect(conn_id)
         
@@ -161,7 +177,7 @@ class ConnectionManager:
         if oldest_connection_id and oldest_connection_id in self.active_connections:
             try:
                 await self.active_connections[oldest_connection_id].close(code=4009, reason="Connection limit reached")
-                print(f"Closed oldest connection {oldest_connection_id} for user {user_id}")
+                log.info("ws.closed_oldest", connection_id=oldest_connection_id, user_id=user_id)
             except:
                 pass
             finally:
@@ -188,7 +204,7 @@ class ConnectionManager:
             if connection_id in self.active_connections:
                 try:
                     await self.active_connections[connection_id].close(code=4002, reason="Idle timeout")
-                    print(f"Closed idle connection {connection_id}")
+                    log.info("ws.closed_idle", connection_id=connection_id)
                 except:
                     pass
                 finally:
@@ -204,6 +220,10 @@ class ConnectionManager:
             info = self.connection_info.get(connection_id, {})
             user_id = info.get("user_id")
             website_id = info.get("website_id")
+            connection_type = info.get("connection_type")
+            if connection_type in self.connection_counts:
+                self.connection_counts[connection_type] -= 1
+                metrics.ws_connections.labels(connection_type).dec()
             
             # Remove from subscriptions
             if user_id and user_id in self.user_subscriptions:
@@ -216,6 +236,10 @@ class ConnectionManager:
                 if not self.website_subscriptions[website_id]:
                     del self.website_subscriptions[website_id]
             
+            # Remove from inbox subscriptions
+            for inbox_website_id in list(info.get("inbox_website_ids", ())):
+                self.unsubscribe_from_inbox(connection_id, inbox_website_id)
+            
             # Remove from conversation subscriptions
             for conv_id, conn_set in self.conversation_subscriptions.items():
                 conn_set.discard(connection_id)
@@ -229,7 +253,7 @@ class ConnectionManager:
             if connection_id in self.connection_info:
                 del self.connection_info[connection_id]
             
-            print(f"WebSocket connection closed: {connection_id}")
+            log.info("ws.disconnected", connection_id=connection_id, connection_type=connection_type)
 
     async def send_personal_message(self, message: dict, connection_id: str):
         """Send a message to a specific connection"""
@@ -238,19 +262,22 @@ class ConnectionManager:
             try:
                 # Check if WebSocket is still open
                 if websocket.client_state.value == 3:  # CLOSED state
-                    print(f"WebSocket {connection_id} is already closed, removing connection")
+                    log.debug("ws.already_closed", connection_id=connection_id)
                     self.disconnect(connection_id)
                     return
                 
+                started = time.perf_counter()
                 await websocket.send_text(json.dumps(message))
+                metrics.ws_send_seconds.observe(time.perf_counter() - started)
                 
                 # Update last seen
                 if connection_id in self.connection_info:
                     self.connection_info[connection_id]["last_seen"] = datetime.utcnow().isoformat()
                     
             except Exception as e:
+                metrics.ws_send_errors.inc()
                 error_msg = str(e) if str(e) else f"{type(e).__name__}: {repr(e)}"
-                print(f"Error sending message to {connection_id}: {error_msg}")
+                log.warning("ws.send_failed", connection_id=connection_id, error=error_msg)
                 # Connection is broken, remove it
                 self.disconnect(connection_id)
                 # Re-raise WebSocketDisconnect to let the endpoint handle it properly
@@ -262,30 +289,30 @@ class ConnectionManager:
                                       exclude_connection: Optional[str] = None):
         """Broadcast a message to all connections subscribed to a conversation"""
         if conversation_id not in self.conversation_subscriptions:
-            print(f"📭 No subscribers for conversation {conversation_id}")
+            log.debug("message.no_subscribers", conversation_id=conversation_id)
             return
         
         subscribers = self.conversation_subscriptions[conversation_id]
-        print(f"📤 Broadcasting to {len(subscribers)} subscribers for conversation {conversation_id}")
+        log.info("message.broadcast", conversation_id=conversation_id, recipients=len(subscribers))
         
+        started, recipients = time.perf_counter(), len(subscribers)
         connections_to_remove = []
         
         for connection_id in subscribers:
             if exclude_connection and connection_id == exclude_connection:
-                print(f"⏭️ Skipping excluded connection {connection_id}")
                 continue
                 
             try:
-                print(f"📨 Sending message to connection {connection_id}")
                 await self.send_personal_message(message, connection_id)
-                print(f"✅ Message sent to connection {connection_id}")
+                log.debug("ws.send", connection_id=connection_id, conversation_id=conversation_id)
             except Exception as e:
-                print(f"❌ Failed to send message to connection {connection_id}: {e}")
+                log.warning("ws.send_failed", connection_id=connection_id, error=str(e))
                 connections_to_remove.append(connection_id)
         
         # Remove broken connections
         for connection_id in connections_to_remove:
             self.disconnect(connection_id)
+        _observe_broadcast("conversation", started, recipients)
 
     async def broadcast_to_user(self, message: dict, user_id: str, 
                                exclude_connection: Optional[str] = None):
@@ -293,6 +320,7 @@ class ConnectionManager:
         if user_id not in self.user_subscriptions:
             return
         
+        started, recipients = time.perf_counter(), len(self.user_subscriptions[user_id])
         connections_to_remove = []
         
         for connection_id in self.user_subscriptions[user_id]:
@@ -307,6 +335,7 @@ class ConnectionManager:
         # Remove broken connections
         for connection_id in connections_to_remove:
             self.disconnect(connection_id)
+        _observe_broadcast("user", started, recipients)
 
     async def broadcast_to_website(self, message: dict, website_id: str,
                                   exclude_connection: Optional[str] = None):
@@ -314,6 +343,7 @@ class ConnectionManager:
         if website_id not in self.website_subscriptions:
             return
         
+        started, recipients = time.perf_counter(), len(self.website_subscriptions[website_id])
         connections_to_remove = []
         
         for connection_id in self.website_subscriptions[website_id]:
@@ -328,6 +358,7 @@ class ConnectionManager:
         # Remove broken connections
         for connection_id in connections_to_remove:
             self.disconnect(connection_id)
+        _observe_broadcast("website", started, recipients)
 
     def subscribe_to_conversation(self, connection_id: str, conversation_id: str):
         """Subscribe a connection to conversation updates"""
@@ -335,7 +366,10 @@ class ConnectionManager:
             self.conversation_subscriptions[conversation_id] = set()
         
         self.conversation_subscriptions[conversation_id].add(connection_id)
-        print(f"Connection {connection_id} subscribed to conversation {conversation_id}")
+        log.debug("ws.subscribe", connection_id=connection_id, conversation_id=conversation_id)
+
+    def is_subscribed(self, connection_id: str, conversation_id: str) -> bool:
+        return connection_id in self.conversation_subscriptions.get(conversation_id, ())
 
     def unsubscribe_from_conversation(self, connection_id: str, conversation_id: str):
         """Unsubscribe a connection from conversation updates"""
@@ -344,6 +378,43 @@ class ConnectionManager:
             if not self.conversation_subscriptions[conversation_id]:
                 del self.conversation_subscriptions[conversation_id]
 
+    def subscribe_to_inbox(self, connection_id: str, website_id: str):
+        """Subscribe an agent connection to inbox deltas of a website"""
+        if website_id not in self.inbox_subscriptions:
+            self.inbox_subscriptions[website_id] = set()
+        self.inbox_subscriptions[website_id].add(connection_id)
+        info = self.connection_info.get(connection_id)
+        if info is not None:
+            info.setdefault("inbox_website_ids", set()).add(website_id)
+
+    def unsubscribe_from_inbox(self, connection_id: str, website_id: str):
+        if website_id in self.inbox_subscriptions:
+            self.inbox_subscriptions[website_id].discard(connection_id)
+            if not self.inbox_subscriptions[website_id]:
+                del self.inbox_subscriptions[website_id]
+        info = self.connection_info.get(connection_id)
+        if info is not None:
+            info.get("inbox_website_ids", set()).discard(website_id)
+
+    async def broadcast_to_inbox(self, message: dict, website_id: str):
+        """Send an inbox delta to every agent watching the website's inbox"""
+        if website_id not in self.inbox_subscriptions:
+            return
+        
+        started, recipients = time.perf_counter(), len(self.inbox_subscriptions[website_id])
+        connections_to_remove = []
+        
+        for connection_id in list(self.inbox_subscriptions[website_id]):
+            try:
+                await self.send_personal_message(message, connection_id)
+            except:
+                connections_to_remove.append(connection_id)
+        
+        # Remove broken connections
+        for connection_id in connections_to_remove:
+            self.disconnect(connection_id)
+        _observe_broadcast("inbox", started, recipients)
+
     def get_conversation_participants(self, conversation_id: str) -> List[Dict]:
         """Get all active participants in a conversation"""
         if conversation_id not in self.conversation_subscriptions:
@@ -373,19 +444,17 @@ class ConnectionManager:
 
     def get_connection_stats(self) -> Dict:
         """Get connection statistics"""
-        total_connections = len(self.active_connections)
-        agent_connections = sum(1 for info in self.connection_info.values() 
-                               if info.get("connection_type") == "agent")
-        visitor_connections = sum(1 for info in self.connection_info.values() 
-                                 if info.get("connection_type") == "visitor")
-        
         return {
-            "total_connections": total_connections,
-            "agent_connections": agent_connections,
-            "visitor_connections": visitor_connections,
+            "total_connections": len(self.active_connections),
+            "agent_connections": self.connection_counts.get("agent", 0),
+            "visitor_connections": self.connection_counts.get("visitor", 0),
             "active_conversations": len(self.conversation_subscriptions),
             "websites_with_connections": len(self.website_subscriptions)
         }
 
+def _observe_broadcast(scope: str, started: float, recipients: int):
+    metrics.broadcast_seconds.labels(scope).observe(time.perf_counter() - started)
+    metrics.broadcast_recipients.labels(scope).observe(recipients)
+
 # Global connection manager instance
 connection_manager = ConnectionManager()
\ No newline at end of file
@@ -1,19 +1,37 @@
 import json
+import math
 import uuid
 import asyncio
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query, HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional, Set
 from datetime import datetime
 
 from app.db.database import get_db
-from app.models.conversation import Conversation, Message
+from app.db.routing import session_router
+from app.db import repository
+from app.models.conversation import Conversation, Message, ConversationStatus
 from app.models.website import Website
-from app.models.user import User
+from app.models.user import User, user_website_association
 from app.api.auth import get_current_user_websocket
+from app.services.website_cache import website_cache
+from app.services.presence import presence_tracker
+from app.services.page_views import page_view_buffer
+from app.services.read_receipts import read_receipts
+from app.services.read_markers import read_markers
+from app.services import analytics, inbox
+from app.services.rate_limit import rate_limiter, client_ip
+from app.services.assignment import agent_connected, agent_disconnected, claim_on_reply
+from app.services.archival import load_archived_messages_many
+from app.services.waiting_queue import waiting_queues, queue_position_message
+from app.core.config import settings
+from app.core import metrics
+from app.core.log import get_logger
 from .connection_manager import connection_manager
 
 router = APIRouter()
+log = get_logger("chat.websockets")
 
 @router.websocket("/agent/{user_id}")
 async def websocket_agent_endpoint(
@@ -27,24 +45,21 @@ async def websocket_agent_endpoint(
     # Accept connection first, then authenticate (FastAPI WebSocket pattern)
     try:
         await websocket.accept()
-        print(f"WebSocket connection accepted, now authenticating user {user_id}")
     except Exception as e:
-        print(f"Failed to accept WebSocket connection: {e}")
+        log.warning("ws.accept_failed", error=str(e))
         return
     
     # Authenticate user after accepting connection
-    print(f"WebSocket authentication attempt for user {user_id}")
     user = await get_current_user_websocket(token, db)
     if not user or str(user.id) != user_id:
-        print(f"Authentication failed: user={user}, user_id={user_id}")
+        log.info("ws.auth_failed", user_id=user_id)
+        metrics.ws_connections_rejected.labels("unauthorized").inc()
         await websocket.close(code=4001, reason="Unauthorized")
         return
-    print(f"WebSocket authentication successful for user {user_id}")
     
     connection_id = str(uuid.uuid4())
     
     try:
-        print(f"Attempting to connect WebSocket for agent {user_id}")
         # Connect to WebSocket (connection manager will handle accept())
         await connection_manager.connect(
             websocket=websocket,
@@ -52,7 +67,7 @@ async def websocket_agent_endpoint(
             user_id=user_id,
             connection_type="agent"
         )
-        print(f"WebSocket connected successfully for agent {user_id}")
+        await agent_connected(db, user_id)
         
         # Send connection confirmation immediately (no delay needed)
         try:
@@ -62,12 +77,11 @@ async def websocket_agent_endpoint(
                 "user_id": user_id,
                 "timestamp": datetime.utcnow().isoformat()
             }, connection_id)
-            print(f"✅ Sent connection confirmation to {connection_id}")
         except WebSocketDisconnect:
-            print(f"🔌 Client disconnected before confirmation could be sent to {connection_id}")
+            log.info("ws.disconnected_before_confirmation", connection_id=connection_id)
             return  # Exit early if client already disconnected
         except Exception as e:
-            print(f"❌ Failed to send connection confirmation: {e}")
+            log.warning("ws.confirmation_failed", connection_id=connection_id, error=str(e))
             # Don't close connection just because initial message failed
         
         # Handle incoming messages
@@ -94,13 +108,14 @@ async def websocket_agent_endpoint(
     except WebSocketDisconnect:
         pass
     except Exception as e:
-        print(f"WebSocket error for agent {user_id}: {e}")
+        log.exception("ws.agent_error", user_id=user_id)
         try:
             await websocket.close(code=4000, reason=f"Connection error: {str(e)}")
         except:
             pass
     finally:
         connection_manager.disconnect(connection_id)
+        agent_disconnected(user_id)
 
 @router.websocket("/visitor/{website_id}")
 async def websocket_visitor_endpoint(
@@ -114,20 +129,36 @@ async def websocket_visitor_endpoint(
     # Accept connection first
     try:
         await websocket.accept()
-        print(f"WebSocket connection accepted for visitor")
     except Exception as e:
-        print(f"Failed to accept WebSocket connection: {e}")
+        log.warning("ws.accept_failed", error=str(e))
         return
     
-    # Verify website exists after accepting connection
-    website = db.query(Website).filter(Website.id == website_id).first()
+    # Rate limit before the website lookup, then verify the website exists
+    # (cache misses read from the replica)
+    read_db = session_router.read_session(f"visitor:{visitor_id}" if visitor_id else None)
+    try:
+        website, retry_after = await rate_limiter.check_website_request(
+            "connect",
+            website_id,
+            lambda: website_cache.get(read_db, website_id),
+            visitor_id=visitor_id,
+            ip=client_ip(websocket)
+        )
+    finally:
+        read_db.close()
+    if retry_after:
+        metrics.ws_connections_rejected.labels("rate_limited").inc()
+        await websocket.close(code=4029, reason="Rate limited")
+        return
     if not website:
+        metrics.ws_connections_rejected.labels("website_not_found").inc()
         await websocket.close(code=4004, reason="Website not found")
         return
     
     # Generate visitor ID if not provided
     if not visitor_id:
         visitor_id = f"visitor_{uuid.uuid4()}"
+    db.info["sticky_key"] = f"visitor:{visitor_id}"
     
     connection_id = str(uuid.uuid4())
     
@@ -141,6 +172,7 @@ async def websocket_visitor_endpoint(
             website_id=website_id,
             visitor_id=visitor_id
         )
+        presence_tracker.touch(visitor_id)
         
         # Give WebSocket a moment to be ready before sending initial message
         await asyncio.sleep(0.1)
@@ -178,17 +210,28 @@ async def websocket_visitor_endpoint(
     except WebSocketDisconnect:
         pass
     except Exception as e:
-        print(f"WebSocket error for visitor {visitor_id}: {e}")
+        log.exception("ws.visitor_error", visitor_id=visitor_id)
         try:
             await websocket.close(code=4000, reason=f"Connection error: {str(e)}")
         except:
             pass
     finally:
         connection_manager.disconnect(connection_id)
+        presence_tracker.touch(visitor_id)
+
+# Frame types counted by name in chat_ws_frames_total; anything else is "other"
+AGENT_FRAME_TYPES = frozenset({
+    "ping", "join_conversation", "join_conversations", "leave_conversation", "leave_conversations",
+    "subscribe_inbox", "unsubscribe_inbox", "send_message", "mark_read", "typing_start", "typing_stop",
+})
+VISITOR_FRAME_TYPES = frozenset({
+    "ping", "join_conversation", "send_message", "mark_read", "page_views", "typing_start", "typing_stop",
+})
 
 async def handle_agent_message(message_data: dict, connection_id: str, user_id: str, db: Session):
     """Handle messages from agents"""
     message_type = message_data.get("type")
+    metrics.ws_frames.labels("agent", message_type if message_type in AGENT_FRAME_TYPES else "other").inc()
     
     if message_type == "ping":
         # Respond to heartbeat ping
@@ -200,8 +243,12 @@ async def handle_agent_message(message_data: dict, connection_id: str, user_id:
     
     elif message_type == "join_conversation":
         conversation_id = message_data.get("conversation_id")
-        if conversation_id:
-            print(f"🔔 Agent {user_id} joining conversation {conversation_id}")
+        if conversation_id and not agent_conversation_ids(db, user_id, [str(conversation_id)]):
+            await connection_manager.send_personal_message({
+                "type": "error",
+                "message": "Conversation not found"
+            }, connection_id)
+        elif conversation_id:
             # Subscribe to conversation updates
             connection_manager.subscribe_to_conversation(connection_id, conversation_id)
             
@@ -221,9 +268,53 @@ async def handle_agent_message(message_data: dict, connection_id: str, user_id:
                 "conversation_id": conversation_id,
                 "timestamp": datetime.utcnow().isoformat()
             }, conversation_id, exclude_connection=connection_id)
-            print(f"✅ Agent {user_id} successfully joined conversation {conversation_id}")
+            log.debug("conversation.agent_joined", user_id=user_id, conversation_id=conversation_id)
         else:
-            print(f"❌ No conversation_id provided for join_conversation message")
+            log.info("ws.bad_frame", type=message_type, user_id=user_id)
+    
+    elif message_type == "join_conversations":
+        await handle_join_conversations(message_data, connection_id, user_id, db)
+    
+    elif message_type == "leave_conversations":
+        conversation_ids = message_data.get("conversation_ids") or []
+        left = [
+            conversation_id for conversation_id in dict.fromkeys(conversation_ids)
+            if connection_id in connection_manager.conversation_subscriptions.get(conversation_id, ())
+        ]
+        for conversation_id in left:
+            connection_manager.unsubscribe_from_conversation(connection_id, conversation_id)
+            if message_data.get("notify"):
+                await connection_manager.broadcast_to_conversation({
+                    "type": "agent_left",
+                    "user_id": user_id,
+                    "conversation_id": conversation_id,
+                    "timestamp": datetime.utcnow().isoformat()
+                }, conversation_id)
+        await connection_manager.send_personal_message({
+            "type": "conversations_left",
+            "conversation_ids": left,
+            "timestamp": datetime.utcnow().isoformat()
+        }, connection_id)
+    
+    elif message_type == "subscribe_inbox":
+        # Only websites the agent belongs to; defaults to all of them
+        website_ids = db.execute(
+            select(user_website_association.c.website_id).where(user_website_association.c.user_id == user_id)
+        ).scalars().all()
+        requested = message_data.get("website_ids")
+        if requested:
+            website_ids = [website_id for website_id in website_ids if website_id in set(requested)]
+        for website_id in website_ids:
+            connection_manager.subscribe_to_inbox(connection_id, website_id)
+        await connection_manager.send_personal_message({
+            "type": "inbox_subscribed",
+            "website_ids": website_ids,
+            "timestamp": datetime.utcnow().isoformat()
+        }, connection_id)
+    
+    elif message_type == "unsubscribe_inbox":
+        for website_id in list(connection_manager.connection_info.get(connection_id, {}).get("inbox_website_ids", ())):
+            connection_manager.unsubscribe_from_inbox(connection_id, website_id)
     
     elif message_type == "leave_conversation":
         conversation_id = message_data.get("conversation_id")
@@ -241,6 +332,15 @@ async def handle_agent_message(message_data: dict, connection_id: str, user_id:
     elif message_type == "send_message":
         await handle_send_message(message_data, connection_id, user_id, "agent", db)
     
+    elif message_type == "mark_read":
+        conversation_id = message_data.get("conversation_id")
+        # Only conversations this connection joined, which checked the agent's websites
+        if not connection_manager.is_subscribed(connection_id, conversation_id):
+            log.info("ws.unauthorized_frame", type=message_type, user_id=user_id, conversation_id=conversation_id)
+            return
+        read_receipts.mark(conversation_id, "agent", message_data.get("message_id"))
+        read_markers.mark(conversation_id)
+    
     elif message_type == "typing_start":
         conversation_id = message_data.get("conversation_id")
         if conversation_id:
@@ -263,10 +363,137 @@ async def handle_agent_message(message_data: dict, connection_id: str, user_id:
                 "timestamp": datetime.utcnow().isoformat()
             }, conversation_id, exclude_connection=connection_id)
 
+def agent_conversation_ids(db: Session, user_id: str, conversation_ids: List[str]) -> Set[str]:
+    """The subset of conversation_ids on the agent's websites"""
+    return set(db.execute(
+        select(Conversation.id).join(
+            user_website_association, Conversation.website_id == user_website_association.c.website_id
+        ).where(user_website_association.c.user_id == user_id, Conversation.id.in_(conversation_ids))
+    ).scalars())
+
+async def handle_join_conversations(message_data: dict, connection_id: str, user_id: str, db: Session):
+    """
+    Subscribe to many conversations in one frame, e.g. after a reconnect.
+
+    Joins are silent unless "notify" is set, and even then only conversations
+    this connection wasn't already in are announced. With "snapshot", the
+    reply carries the last "messages" messages and the unread count of every
+    joined conversation, read with two queries for the whole batch.
+    """
+    requested = message_data.get("conversation_ids")
+    if not isinstance(requested, list) or not requested:
+        await connection_manager.send_personal_message({
+            "type": "error",
+            "message": "conversation_ids must be a non-empty list"
+        }, connection_id)
+        return
+    requested = list(dict.fromkeys(str(conversation_id) for conversation_id in requested))
+    requested = requested[:settings.ws_join_batch_max]
+    
+    allowed = agent_conversation_ids(db, user_id, requested)
+    joined = [conversation_id for conversation_id in requested if conversation_id in allowed]
+    
+    for conversation_id in joined:
+        already_joined = connection_id in connection_manager.conversation_subscriptions.get(conversation_id, ())
+        connection_manager.subscribe_to_conversation(connection_id, conversation_id)
+        if message_data.get("notify") and not already_joined:
+            await connection_manager.broadcast_to_conversation({
+                "type": "agent_joined",
+                "user_id": user_id,
+                "conversation_id": conversation_id,
+                "timestamp": datetime.utcnow().isoformat()
+            }, conversation_id, exclude_connection=connection_id)
+    
+    reply = {
+        "type": "conversations_joined",
+        "conversation_ids": joined,
+        "rejected": [conversation_id for conversation_id in requested if conversation_id not in allowed],
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    
+    if message_data.get("snapshot") and joined:
+        try:
+            limit = int(message_data.get("messages", settings.ws_join_snapshot_messages))
+        except (TypeError, ValueError):
+            limit = settings.ws_join_snapshot_messages
+        limit = max(0, min(limit, settings.ws_join_snapshot_max_messages))
+        
+        unread_counts = repository.count_unread_messages(db, joined, read_markers.pending_for(joined))
+        snapshot = {
+            conversation_id: {"unread_count": unread_counts.get(conversation_id, 0), "messages": []}
+            for conversation_id in joined
+        }
+        if limit:
+            for row in repository.get_recent_messages(db, joined, limit):
+                snapshot[row.conversation_id]["messages"].append({
+                    "id": row.id,
+                    "content": row.content,
+                    "sender": row.sender,
+                    "sender_id": row.sender_id,
+                    "timestamp": row.created_at.isoformat(),
+                    "metadata": row.message_metadata
+                })
+            # Conversations moved to cold storage have no hot rows left
+            cold = [conversation_id for conversation_id in joined if not snapshot[conversation_id]["messages"]]
+            for conversation_id, archived in load_archived_messages_many(db, cold).items():
+                snapshot[conversation_id]["messages"] = [
+                    {
+                        "id": message["id"],
+                        "content": message["content"],
+                        "sender": message["sender"],
+                        "sender_id": message["sender_id"],
+                        "timestamp": message["created_at"].isoformat(),
+                        "metadata": message["message_metadata"]
+                    }
+                    for message in archived[-limit:]
+                ]
+        reply["snapshot"] = snapshot
+    
+    await connection_manager.send_personal_message(reply, connection_id)
+
+# Visitor frame types that write or broadcast, and the limit they count against
+VISITOR_RATE_LIMITED_FRAMES = {
+    "send_message": "message",
+    "typing_start": "typing",
+    "typing_stop": "typing",
+    "page_views": "events",
+}
+
 async def handle_visitor_message(message_data: dict, connection_id: str, visitor_id: str, 
                                 website_id: str, db: Session):
     """Handle messages from visitors"""
     message_type = message_data.get("type")
+    metrics.ws_frames.labels("visitor", message_type if message_type in VISITOR_FRAME_TYPES else "other").inc()
+    
+    # Any frame, heartbeats included, counts as activity; written in bulk later
+    presence_tracker.touch(visitor_id)
+    
+    limited_action = VISITOR_RATE_LIMITED_FRAMES.get(message_type)
+    if limited_action:
+        websocket = connection_manager.active_connections.get(connection_id)
+        website = website_cache.get(db, website_id)
+        retry_after = await rate_limiter.check(
+            limited_action,
+            website_id=website_id,
+            visitor_id=visitor_id,
+            ip=client_ip(websocket) if websocket else None,
+            widget_config=website.widget_config if website else None
+        )
+        if retry_after:
+            # Drop the frame; only dropped messages are worth telling the widget about
+            if limited_action == "message":
+                await connection_manager.send_personal_message({
+                    "type": "rate_limited",
+                    "action": limited_action,
+                    "retry_after": retry_after
+                }, connection_id)
+            elif limited_action == "events":
+                # Same frame as a full page-view buffer, so the widget keeps the batch and retries
+                await connection_manager.send_personal_message({
+                    "type": "backpressure",
+                    "retry_after": math.ceil(retry_after)
+                }, connection_id)
+            return
     
     if message_type == "ping":
         # Respond to heartbeat ping
@@ -278,9 +505,27 @@ async def handle_visitor_message(message_data: dict, connection_id: str, visitor
     
     elif message_type == "join_conversation":
         conversation_id = message_data.get("conversation_id")
-        if conversation_id:
+        owned = conversation_id and db.execute(
+            select(Conversation.id).where(
+                Conversation.id == str(conversation_id),
+                Conversation.visitor_id == visitor_id,
+                Conversation.website_id == website_id
+            )
+        ).first()
+        if conversation_id and not owned:
+            await connection_manager.send_personal_message({
+                "type": "error",
+                "message": "Conversation not found"
+            }, connection_id)
+        elif conversation_id:
             connection_manager.subscribe_to_conversation(connection_id, conversation_id)
             
+            position = waiting_queues.position(conversation_id)
+            if position is not None:
+                await connection_manager.send_personal_message(
+                    queue_position_message(conversation_id, position), connection_id
+                )
+            
             # Notify agents about visitor joining
             await connection_manager.broadcast_to_conversation({
                 "type": "visitor_joined",
@@ -292,6 +537,17 @@ async def handle_visitor_message(message_data: dict, connection_id: str, visitor
     elif message_type == "send_message":
         await handle_send_message(message_data, connection_id, visitor_id, "visitor", db)
     
+    elif message_type == "mark_read":
+        conversation_id = message_data.get("conversation_id")
+        # Only the visitor's own conversation, checked when it was joined
+        if not connection_manager.is_subscribed(connection_id, conversation_id):
+            log.info("ws.unauthorized_frame", type=message_type, visitor_id=visitor_id, conversation_id=conversation_id)
+            return
+        read_receipts.mark(conversation_id, "visitor", message_data.get("message_id"))
+    
+    elif message_type == "page_views":
+        await handle_page_views(message_data, connection_id, visitor_id, website_id)
+    
     elif message_type == "typing_start":
         conversation_id = message_data.get("conversation_id")
         if conversation_id:
@@ -341,7 +597,8 @@ async def handle_send_message(message_data: dict, connection_id: str, sender_id:
         db.add(message)
         
         # Update conversation
-        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+        conversation = repository.get_conversation_by_id(db, conversation_id)
+        website_id = conversation.website_id if conversation else None
         if conversation:
             conversation.last_message_at = datetime.utcnow()
             conversation.updated_at = datetime.utcnow()
@@ -349,9 +606,18 @@ async def handle_send_message(message_data: dict, connection_id: str, sender_id:
             if sender_type == "agent":
                 conversation.status = "active"
                 conversation.last_agent_read_at = datetime.utcnow()
+                claim_on_reply(conversation, sender_id)
+        
+        inbox_changes = {}
+        if conversation and sender_type == "agent":
+            inbox_changes = {"status": ConversationStatus.ACTIVE.value,
+                             "assigned_agent_id": conversation.assigned_agent_id}
         
         db.commit()
         db.refresh(message)
+        metrics.messages_persisted.labels(sender_type).inc()
+        if conversation:
+            analytics.record_message(conversation_id, sender_type, sender_id)
         
         # Broadcast message to all conversation participants
         broadcast_message = {
@@ -367,12 +633,13 @@ async def handle_send_message(message_data: dict, connection_id: str, sender_id:
             }
         }
         
-        print(f"📢 Broadcasting message to conversation {conversation_id}: {content[:50]}...")
         await connection_manager.broadcast_to_conversation(
             broadcast_message, 
             conversation_id
         )
-        print(f"✅ Message broadcast completed for conversation {conversation_id}")
+        
+        await inbox.message_added(website_id, conversation_id, content, sender_type, message.created_at,
+                                  **inbox_changes)
         
     except Exception as e:
         await connection_manager.send_personal_message({
@@ -383,4 +650,52 @@ async def handle_send_message(message_data: dict, connection_id: str, sender_id:
 @router.get("/stats")
 async def get_websocket_stats():
     """Get WebSocket connection statistics"""
-    return connection_manager.get_connection_stats()
\ No newline at end of file
+    return connection_manager.get_connection_stats()
+
+
+async def handle_page_views(message_data: dict, connection_id: str, visitor_id: str, website_id: str):
+    """Buffer a batch of page views sent over the visitor socket"""
+    session_id = message_data.get("session_id")
+    events = message_data.get("events") or []
+    events = [event for event in events if isinstance(event, dict) and event.get("url")]
+    if not session_id or not events:
+        return
+    events = events[:settings.page_view_max_events_per_request]
+    
+    websocket = connection_manager.active_connections.get(connection_id)
+    headers = websocket.headers if websocket else {}
+    client = websocket.client if websocket else None
+    
+    accepted = page_view_buffer.offer(
+        website_id=website_id,
+        visitor_id=visitor_id,
+        session_id=session_id,
+        events=[{
+            "url": event["url"],
+            "title": event.get("title"),
+            "time_on_page": event.get("time_on_page"),
+            "timestamp": _parse_timestamp(event.get("timestamp")),
+        } for event in events],
+        ip_address=client.host if client else "",
+        user_agent=headers.get("user-agent", ""),
+        referrer=message_data.get("referrer")
+    )
+    
+    if not accepted:
+        await connection_manager.send_personal_message({
+            "type": "backpressure",
+            "retry_after": settings.page_view_retry_after
+        }, connection_id)
+        return
+    
+    page_view_buffer.flush_if_full()
+    await connection_manager.send_personal_message({
+        "type": "page_views_ack",
+        "accepted": len(events)
+    }, connection_id)
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+    except (AttributeError, ValueError):
+        return None
@@ -0,0 +1,106 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Optional
+from fastapi import Request
+from starlette.websockets import WebSocketState
+
+from app.core.config import settings
+from app.core.serialization import dumps
+from app.services.presence import presence_tracker
+from .connection_manager import connection_manager
+
+_CLOSE = object()
+
+class SSEConnection:
+    """
+    Queue-backed stand-in for a WebSocket, so an EventSource client can be
+    registered with the ConnectionManager and receive the same fan-out.
+    """
+
+    def __init__(self, request: Request, max_queue: int = 100):
+        self.request = request
+        self.client = request.client
+        self.headers = request.headers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.closed = False
+
+    @property
+    def client_state(self) -> WebSocketState:
+        return WebSocketState.DISCONNECTED if self.closed else WebSocketState.CONNECTED
+
+    async def send_text(self, text: str):
+        if self.closed:
+            raise RuntimeError("SSE stream closed")
+        try:
+            self.queue.put_nowait(format_event(json.loads(text), data=text))
+        except asyncio.QueueFull:
+            # Slow consumer: drop it; it resumes from Last-Event-ID on reconnect
+            await self.close(reason="Event queue full")
+            raise RuntimeError("SSE event queue full")
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        if not self.closed:
+            self.closed = True
+            # Drop the backlog so the sentinel fits; a closed stream sends nothing more
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_CLOSE)
+
+def format_event(message: dict, data: Optional[str] = None) -> str:
+    """
+    One SSE frame; `data` is the message already serialized, if available.
+    new_message events carry the message ID as event ID.
+    """
+    lines = []
+    if message.get("type") == "new_message" and message.get("message", {}).get("id"):
+        lines.append(f"id: {message['message']['id']}")
+    lines.append(f"event: {message.get('type', 'message')}")
+    lines.append(f"data: {data if data is not None else dumps(message).decode()}")
+    return "\n".join(lines) + "\n\n"
+
+async def stream_conversation(request: Request, connection_id: str, conversation_id: str,
+                              visitor_id: str, website_id: str,
+                              replay: Iterable[dict] = ()) -> AsyncIterator[str]:
+    """
+    Register an SSE connection for a conversation and yield its events.
+
+    The subscription is made before `replay` (messages missed since
+    Last-Event-ID) is sent, so nothing published in between is lost;
+    clients de-duplicate by message ID.
+    """
+    sse = SSEConnection(request, settings.sse_queue_size)
+    await connection_manager.connect(
+        sse, connection_id, visitor_id,
+        connection_type="visitor",
+        website_id=website_id,
+        visitor_id=visitor_id
+    )
+    connection_manager.connection_info[connection_id]["transport"] = "sse"
+    connection_manager.subscribe_to_conversation(connection_id, conversation_id)
+    presence_tracker.touch(visitor_id)
+
+    try:
+        yield "retry: 3000\n\n"
+        for message in replay:
+            yield format_event(message)
+
+        while not sse.closed:
+            try:
+                event = await asyncio.wait_for(sse.queue.get(), timeout=settings.sse_keepalive_seconds)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                info = connection_manager.connection_info.get(connection_id)
+                if info:
+                    # Keeps the idle sweep from closing a quiet stream
+                    info["last_seen"] = datetime.utcnow().isoformat()
+                yield ": keepalive\n\n"
+                continue
+            if event is _CLOSE:
+                break
+            yield event
+    finally:
+        sse.closed = True
+        connection_manager.disconnect(connection_id)
+        presence_tracker.touch(visitor_id)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Move messages of old resolved/archived conversations into cold storage.
+Run periodically (e.g. nightly from cron):
+    python archive_messages.py --older-than-days 30
+"""
+
+import argparse
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.services.archival import archive_closed_conversations
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive messages of closed conversations")
+    parser.add_argument("--older-than-days", type=int, default=settings.message_archive_after_days)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        totals = archive_closed_conversations(db, args.older_than_days, args.batch_size)
+        print(f"✅ Archived {totals['messages']} messages from {totals['conversations']} conversations")
+    except Exception as e:
+        print(f"❌ Archival failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
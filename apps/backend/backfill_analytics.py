@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Rebuild the conversation analytics rollups from message history.
+Run once after deploying the analytics tables, or to repair drift:
+    python backfill_analytics.py
+"""
+
+import argparse
+from app.db.database import SessionLocal
+from app.services.analytics import backfill_analytics
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill conversation analytics rollups")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        totals = backfill_analytics(db, args.batch_size)
+        print(f"✅ Rebuilt metrics for {totals['conversations']} conversations ({totals['rollups']} rollup rows)")
+    except Exception as e:
+        print(f"❌ Backfill failed: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
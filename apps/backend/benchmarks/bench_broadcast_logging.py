@@ -0,0 +1,96 @@
+"""
+Broadcasts/second to one conversation with 50 subscribers, logging the
+old way (several print() lines per message and per recipient) versus the
+queue-based pipeline in app/core/log.py at INFO (default, sampled) and
+DEBUG (every recipient, still off the loop).
+
+Output goes to a pipe drained by a reader thread, like a container log
+driver. Sockets are fakes, so only fan-out and logging cost is measured.
+
+    python -m benchmarks.bench_broadcast_logging
+"""
+
+import asyncio
+import io
+import logging
+import os
+import threading
+
+from benchmarks.common import use_temporary_database, rate
+
+use_temporary_database()
+
+from app.core.log import setup_logging, shutdown_logging
+from app.websockets.connection_manager import ConnectionManager
+
+SUBSCRIBERS = 50
+CONVERSATION_ID = "bench-conversation"
+MESSAGE = {"type": "new_message", "message": {"id": "m1", "content": "Hello there", "sender": "visitor"}}
+
+class FakeState:
+    value = 1  # CONNECTED
+
+class FakeWebSocket:
+    client_state = FakeState()
+
+    async def send_text(self, text: str):
+        pass
+
+def drained_pipe():
+    """Line-buffered writer whose output a background thread keeps reading"""
+    read_fd, write_fd = os.pipe()
+
+    def drain():
+        with os.fdopen(read_fd, "rb") as reader:
+            while reader.read1(65536):
+                pass
+
+    threading.Thread(target=drain, daemon=True).start()
+    return io.TextIOWrapper(os.fdopen(write_fd, "wb"), line_buffering=True)
+
+def build_manager() -> ConnectionManager:
+    manager = ConnectionManager()
+    for i in range(SUBSCRIBERS):
+        connection_id = f"connection-{i}"
+        manager.active_connections[connection_id] = FakeWebSocket()
+        manager.connection_info[connection_id] = {"connection_type": "agent"}
+        manager.conversation_subscriptions.setdefault(CONVERSATION_ID, set()).add(connection_id)
+    return manager
+
+async def legacy_broadcast(manager: ConnectionManager, message: dict, conversation_id: str, out):
+    """broadcast_to_conversation and its caller as they logged before the logging pipeline"""
+    print(f"📢 Broadcasting message to conversation {conversation_id}: {message['message']['content'][:50]}...", file=out)
+    subscribers = manager.conversation_subscriptions[conversation_id]
+    print(f"📤 Broadcasting to {len(subscribers)} subscribers for conversation {conversation_id}", file=out)
+    for connection_id in subscribers:
+        print(f"📨 Sending message to connection {connection_id}", file=out)
+        await manager.send_personal_message(message, connection_id)
+        print(f"✅ Message sent to connection {connection_id}", file=out)
+    print(f"✅ Message broadcast completed for conversation {conversation_id}", file=out)
+
+def main():
+    loop = asyncio.new_event_loop()
+    manager = build_manager()
+    stream = drained_pipe()
+
+    print(f"📣 One broadcast to {SUBSCRIBERS} subscribers, output to a drained pipe")
+    legacy = lambda: loop.run_until_complete(legacy_broadcast(manager, MESSAGE, CONVERSATION_ID, stream))
+    legacy_rate = rate("print() per message and per recipient", legacy)
+
+    setup_logging(stream=stream)
+    chat_logger = logging.getLogger("chat")
+    broadcast = lambda: loop.run_until_complete(manager.broadcast_to_conversation(MESSAGE, CONVERSATION_ID))
+
+    chat_logger.setLevel(logging.INFO)
+    info_rate = rate("queued logging, INFO (sampled)", broadcast)
+    chat_logger.setLevel(logging.DEBUG)
+    debug_rate = rate("queued logging, DEBUG (every recipient)", broadcast)
+    chat_logger.setLevel(logging.WARNING)
+    rate("queued logging, WARNING", broadcast)
+
+    shutdown_logging()
+    loop.close()
+    print(f"\n   INFO is {info_rate / legacy_rate:.1f}x and DEBUG {debug_rate / legacy_rate:.1f}x the print() throughput")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Widget message ingest: concurrency check and per-message latency of the
+upsert path versus the original SELECT-then-INSERT get-or-create sequence.
+
+    python -m benchmarks.bench_ingest
+"""
+
+import threading
+import time
+import uuid
+
+from benchmarks.common import use_temporary_database, create_schema, seed_admin
+
+use_temporary_database()
+
+from app.db.database import SessionLocal
+from app.models.conversation import Conversation, Message, MessageType
+from app.models.visitor import Visitor
+from app.models.website import Website
+from app.services.ingest import ingest_visitor_message
+
+CONCURRENT_SENDERS = 8
+MESSAGES = 500
+
+def legacy_ingest(db, website_id, visitor_id, content, conversation_id=None):
+    """The get-or-create sequence send_widget_message used before the upsert path"""
+    website = db.query(Website).filter(Website.id == website_id).first()
+    if not website:
+        db.add(Website(id=website_id, name="Demo Website", domain="localhost:8001"))
+        db.flush()
+
+    visitor = db.query(Visitor).filter(Visitor.id == visitor_id).first()
+    if not visitor:
+        visitor = Visitor(id=visitor_id, website_id=website_id, is_identified=False)
+        db.add(visitor)
+        db.flush()
+
+    conversation = None
+    if conversation_id:
+        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    if not conversation:
+        conversation = Conversation(id=str(uuid.uuid4()), website_id=website_id, visitor_id=visitor.id,
+                                    status="active", priority="normal")
+        db.add(conversation)
+        db.flush()
+
+    message = Message(id=str(uuid.uuid4()), conversation_id=conversation.id, sender="visitor",
+                      sender_id=visitor.id, content=content, type=MessageType.TEXT)
+    db.add(message)
+    db.commit()
+    message.created_at  # the response reads it, which reloads the row
+    return conversation.id
+
+def race(ingest, visitor_id):
+    """Fire concurrent first messages from one visitor; return (errors, visitors, conversations)"""
+    barrier = threading.Barrier(CONCURRENT_SENDERS)
+    errors = []
+
+    def send(n):
+        db = SessionLocal()
+        try:
+            barrier.wait()
+            ingest(db, "bench-site", visitor_id, f"hello {n}")
+        except Exception as e:
+            db.rollback()
+            errors.append(type(e).__name__)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=send, args=(n,)) for n in range(CONCURRENT_SENDERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db = SessionLocal()
+    visitors = db.query(Visitor).filter(Visitor.id == visitor_id).count()
+    conversations = db.query(Conversation).filter(Conversation.visitor_id == visitor_id).count()
+    db.close()
+    return errors, visitors, conversations
+
+def latency(ingest, label):
+    db = SessionLocal()
+    visitor_id = f"visitor-{uuid.uuid4()}"
+    conversation_id = ingest(db, "bench-site", visitor_id, "first")
+    conversation_id = getattr(conversation_id, "conversation_id", conversation_id)
+
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        ingest(db, "bench-site", visitor_id, f"message {i}", conversation_id)
+    elapsed = time.perf_counter() - start
+    db.close()
+    print(f"   {label:<32} {elapsed / MESSAGES * 1000:8.3f} ms/message")
+
+def main():
+    create_schema()
+    db = SessionLocal()
+    seed_admin(db)
+    db.close()
+
+    print(f"🏁 {CONCURRENT_SENDERS} concurrent first messages from one visitor")
+    for label, ingest in (("legacy get-or-create", legacy_ingest), ("upsert ingest", ingest_visitor_message)):
+        errors, visitors, conversations = race(ingest, f"visitor-{uuid.uuid4()}")
+        print(f"   {label:<32} visitors={visitors} conversations={conversations} errors={len(errors)}")
+
+    errors, visitors, conversations = race(ingest_visitor_message, f"visitor-{uuid.uuid4()}")
+    assert not errors and visitors == 1 and conversations == 1, (errors, visitors, conversations)
+    print("   ✅ upsert path: no duplicates, no failed sends")
+
+    print(f"\n⏱️  Sequential latency over {MESSAGES} messages (SQLite)")
+    latency(legacy_ingest, "legacy get-or-create")
+    latency(ingest_visitor_message, "upsert ingest")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Checks that the hot HTTP routes never block the event loop, using the
+slow-callback detector from app/core/loop_monitor.py as an assertion, and
+that the detector does catch a handler that sleeps on the loop.
+
+TestClient runs the app on a stock asyncio loop, so detection is available
+here even though production runs uvloop.
+
+    python -m benchmarks.bench_loop_monitor
+"""
+
+import os
+import time
+
+from benchmarks.common import use_temporary_database, create_schema, seed_admin
+
+use_temporary_database()
+os.environ["LOOP_MONITOR_ENABLED"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+from fastapi import APIRouter
+from fastapi.testclient import TestClient
+
+from app.core.loop_monitor import loop_monitor
+from app.db.database import SessionLocal
+from app.main import app
+
+WEBSITE_ID = "bench-site"
+REQUESTS_PER_ROUTE = 20
+
+blocking_router = APIRouter()
+
+@blocking_router.get("/blocking")
+async def blocking():
+    time.sleep(0.3)  # deliberately stalls the loop
+    return {"ok": True}
+
+app.include_router(blocking_router, prefix="/bench")
+
+def hot_routes(client: TestClient, headers: dict):
+    for i in range(REQUESTS_PER_ROUTE):
+        client.post("/api/v1/widget/message", json={
+            "content": f"Hello {i}",
+            "visitorId": f"bench-visitor-{i % 4}",
+            "websiteId": WEBSITE_ID
+        }).raise_for_status()
+        client.get(f"/api/v1/widget/config/{WEBSITE_ID}").raise_for_status()
+        client.get("/api/v1/conversations/", headers=headers).raise_for_status()
+
+def main():
+    create_schema()
+    db = SessionLocal()
+    token = seed_admin(db, website_ids=(WEBSITE_ID,))
+    db.close()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with TestClient(app) as client:
+        assert loop_monitor.detecting, "slow-callback detection should be available on the TestClient loop"
+        hot_routes(client, headers)  # warm up imports, caches and the connection pool
+
+        print(f"⏱️  {REQUESTS_PER_ROUTE} requests each to widget message, widget config and the inbox")
+        with loop_monitor.assert_no_stalls():
+            hot_routes(client, headers)
+        print("✅ No callback blocked the event loop")
+
+        try:
+            with loop_monitor.assert_no_stalls():
+                client.get("/bench/blocking")
+        except AssertionError as error:
+            print(f"✅ Blocking handler caught: {str(error).splitlines()[0]}")
+        else:
+            raise SystemExit("❌ The detector missed a handler that slept on the loop")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Per-call CPU of the hot-path lookups: ORM db.query(...) rebuilt on every
+call versus the cached lambda statements in app.db.repository.
+
+    python -m benchmarks.bench_repository
+"""
+
+import time
+import uuid
+
+from benchmarks.common import use_temporary_database, create_schema, seed_admin
+
+use_temporary_database()
+
+from app.db import repository
+from app.db.database import SessionLocal
+from app.models.conversation import Conversation, Message
+from app.models.user import User
+from app.models.visitor import Visitor
+from app.models.website import Website
+
+ITERATIONS = 5000
+
+def cpu_per_call(fn) -> float:
+    """Microseconds of process CPU per call"""
+    for _ in range(100):
+        fn()  # warm up caches
+    start = time.process_time()
+    for _ in range(ITERATIONS):
+        fn()
+    return (time.process_time() - start) / ITERATIONS * 1e6
+
+def main():
+    create_schema()
+    db = SessionLocal()
+    seed_admin(db)
+    db.add(Visitor(id="bench-visitor", website_id="bench-site"))
+    db.add(Conversation(id="bench-conv", website_id="bench-site", visitor_id="bench-visitor"))
+    db.add_all([
+        Message(id=str(uuid.uuid4()), conversation_id="bench-conv", sender_id="bench-visitor",
+                sender="visitor", content=f"Message {i}")
+        for i in range(20)
+    ])
+    db.commit()
+
+    cases = [
+        ("user by id",
+         lambda: db.query(User).filter(User.id == "bench-admin").first(),
+         lambda: repository.get_user_by_id(db, "bench-admin")),
+        ("conversation by id",
+         lambda: db.query(Conversation).filter(Conversation.id == "bench-conv").first(),
+         lambda: repository.get_conversation_by_id(db, "bench-conv")),
+        ("website by id",
+         lambda: db.query(Website).filter(Website.id == "bench-site").first(),
+         lambda: repository.get_website_by_id(db, "bench-site")),
+        ("messages by conversation (20 rows)",
+         lambda: db.query(Message.id, Message.content, Message.sender, Message.created_at,
+                          Message.message_metadata).filter(
+             Message.conversation_id == "bench-conv").order_by(Message.created_at).all(),
+         lambda: repository.get_conversation_messages(db, "bench-conv")),
+    ]
+
+    print(f"🔬 CPU per call over {ITERATIONS} calls (SQLite)")
+    print(f"   {'query':<36} {'db.query':>10} {'cached':>10} {'saved':>10}")
+    for label, orm_call, cached_call in cases:
+        orm_us = cpu_per_call(orm_call)
+        cached_us = cpu_per_call(cached_call)
+        print(f"   {label:<36} {orm_us:8.1f}us {cached_us:8.1f}us {orm_us - cached_us:8.1f}us")
+
+    db.close()
+
+if __name__ == "__main__":
+    main()
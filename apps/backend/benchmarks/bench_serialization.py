@@ -0,0 +1,98 @@
+"""
+Responses/second for the inbox and transcript endpoints, plus the
+serialization step alone: pydantic model per row + response_model
+validation versus projected dicts encoded by FastJSONResponse.
+
+    python -m benchmarks.bench_serialization
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temporary_database, create_schema, seed_admin, rate
+
+use_temporary_database()
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from app.main import app
+from app.api.v1.conversations import ConversationListResponse, ConversationDetailResponse, MessageResponse
+from app.core.serialization import dumps
+from app.db.database import SessionLocal
+from app.models.conversation import Conversation, Message
+from app.models.visitor import Visitor
+
+INBOX_ROWS = 50
+TRANSCRIPT_MESSAGES = 1000
+
+def seed(db):
+    token = seed_admin(db)
+    now = datetime.utcnow()
+
+    for i in range(INBOX_ROWS):
+        visitor = Visitor(id=f"visitor-{i}", website_id="bench-site", name=f"Visitor {i}", email=f"v{i}@example.com")
+        conversation = Conversation(id=f"conv-{i}", website_id="bench-site", visitor_id=visitor.id, updated_at=now)
+        db.add_all([visitor, conversation])
+        for j in range(5):
+            db.add(Message(id=str(uuid.uuid4()), conversation_id=conversation.id, sender_id=visitor.id,
+                           sender="visitor", content=f"Message {j}", created_at=now + timedelta(seconds=j)))
+
+    db.add_all([
+        Message(id=str(uuid.uuid4()), conversation_id="conv-0", sender_id="visitor-0",
+                sender="visitor" if i % 2 else "agent", content=f"Transcript line {i} " * 4,
+                message_metadata={"n": i}, created_at=now + timedelta(seconds=10 + i))
+        for i in range(TRANSCRIPT_MESSAGES)
+    ])
+    db.commit()
+    return token
+
+def serialization_only():
+    now = datetime.utcnow()
+    inbox = [
+        dict(id=f"conv-{i}", website_name="Site", website_domain="site.example.com", visitor_name=f"Visitor {i}",
+             visitor_email=None, last_message="Hello there", last_message_time=now, status="active",
+             unread_count=1, created_at=now)
+        for i in range(INBOX_ROWS)
+    ]
+    messages = [
+        dict(id=str(uuid.uuid4()), content=f"Transcript line {i}", sender="visitor", timestamp=now, message_metadata={})
+        for i in range(TRANSCRIPT_MESSAGES)
+    ]
+    detail = dict(id="conv-0", website_id="bench-site", website_name="Site", website_domain="site.example.com",
+                  visitor_id="visitor-0", visitor_name="Visitor 0", visitor_email=None, visitor_metadata={},
+                  status="active", created_at=now, updated_at=now, messages=messages)
+
+    def inbox_pydantic():
+        models = [ConversationListResponse(**row) for row in inbox]
+        # FastAPI validates the returned models against response_model and re-encodes them
+        validated = [ConversationListResponse.model_validate(m.model_dump()) for m in models]
+        return dumps(jsonable_encoder(validated))
+
+    def transcript_pydantic():
+        model = ConversationDetailResponse(**{**detail, "messages": [MessageResponse(**m) for m in messages]})
+        validated = ConversationDetailResponse.model_validate(model.model_dump())
+        return dumps(jsonable_encoder(validated))
+
+    print("🔬 Serialization only")
+    rate("50-row inbox, pydantic + response_model", inbox_pydantic)
+    rate("50-row inbox, projected dicts", lambda: dumps(inbox))
+    rate("1,000-message transcript, pydantic + response_model", transcript_pydantic)
+    rate("1,000-message transcript, projected dicts", lambda: dumps(detail))
+
+def end_to_end(token):
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert len(client.get("/api/v1/conversations/", headers=headers).json()) == INBOX_ROWS
+
+    print("\n🌐 End to end (TestClient, SQLite)")
+    rate("GET /conversations/ (50 rows)", lambda: client.get("/api/v1/conversations/", headers=headers))
+    rate("GET /conversations/{id} (1,005 messages)", lambda: client.get("/api/v1/conversations/conv-0", headers=headers))
+    rate("GET /websites/", lambda: client.get("/api/v1/websites/", headers=headers))
+
+if __name__ == "__main__":
+    create_schema()
+    db = SessionLocal()
+    token = seed(db)
+    db.close()
+    serialization_only()
+    end_to_end(token)
@@ -0,0 +1,104 @@
+"""
+Waiting-queue dispatch and position lookups at 100k queued conversations:
+the in-memory SLA queue versus answering the same questions with SQL over
+the conversations table.
+
+    python -m benchmarks.bench_waiting_queue
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temporary_database, create_schema, rate
+
+use_temporary_database()
+
+from sqlalchemy import case, func, insert
+from app.db.database import SessionLocal
+from app.models.conversation import Conversation, ConversationStatus, Priority
+from app.models.visitor import Visitor
+from app.models.website import Website
+from app.services.waiting_queue import WaitingQueues, PRIORITY_ORDER
+from app.core.config import settings
+
+QUEUED = 100_000
+WEBSITE_ID = "bench-site"
+
+SLA_SECONDS = {
+    Priority.URGENT: settings.queue_sla_urgent_seconds,
+    Priority.HIGH: settings.queue_sla_high_seconds,
+    Priority.NORMAL: settings.queue_sla_normal_seconds,
+    Priority.LOW: settings.queue_sla_low_seconds,
+}
+
+def seed(db):
+    random.seed(42)
+    start = datetime.utcnow() - timedelta(hours=2)
+    db.add(Website(id=WEBSITE_ID, name="Bench", domain="bench.example.com"))
+    db.flush()
+    db.execute(insert(Visitor), [{"id": f"v{i}", "website_id": WEBSITE_ID} for i in range(QUEUED)])
+    db.execute(insert(Conversation), [
+        {
+            "id": f"c{i}",
+            "website_id": WEBSITE_ID,
+            "visitor_id": f"v{i}",
+            "status": ConversationStatus.WAITING,
+            "priority": random.choices(PRIORITY_ORDER, weights=(1, 4, 20, 5))[0],
+            "updated_at": start + timedelta(milliseconds=70 * i),
+        }
+        for i in range(QUEUED)
+    ])
+    db.commit()
+
+def sql_deadline():
+    """Earliest-deadline-first ordering expressed in SQL (SQLite julianday)"""
+    sla_days = case(
+        *[(Conversation.priority == priority, SLA_SECONDS[priority] / 86400) for priority in PRIORITY_ORDER],
+        else_=SLA_SECONDS[Priority.NORMAL] / 86400
+    )
+    return func.julianday(Conversation.updated_at) + sla_days
+
+def main():
+    create_schema()
+    db = SessionLocal()
+    print(f"🌱 Seeding {QUEUED:,} waiting conversations...")
+    seed(db)
+
+    queues = WaitingQueues(SLA_SECONDS)
+    started = time.perf_counter()
+    queues.rebuild(db)
+    print(f"   rebuild from database: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    probe = f"c{QUEUED // 2}"
+    waiting = (Conversation.status == ConversationStatus.WAITING, Conversation.assigned_agent_id.is_(None))
+    deadline = sql_deadline()
+
+    print(f"\n📋 Next conversation ({QUEUED:,} queued)")
+    rate("SQL ORDER BY deadline LIMIT 1", lambda: db.query(Conversation.id).filter(*waiting)
+         .order_by(deadline).limit(1).scalar(), seconds=3)
+
+    def cycle():
+        # Dispatch the head and queue a new arrival, keeping the size constant
+        conversation_id, website_id = queues.pop_next([WEBSITE_ID])
+        queues.push(conversation_id, website_id, Priority.NORMAL)
+    rate("in-memory pop + push", cycle)
+
+    print(f"\n🔢 Queue position of one conversation")
+    probe_deadline = db.query(deadline).filter(Conversation.id == probe).scalar()
+    rate("SQL COUNT(*) of earlier deadlines", lambda: db.query(func.count(Conversation.id))
+         .filter(*waiting, deadline < probe_deadline).scalar(), seconds=3)
+    rate("in-memory position()", lambda: queues.position(probe))
+
+    print(f"\n✂️  Removal from the middle (conversation closed while waiting)")
+    ids = [f"c{i}" for i in range(1, QUEUED, 7)]
+    started = time.perf_counter()
+    for conversation_id in ids:
+        queues.remove(conversation_id)
+    elapsed = time.perf_counter() - started
+    print(f"   {len(ids):,} removals: {elapsed / len(ids) * 1e6:.1f} µs each, position still {queues.position(probe)}")
+
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Shared setup for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite file so they need no services:
+    cd apps/backend && python -m benchmarks.bench_serialization
+"""
+
+import os
+import tempfile
+import time
+from typing import Callable
+
+def use_temporary_database() -> str:
+    """Point the app at a fresh SQLite file; must run before importing app modules"""
+    path = os.path.join(tempfile.mkdtemp(prefix="website-chat-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    return path
+
+def create_schema():
+    from app.db.database import Base, engine
+    import app.models  # noqa: F401 - registers every table on Base.metadata
+    Base.metadata.create_all(bind=engine)
+
+def seed_admin(db, user_id: str = "bench-admin", website_ids=("bench-site",)):
+    """Create an admin user owning the given websites and return a bearer token"""
+    from app.core.security import create_access_token
+    from app.models.user import User, UserRole, UserStatus
+    from app.models.website import Website
+
+    user = User(
+        id=user_id,
+        email=f"{user_id}@example.com",
+        name="Benchmark Admin",
+        hashed_password="not-used",
+        role=UserRole.ADMIN,
+        status=UserStatus.ACTIVE
+    )
+    for website_id in website_ids:
+        user.websites.append(Website(id=website_id, name=f"Site {website_id}", domain=f"{website_id}.example.com"))
+    db.add(user)
+    db.commit()
+    return create_access_token(subject=user_id)
+
+def rate(label: str, fn: Callable[[], object], seconds: float = 2.0) -> float:
+    """Call fn repeatedly for roughly `seconds` and print calls per second"""
+    fn()  # warm up
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        calls += 1
+    per_second = calls / (time.perf_counter() - start)
+    print(f"   {label:<48} {per_second:10.1f} /s")
+    return per_second
@@ -9,6 +9,8 @@ from app.models.website import Website
 from app.models.conversation import Conversation, Message
 from app.models.visitor import Visitor
 from app.core.security import get_password_hash
+from app.core.config import settings
+from app.db.partitioning import is_postgres, create_partitioned_messages_table, ensure_message_partitions
 from sqlalchemy.orm import sessionmaker
 import uuid
 from datetime import datetime
@@ -18,6 +20,14 @@ def init_database():
     
     # Create all tables
     print("Creating database tables...")
+    if settings.message_partitioning_enabled and is_postgres(engine):
+        # messages references conversations, so create that first
+        Base.metadata.create_all(bind=engine, tables=[
+            Base.metadata.tables[name] for name in ("users", "websites", "visitors", "conversations")
+        ])
+        create_partitioned_messages_table(engine)
+        ensure_message_partitions(engine, settings.message_partitions_ahead)
+        print("✅ Created partitioned messages table")
     Base.metadata.create_all(bind=engine)
     print("✅ Database tables created")
     
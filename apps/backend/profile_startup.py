@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Profile cold start of the API: import-time breakdown and time-to-first-request.
+
+Exits non-zero when cold start exceeds the budget, so it can gate CI:
+    python profile_startup.py --budget-ms 1500
+"""
+
+import argparse
+import sys
+from app.core.startup import import_time_breakdown, summarize_imports, time_to_first_request
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile API cold start")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--budget-ms", type=int, default=None)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.budget_ms is None:
+        from app.core.config import settings
+        args.budget_ms = settings.startup_budget_ms
+
+    summary = summarize_imports(import_time_breakdown(args.module))
+
+    print("📦 Import time by package (self, ms):")
+    for package, ms in summary["packages"]:
+        print(f"   {package:<30} {ms:8.1f}")
+
+    print("\n🧩 Slowest app modules (self, ms):")
+    for module, ms in summary["app_modules"]:
+        print(f"   {module:<30} {ms:8.1f}")
+
+    # Take the best of several runs to smooth out scheduler noise
+    runs = [time_to_first_request(args.module, args.path) for _ in range(args.runs)]
+    best = min(runs, key=lambda run: run["total_ms"])
+
+    print("\n⏱️  Cold start (best of {}):".format(args.runs))
+    print(f"   import           {best['import_ms']:8.1f} ms")
+    print(f"   first request    {best['first_request_ms']:8.1f} ms (status {best['status_code']})")
+    print(f"   total            {best['total_ms']:8.1f} ms (budget {args.budget_ms} ms)")
+
+    if best["lazy_initialized"]:
+        print(f"\n⚠️  Lazy values forced during startup: {', '.join(best['lazy_initialized'])}")
+
+    if best["total_ms"] > args.budget_ms:
+        print(f"\n❌ Cold start over budget by {best['total_ms'] - args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+    print("\n✅ Cold start within budget")
+
+if __name__ == "__main__":
+    main()
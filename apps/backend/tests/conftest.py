@@ -0,0 +1,30 @@
+"""
+Shared fixtures. Tests run against a throwaway SQLite file, so they need no
+services:
+    cd apps/backend && python -m pytest
+"""
+
+import os
+import tempfile
+
+import pytest
+
+# Settings are read at import time; point the app at the test database first
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="website-chat-test-"), "test.db")
+
+from app.db.database import Base, SessionLocal, engine  # noqa: E402
+import app.models  # noqa: E402,F401 - registers every table on Base.metadata
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+    yield
+    engine.dispose()
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,61 @@
+import threading
+import uuid
+
+from app.models.conversation import Conversation, Message
+from app.db.database import SessionLocal
+from app.services import ingest
+from app.services.ingest import ingest_visitor_message
+
+CONCURRENT_SENDERS = 8
+
+def _conversations(db, visitor_id: str):
+    return db.query(Conversation).filter(Conversation.visitor_id == visitor_id).all()
+
+def test_concurrent_first_messages_share_one_conversation(db):
+    visitor_id = f"visitor-{uuid.uuid4()}"
+    barrier = threading.Barrier(CONCURRENT_SENDERS)
+    results, errors = [], []
+
+    def send(n):
+        session = SessionLocal()
+        try:
+            barrier.wait()
+            results.append(ingest_visitor_message(session, "test-site", visitor_id, f"hello {n}"))
+        except Exception as e:
+            session.rollback()
+            errors.append(e)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=send, args=(n,)) for n in range(CONCURRENT_SENDERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    conversations = _conversations(db, visitor_id)
+    assert len(conversations) == 1
+    assert {result.conversation_id for result in results} == {conversations[0].id}
+    assert sum(result.created_conversation for result in results) == 1
+    assert db.query(Message).filter(Message.conversation_id == conversations[0].id).count() == CONCURRENT_SENDERS
+
+def test_sender_that_lost_the_race_joins_the_winners_conversation(db, monkeypatch):
+    """
+    SQLite serializes writers, so threads alone cannot produce the losing
+    interleaving. Replay it: the second sender looked for an open
+    conversation before the first one committed, and found none.
+    """
+    visitor_id = f"visitor-{uuid.uuid4()}"
+    first = ingest_visitor_message(db, "test-site", visitor_id, "first")
+
+    monkeypatch.setattr(ingest, "_latest_conversation", lambda *args: None)
+    other = SessionLocal()
+    try:
+        second = ingest_visitor_message(other, "test-site", visitor_id, "second")
+    finally:
+        other.close()
+
+    assert first.created_conversation and not second.created_conversation
+    assert second.conversation_id == first.conversation_id
+    assert [conversation.id for conversation in _conversations(db, visitor_id)] == [first.conversation_id]
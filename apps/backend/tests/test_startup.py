@@ -0,0 +1,30 @@
+import json
+import subprocess
+import sys
+
+from app.core.config import settings
+from app.core.startup import time_to_first_request
+
+# Imported on first use; a module-level import of any of these is a cold-start regression
+DEFERRED_MODULES = ("jose", "passlib.context", "sqlalchemy.dialects.postgresql")
+
+def test_cold_start_within_budget():
+    # Best of three, like profile_startup.py, to smooth out scheduler noise
+    best = min((time_to_first_request() for _ in range(3)), key=lambda run: run["total_ms"])
+
+    assert best["status_code"] == 200
+    assert best["lazy_initialized"] == []
+    assert best["total_ms"] <= settings.startup_budget_ms, (
+        f"cold start took {best['total_ms']:.0f} ms (budget {settings.startup_budget_ms} ms); "
+        "run profile_startup.py for the import breakdown"
+    )
+
+def test_heavy_modules_stay_deferred():
+    result = subprocess.run(
+        [sys.executable, "-c", "import json, sys, app.main; print(json.dumps(sorted(sys.modules)))"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+    assert [module for module in DEFERRED_MODULES if module in loaded] == []